@@ -0,0 +1,1152 @@
+"""Offline benchmarks for SpinBot against the local GGE stand-in server (gge_standin.py).
+
+    python benchmark.py sessions --sessions 200 --spins 20 --latency 0.05
+    python benchmark.py e2e --sessions 20 --spins 50 --window 4 --latency 0.05 --jitter 0.02 --noise 10
+    python benchmark.py e2e --token-delay 0.3 --connect-delay 0.3 --latency 0.1 --login-mode sequential
+    python benchmark.py workers --processes 2 --tasks 20 --stub-delay 0.5 --max-tasks 5
+    python benchmark.py decoder --frames recorded_frames.txt
+    python benchmark.py render --spins 20000 --edit-every 50 --unknown 300
+    python benchmark.py browser --runs 3 --assets 60 --asset-latency 0.05
+    python benchmark.py logging --sessions 10 --spins 1000 --window 8 --sink /tmp/spinbot-bench.log
+    python benchmark.py cancel --jobs 30 --token-delay 2 --cancel-within 6 --bound 10
+    python benchmark.py startup --runs 5
+    python benchmark.py routing --worlds 2 --endpoints-per-world 2 --jobs 24 --max-per-endpoint 3 --slow-latency 0.25 --dead-endpoint
+
+The reCAPTCHA step is skipped (a dummy token is sent; the stand-in accepts any token), except in
+`browser`, which drives Chrome against a locally served page (synthetic, or a saved copy via --page-dir).
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+import websocket
+from aiohttp import web
+
+import main
+import gge_standin
+
+
+class ThreadSampler:
+    """Samples the process thread count while a benchmark runs."""
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self.peak = max(self.peak, threading.active_count())
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+def gge_login_sync_worker_with_rct(username, password, rct_token, user_id_for_logging="User", login_info: Optional[Dict] = None, classifier: Optional[main.FrameClassifier] = None):
+    """Logs in with a reCAPTCHA token and returns the connected WebSocket, or None on failure.
+
+    The blocking websocket-client path the bot used before GGEAsyncSession, kept with the spin
+    loops below as the threaded baseline for `sessions` and tests/test_spin_loops.py.
+    If `login_info` is given, a non-zero lli status from the server is stored in it as
+    "rejected_status", letting callers tell an explicit rejection from a timeout or network error.
+    Pass the session's FrameClassifier to keep its per-command frame counters across login and spins.
+    """
+    ws = None
+    world = main.GGE_GAME_WORLD
+    classifier = classifier or main.FrameClassifier(world)
+    connect_timeout = 20.0
+    login_confirmation_timeout = 15.0 # Only bounds the failure path; success moves on at the lli answer
+
+    try:
+        main.logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) GGE Login for '{username}'...")
+        ws = websocket.create_connection(main.GGE_WEBSOCKET_URL, timeout=connect_timeout)
+        main.logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) ✅ WebSocket connection established!")
+
+        main.logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) Sending login sequence...")
+        for pre_login_command in main.build_pre_login_commands(username, world):
+            ws.send(pre_login_command)
+
+        login_command = main.build_login_command(username, password, rct_token, world)
+        main.logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) Sending login command (sensitive parts like PW, RCT omitted from this log line for security if they were printed).")
+        # main.logger.debug(f"[{user_id_for_logging}] (SyncWorker-RCT) Full Login Command: {login_command}") # For debugging only
+        ws.send(login_command)
+        confirmation_deadline = time.monotonic() + login_confirmation_timeout
+
+        main.logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) Waiting for login confirmation (%xt%lli%1%0%)...")
+        handshake = main.LoginHandshake()
+        while not handshake.done:
+            remaining = confirmation_deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not ws.connected:
+                main.logger.warning(f"[{user_id_for_logging}] (SyncWorker-RCT) WS disconnected while waiting for login confirmation.")
+                break
+            ws.settimeout(remaining)
+            try:
+                raw_msg = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                break
+            except Exception as e_inner_recv:
+                main.logger.error(f"[{user_id_for_logging}] (SyncWorker-RCT) Inner recv error: {e_inner_recv}")
+                break
+            handshake.feed(*classifier.classify(raw_msg), raw_msg)
+
+        if handshake.lli_snippets:
+             main.logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) lli messages during login confirmation wait: {handshake.lli_snippets}")
+        main.logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) Frames before the lli answer: {handshake.seen_summary()}")
+
+        if handshake.state == main.LoginHandshake.CONFIRMED:
+            main.logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) ✅ Login confirmation (%xt%...%lli%1%0%) received!")
+            ws.settimeout(connect_timeout) # Reset to a reasonable default for subsequent operations
+            return ws
+        if handshake.state == main.LoginHandshake.REJECTED:
+            main.logger.error(f"[{user_id_for_logging}] (SyncWorker-RCT) ❌ Login rejected by server with status {handshake.status}.")
+            if login_info is not None: login_info["rejected_status"] = handshake.status
+        else:
+            main.logger.error(f"[{user_id_for_logging}] (SyncWorker-RCT) Login confirmation (%xt%...%lli%1%0%) NOT received within {login_confirmation_timeout}s.")
+        if ws.connected: ws.close()
+        return None
+
+    except websocket.WebSocketException as e_ws: # Catch specific websocket errors
+        main.logger.error(f"[{user_id_for_logging}] (SyncWorker-RCT) WebSocket GGE Login Error: {e_ws}", exc_info=True)
+    except Exception as e_main:
+        main.logger.error(f"[{user_id_for_logging}] (SyncWorker-RCT) Unexpected GGE Login Error: {e_main}", exc_info=True)
+
+    if ws and ws.connected:
+        try: ws.close()
+        except: pass
+    return None
+
+
+def spin_loop_lockstep(ws, spins: int, rewards: main.RewardCounter, stats: Dict[str, int], spin_send_delay: float, receive_timeout_per_spin: float, username: str, user_id_for_logging: str = "User", classifier: Optional[main.FrameClassifier] = None, world: str = main.GGE_GAME_WORLD):
+    """Sends one spin command at a time and waits for its reward message before sending the next.
+
+    A reply arriving after its spin timed out is credited to that spin, not to the next one (see main.SpinReplyMatcher).
+    """
+    classifier = classifier or main.FrameClassifier(world)
+    keepalive_command = main.build_keepalive_command(world)
+    matcher = main.SpinReplyMatcher()
+    for i in range(spins):
+        current_spin = i + 1
+        if not ws.connected:
+            main.logger.warning(f"[{user_id_for_logging}] [{current_spin}/{spins}] WebSocket disconnected before sending spin command. Aborting.")
+            break
+        
+        time.sleep(spin_send_delay)
+        spin_command = main.build_spin_command(world)
+        
+        try:
+            ws.send(spin_command)
+            # main.logger.debug(f"[{user_id_for_logging}] [{current_spin}/{spins}] Sent spin command.")
+        except Exception as send_err:
+            main.logger.error(f"[{user_id_for_logging}] ❌ Error sending spin command {current_spin} for {username}: {send_err}. Aborting further spins.", exc_info=True)
+            break
+
+        spin_reward_found = False
+        spin_error_status = None
+        search_start_time = time.monotonic()
+        matcher.add(search_start_time, receive_timeout_per_spin)
+        
+        while matcher.pending and time.monotonic() - search_start_time < receive_timeout_per_spin:
+            if not ws.connected:
+                main.logger.warning(f"[{user_id_for_logging}] [{current_spin}/{spins}] WebSocket disconnected while waiting for reward. Aborting.")
+                break # Break from inner while
+            
+            try:
+                # Dynamic timeout for recv
+                remaining_time = max(0.1, receive_timeout_per_spin - (time.monotonic() - search_start_time))
+                ws.settimeout(remaining_time)
+                msg_bytes = ws.recv()
+                command, status = classifier.classify(msg_bytes)
+                if command == b"pin":
+                    matcher.on_barrier() # If it settles this spin as lost, `pending` is now empty
+                    continue
+                if command != b"lws":
+                    continue # Unrelated server traffic, counted by the classifier
+
+                answered_spin, _, late = matcher.match()
+                if late:
+                    main.count_late_reply(msg_bytes, status, rewards, stats)
+                    main.logger.info(f"[{user_id_for_logging}] ⌛ [{answered_spin}/{spins}] Late reply for spin {answered_spin} counted.")
+                    continue
+                if status != 0:
+                    spin_error_status = status
+                    break # The server answered this spin with an error
+                msg = msg_bytes.decode("utf-8", errors="ignore") if isinstance(msg_bytes, bytes) else msg_bytes
+                if main.spin_log_sampled(current_spin): main.logger.info(f"[{user_id_for_logging}] 🎯 [{current_spin}/{spins}] Matched reward message: {msg[:100]}...")
+                main.parse_reward_message(msg, rewards)
+                spin_reward_found = True
+                break # Break from inner while, proceed to next spin
+                    
+            except websocket.WebSocketTimeoutException:
+                # This timeout is per recv attempt within the larger spin_reward_found loop
+                if not (time.monotonic() - search_start_time < receive_timeout_per_spin): # Check if overall spin timeout is also exceeded
+                    main.logger.warning(f"[{user_id_for_logging}] ⏰ [{current_spin}/{spins}] Timeout ({receive_timeout_per_spin}s) reached waiting for reward message for spin {current_spin}.")
+                break # Break from inner while (recv loop)
+            except (websocket.WebSocketConnectionClosedException, BrokenPipeError) as conn_err:
+                main.logger.error(f"[{user_id_for_logging}] ❌ [{current_spin}/{spins}] Connection closed during spin {current_spin}: {conn_err}. Aborting.", exc_info=True)
+                stats["disconnected"] += 1
+                raise conn_err # Re-raise to be caught by outer try-except
+            except Exception as recv_err:
+                main.logger.warning(f"[{user_id_for_logging}] ⚠️ [{current_spin}/{spins}] Error receiving/processing message for spin {current_spin}: {recv_err}", exc_info=True)
+                break # Break from inner while
+        
+        if spin_reward_found:
+            stats["found"] += 1
+        elif spin_error_status is not None:
+            stats["errors"] += 1
+            main.logger.warning(f"[{user_id_for_logging}] ⚠️ [{current_spin}/{spins}] Server answered spin {current_spin} with error status {spin_error_status}.")
+        elif not ws.connected: # Check again if disconnected during the receive loop
+            stats["disconnected"] += 1
+            break # Break from outer for loop (spins)
+        else:
+            stats["timed_out"] += 1
+            main.logger.warning(f"[{user_id_for_logging}] 🤷 [{current_spin}/{spins}] No specific reward message found for spin {current_spin} within {receive_timeout_per_spin}s timeout.")
+            matcher.give_up()
+            if matcher.needs_barrier():
+                try:
+                    ws.send(keepalive_command) # Its answer tells a late reply from a lost one
+                    matcher.add_barrier()
+                except Exception as send_err:
+                    main.logger.warning(f"[{user_id_for_logging}] ⚠️ [{current_spin}/{spins}] Could not send keepalive after the timeout: {send_err}")
+
+
+def spin_loop_pipelined(ws, spins: int, rewards: main.RewardCounter, stats: Dict[str, int], window: int, receive_timeout_per_spin: float, username: str, user_id_for_logging: str = "User", classifier: Optional[main.FrameClassifier] = None, world: str = main.GGE_GAME_WORLD):
+    """Keeps up to `window` spin commands in flight and matches reward messages to them as they arrive.
+
+    The server answers lws commands in order and the replies carry no id, so each reward message
+    acknowledges the oldest pending spin. Every pending spin has its own deadline; an expired spin
+    is counted as timed out without stalling the spins behind it, and a reply that still arrives
+    for it is credited to it rather than to the spin behind it (see main.SpinReplyMatcher).
+    """
+    classifier = classifier or main.FrameClassifier(world)
+    spin_command = main.build_spin_command(world)
+    keepalive_command = main.build_keepalive_command(world)
+    matcher = main.SpinReplyMatcher()
+    pending = matcher.pending # (spin number, sent at, deadline) of sent spins still waiting for their reward
+    sending = True
+
+    while pending or (sending and matcher.sent < spins):
+        # Top up the in-flight window
+        while sending and matcher.sent < spins and len(pending) < window:
+            if not ws.connected:
+                main.logger.warning(f"[{user_id_for_logging}] [{matcher.sent + 1}/{spins}] WebSocket disconnected before sending spin command. Aborting.")
+                sending = False
+                break
+            try:
+                ws.send(spin_command)
+            except Exception as send_err:
+                main.logger.error(f"[{user_id_for_logging}] ❌ Error sending spin command {matcher.sent + 1} for {username}: {send_err}. Aborting further spins.", exc_info=True)
+                sending = False
+                break
+            matcher.add(time.monotonic(), receive_timeout_per_spin)
+
+        # Expire slots whose deadline has passed
+        now = time.monotonic()
+        for expired_spin, _, _ in matcher.expire(now):
+            stats["timed_out"] += 1
+            main.logger.warning(f"[{user_id_for_logging}] ⏰ [{expired_spin}/{spins}] Timeout ({receive_timeout_per_spin}s) reached waiting for reward message for spin {expired_spin}.")
+        if matcher.needs_barrier():
+            try:
+                ws.send(keepalive_command) # Its answer tells late replies from lost ones
+                matcher.add_barrier()
+            except Exception as send_err:
+                main.logger.warning(f"[{user_id_for_logging}] ⚠️ Could not send keepalive after a timeout: {send_err}")
+        if not pending:
+            continue
+
+        if not ws.connected:
+            main.logger.warning(f"[{user_id_for_logging}] [{pending[0][0]}/{spins}] WebSocket disconnected while waiting for {len(pending)} reward(s). Aborting.")
+            stats["disconnected"] += len(pending)
+            pending.clear()
+            break
+
+        try:
+            ws.settimeout(max(0.01, pending[0][2] - now))
+            msg_bytes = ws.recv()
+        except websocket.WebSocketTimeoutException:
+            continue # The oldest slot expires on the next pass
+        except (websocket.WebSocketConnectionClosedException, BrokenPipeError) as conn_err:
+            main.logger.error(f"[{user_id_for_logging}] ❌ [{pending[0][0]}/{spins}] Connection closed with {len(pending)} spin(s) in flight: {conn_err}. Aborting.", exc_info=True)
+            stats["disconnected"] += len(pending)
+            pending.clear()
+            raise conn_err # Re-raise to be caught by the caller
+        except Exception as recv_err:
+            main.logger.warning(f"[{user_id_for_logging}] ⚠️ [{pending[0][0]}/{spins}] Error receiving message: {recv_err}", exc_info=True)
+            continue
+
+        command, status = classifier.classify(msg_bytes)
+        if command == b"pin":
+            for lost_spin, _, _ in matcher.on_barrier():
+                stats["timed_out"] += 1
+                main.logger.warning(f"[{user_id_for_logging}] ⏰ [{lost_spin}/{spins}] The server never answered spin {lost_spin}.")
+            continue
+        if command != b"lws":
+            continue # Unrelated server traffic, counted by the classifier
+        current_spin, _, late = matcher.match()
+        if late:
+            main.count_late_reply(msg_bytes, status, rewards, stats)
+            main.logger.info(f"[{user_id_for_logging}] ⌛ [{current_spin}/{spins}] Late reply for spin {current_spin} counted.")
+        elif status != 0:
+            stats["errors"] += 1
+            main.logger.warning(f"[{user_id_for_logging}] ⚠️ [{current_spin}/{spins}] Server answered spin {current_spin} with error status {status}.")
+        else:
+            msg = msg_bytes.decode("utf-8", errors="ignore") if isinstance(msg_bytes, bytes) else msg_bytes
+            if main.spin_log_sampled(current_spin): main.logger.info(f"[{user_id_for_logging}] 🎯 [{current_spin}/{spins}] Matched reward message: {msg[:100]}...")
+            main.parse_reward_message(msg, rewards)
+            stats["found"] += 1
+
+
+def threaded_session(index: int, spins: int, window: int, send_delay: float, timeout: float) -> dict:
+    """The pre-asyncio path: blocking websocket-client login and spin loop, one thread per session."""
+    stats = dict(found=0, timed_out=0, errors=0, disconnected=0)
+    rewards = main.RewardCounter()
+    ws = gge_login_sync_worker_with_rct(f"bench{index}", "pw", "bench-token", user_id_for_logging=f"bench{index}")
+    if not ws:
+        return stats
+    try:
+        if window > 1:
+            spin_loop_pipelined(ws, spins, rewards, stats, window, timeout, f"bench{index}", f"bench{index}")
+        else:
+            spin_loop_lockstep(ws, spins, rewards, stats, send_delay, timeout, f"bench{index}", f"bench{index}")
+    finally:
+        ws.close()
+    return stats
+
+
+async def async_session(index: int, spins: int, window: int, send_delay: float, timeout: float) -> dict:
+    stats = dict(found=0, timed_out=0, errors=0, disconnected=0)
+    rewards = main.RewardCounter()
+    session = await main.gge_login_async(f"bench{index}", "pw", "bench-token", user_id_for_logging=f"bench{index}")
+    if not session:
+        return stats
+    try:
+        await session.spin(spins, rewards, stats, window, send_delay, timeout)
+    finally:
+        await session.close()
+    return stats
+
+
+async def run_sessions_benchmark(args) -> None:
+    for label, make_job in (
+        ("threaded", lambda i: asyncio.to_thread(threaded_session, i, args.spins, args.window, args.send_delay, args.timeout)),
+        ("asyncio", lambda i: async_session(i, args.spins, args.window, args.send_delay, args.timeout)),
+    ):
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        with ThreadSampler() as sampler:
+            results = await asyncio.gather(*(make_job(i) for i in range(args.sessions)))
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        found = sum(r["found"] for r in results)
+        print(f"{label:>9}: {args.sessions} sessions x {args.spins} spins in {wall:.2f}s "
+              f"| {found / wall:,.0f} spins/s | found {found}, timed out {sum(r['timed_out'] for r in results)}, "
+              f"disconnected {sum(r['disconnected'] for r in results)} | peak threads {sampler.peak} | cpu {cpu:.2f}s")
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def stub_recaptcha_token(delay: float, honour_cancel: bool = True):
+    """Replaces the Selenium step with a blocking wait of `delay` seconds and a dummy token.
+
+    Like kill_driver() on a real browser, a cancel ends the wait at once (unless honour_cancel is False).
+    """
+    def obtain_recaptcha_token(user_id_for_logging: str = "User", cancel=None, demand=None):
+        woken = threading.Event()
+        unregister = cancel.add_callback(woken.set) if cancel and honour_cancel else None
+        try:
+            woken.wait(delay)
+        finally:
+            if unregister: unregister()
+        if cancel: cancel.raise_if_cancelled()
+        return "bench-token", None
+    main.obtain_recaptcha_token = obtain_recaptcha_token
+
+
+async def e2e_session(index: int, args, login_latencies: list, rtt_samples: list) -> dict:
+    """The /spin path minus Selenium: stubbed token, login (overlapped or sequential), then GGEAsyncSession.spin."""
+    stats = dict(found=0, timed_out=0, errors=0, disconnected=0)
+    login_start = time.perf_counter()
+    if args.login_mode == "overlapped":
+        session, _, _ = await main.gge_login_overlapped(f"bench{index}", "pw", user_id_for_logging=f"bench{index}")
+    else:
+        token, _ = await main.obtain_recaptcha_token_async(f"bench{index}")
+        session = await main.gge_login_async(f"bench{index}", "pw", token, user_id_for_logging=f"bench{index}")
+    if not session:
+        stats["login_failed"] = 1
+        return stats
+    login_latencies.append(time.perf_counter() - login_start)
+    pacer = None
+    if args.adaptive:
+        pacer = main.SpinPacer(initial_rate=1 / max(args.send_delay, 0.3), max_rate=args.max_rate, max_timeout=args.timeout,
+                               max_window=args.max_window, label=f"bench{index}")
+    try:
+        await session.spin(args.spins, main.RewardCounter(), stats, args.window, args.send_delay, args.timeout, rtt_samples=rtt_samples, pacer=pacer)
+    finally:
+        await session.close()
+    if pacer:
+        stats.update(final_rate=pacer.rate, final_timeout=pacer.timeout(), rate_decreases=pacer.decreases)
+    return stats
+
+
+async def run_e2e_benchmark(args) -> None:
+    login_latencies, rtt_samples = [], []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(index: int):
+        async with semaphore:
+            return await e2e_session(index, args, login_latencies, rtt_samples)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    results = await asyncio.gather(*(limited(i) for i in range(args.sessions)))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    totals = {key: sum(r.get(key, 0) for r in results) for key in ("found", "timed_out", "errors", "disconnected", "login_failed")}
+    login_latencies.sort()
+    rtt_samples.sort()
+    pacing = "adaptive pacing" if args.adaptive else f"window {args.window}"
+    print(f"{args.sessions} sessions x {args.spins} spins ({pacing}, {args.concurrency} concurrent) in {wall:.2f}s")
+    print(f"  outcomes: {totals}")
+    print(f"  login latency ({args.login_mode}, token stub {args.token_delay * 1000:.0f} ms): p50 {percentile(login_latencies, 0.5) * 1000:.1f} ms | p95 {percentile(login_latencies, 0.95) * 1000:.1f} ms | max {percentile(login_latencies, 1.0) * 1000:.1f} ms")
+    print(f"  throughput: {totals['found'] / wall:,.1f} spins/s")
+    print(f"  spin RTT: p50 {percentile(rtt_samples, 0.5) * 1000:.1f} ms | p90 {percentile(rtt_samples, 0.9) * 1000:.1f} ms | p99 {percentile(rtt_samples, 0.99) * 1000:.1f} ms")
+    print(f"  client CPU: {cpu:.2f}s total | {cpu / max(1, totals['found']) * 1e6:,.0f} µs per spin")
+    if args.adaptive:
+        paced = [r for r in results if "final_rate" in r]
+        if paced:
+            rates = sorted(r["final_rate"] for r in paced)
+            print(f"  pacing: final rate p50 {percentile(rates, 0.5):.2f} spins/s (min {rates[0]:.2f}, max {rates[-1]:.2f}) | "
+                  f"final timeout p50 {percentile(sorted(r['final_timeout'] for r in paced), 0.5):.2f}s | {sum(r['rate_decreases'] for r in paced)} rate decreases")
+
+
+async def measure_logged_sessions(args) -> dict:
+    """Runs e2e sessions and returns wall time, event-loop thread CPU, process CPU and spins found."""
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(index: int):
+        async with semaphore:
+            return await e2e_session(index, args, [], [])
+
+    loop_cpu_start, cpu_start, wall_start = time.thread_time(), time.process_time(), time.perf_counter()
+    results = await asyncio.gather(*(limited(i) for i in range(args.sessions)))
+    return {"wall": time.perf_counter() - wall_start, "loop_cpu": time.thread_time() - loop_cpu_start,
+            "cpu": time.process_time() - cpu_start, "found": sum(r.get("found", 0) for r in results)}
+
+
+def run_logging_benchmark(args) -> None:
+    if main.log_listener is not None:
+        main.log_listener.stop()
+        atexit.unregister(main.log_listener.stop)
+    sink = open(args.sink, "a", encoding="utf-8")
+    modes = (
+        ("synchronous handler, every spin", 0, 1),
+        ("queued writer, every spin", args.queue_size, 1),
+        (f"queued writer, every {args.sample_every}th spin", args.queue_size, args.sample_every),
+    )
+    print(f"{args.sessions} sessions x {args.spins} spins (window {args.window}, {args.concurrency} concurrent), log sink {args.sink}")
+    try:
+        for label, queue_size, sample_every in modes:
+            output = logging.StreamHandler(sink)
+            output.setFormatter(main.handler.formatter)
+            queue_handler, listener = main.configure_log_pipeline(main.logger, output, queue_size)
+            main.SPIN_LOG_SAMPLE_EVERY = sample_every
+            result = asyncio.run(measure_logged_sessions(args))
+            if listener is not None:
+                listener.stop()
+            found = max(1, result["found"])
+            print(f"  {label:<36} {result['found'] / result['wall']:>8,.0f} spins/s | event loop CPU {result['loop_cpu'] / found * 1e6:>5,.0f} µs/spin | "
+                  f"process CPU {result['cpu'] / found * 1e6:>5,.0f} µs/spin | dropped {queue_handler.dropped if queue_handler else 0:,}")
+    finally:
+        sink.close()
+
+
+CANCEL_BOUND_SLACK = 0.1 # Event loop timer granularity on top of the bound
+
+
+async def cancelled_job(scheduler: main.SpinScheduler, index: int, args, rng: random.Random) -> dict:
+    """One job through SpinScheduler + spin_lucky_wheel_async, cancelled at a random moment like the Cancel button does."""
+    job = scheduler.submit(index % args.users, f"bench{index}", args.spins)
+    stats = {}
+    record = {"stage": None}
+
+    async def press_cancel():
+        await asyncio.sleep(rng.uniform(0, args.cancel_within))
+        if not job.admitted.done():
+            stage = "queued"
+        elif any(stats.get(result) for result in ("found", "timed_out", "errors")):
+            stage = "spinning"
+        else:
+            stage = "token/login"
+        if scheduler.cancel(job):
+            record["stage"] = stage
+
+    canceller = asyncio.create_task(press_cancel())
+    try:
+        await scheduler.wait_turn(job)
+        job.cancel_token.raise_if_cancelled()
+        rewards = await scheduler.run(job, main.spin_lucky_wheel_async(f"bench{index}", "pw", args.spins, f"bench{index}", pipeline_window=1, stats=stats,
+                                                                     browser_session=scheduler.browser_session, adaptive_pacing=False, cancel=job.cancel_token))
+        record["partial_rewards"] = sum(rewards.values())
+        if job.cancel_token.cancelled:
+            _, record["reclaimed"] = await scheduler.reclaim(job)
+    except main.JobCancelled:
+        record["reclaimed"] = True
+    finally:
+        scheduler.finish(job)
+        canceller.cancel()
+    if job.cancel_token.cancelled:
+        record["cancel_to_freed"] = time.monotonic() - job.cancel_token.cancelled_at
+        record["found"] = stats.get("found", 0)
+    return record
+
+
+async def run_cancel_benchmark(args) -> None:
+    rng = random.Random(1)
+    scheduler = main.SpinScheduler(args.max_browsers, args.max_sessions, args.bound)
+    wall_start = time.perf_counter()
+    records = await asyncio.gather(*(cancelled_job(scheduler, i, args, rng) for i in range(args.jobs)))
+    wall = time.perf_counter() - wall_start
+    cancelled = [r for r in records if "cancel_to_freed" in r]
+    print(f"{args.jobs} jobs x {args.spins} spins ({args.max_sessions} sessions, {args.max_browsers} browsers, token stub {args.token_delay:.1f}s"
+          f"{', ignores cancel' if args.ignore_cancel else ''}), cancelled within {args.cancel_within:.1f}s, in {wall:.2f}s")
+    for stage in ("queued", "token/login", "spinning"):
+        times = sorted(r["cancel_to_freed"] for r in cancelled if r["stage"] == stage)
+        if times:
+            print(f"  {stage:<12} {len(times):>3} cancelled | cancel -> freed p50 {percentile(times, 0.5) * 1000:,.0f} ms | max {times[-1] * 1000:,.0f} ms")
+    partial = [r for r in cancelled if r["stage"] == "spinning"]
+    if partial:
+        print(f"  partial results kept: {sum(r['found'] for r in partial)} spins answered before the cancel, {sum(r.get('partial_rewards', 0) for r in partial):,} reward units")
+    leftover = scheduler.load()
+    worst = max((r["cancel_to_freed"] for r in cancelled), default=0.0)
+    overruns = sum(1 for r in cancelled if not r.get("reclaimed", True))
+    print(f"  worst case {worst:.2f}s (bound {args.bound:.1f}s) | {overruns} reclaim overrun(s) | {len(records) - len(cancelled)} finished before the cancel | "
+          f"scheduler afterwards: {leftover['running']} running, {leftover['queued']} queued")
+    if worst > args.bound + CANCEL_BOUND_SLACK or leftover["running"] or leftover["queued"]:
+        raise SystemExit("FAIL: a cancelled job held its resources past the bound")
+
+
+async def routed_job(scheduler: main.SpinScheduler, index: int, world: str, args) -> dict:
+    """One job through SpinScheduler with a router: admitted onto an endpoint of its world, then spun there."""
+    job = scheduler.submit(index % args.users, f"bench{index}", args.spins, world)
+    stats = {}
+    record = {"world": world, "submitted": time.monotonic()}
+    try:
+        await scheduler.wait_turn(job)
+        record["admitted"] = time.monotonic()
+        await scheduler.run(job, main.spin_lucky_wheel_async(f"bench{index}", "pw", args.spins, f"bench{index}", pipeline_window=args.window, stats=stats,
+                                                            browser_session=scheduler.browser_session, adaptive_pacing=False, cancel=job.cancel_token, route=job.lease))
+    except ConnectionError:
+        record["login_failed"] = True
+    finally:
+        record["endpoint"] = job.lease.endpoint.label if job.lease else None
+        record["finished"] = time.monotonic()
+        scheduler.finish(job)
+    record.update(found=stats.get("found", 0), errors=stats.get("errors", 0))
+    return record
+
+
+async def run_routing_benchmark(args, worlds: list, endpoints: list) -> None:
+    router = main.GGERouter(endpoints, worlds[0], max_sessions=args.max_per_endpoint, failure_threshold=args.failure_threshold, backoff_seconds=args.backoff)
+    scheduler = main.SpinScheduler(args.max_sessions, args.max_sessions, router=router)
+    wall_start = time.perf_counter()
+    records = await asyncio.gather(*(routed_job(scheduler, i, worlds[i % len(worlds)], args) for i in range(args.jobs)))
+    wall = time.perf_counter() - wall_start
+    print(f"{args.jobs} jobs x {args.spins} spins over {len(worlds)} world(s) / {len(endpoints)} endpoint(s) "
+          f"(max {args.max_per_endpoint} per endpoint, {args.max_sessions} overall, window {args.window}) in {wall:.2f}s")
+    violations = 0
+    for endpoint in router.endpoints():
+        ran = [r for r in records if r["endpoint"] == endpoint.label]
+        durations = sorted(r["finished"] - r["admitted"] for r in ran if "admitted" in r)
+        spins_per_second = sum(r["found"] for r in ran) / sum(durations) if durations and sum(durations) else 0.0
+        job_time = f"job time p50 {percentile(durations, 0.5):.2f}s, max {durations[-1]:.2f}s | {spins_per_second:,.1f} spins/s per job" if durations else "no jobs finished here"
+        print(f"  {endpoint.label:<24} {len(ran):>3} job(s) | {job_time} | peak {endpoint.peak_in_use}/{endpoint.max_sessions or '∞'} | "
+              f"{endpoint.failures} failure(s)")
+        if endpoint.max_sessions and endpoint.peak_in_use > endpoint.max_sessions:
+            violations += 1
+    for world in worlds:
+        waits = sorted(r["admitted"] - r["submitted"] for r in records if r["world"] == world and "admitted" in r)
+        print(f"  {world}: queue wait p50 {percentile(waits, 0.5):.2f}s, max {percentile(waits, 1.0):.2f}s")
+    dead_url = endpoints[-1][1] if args.dead_endpoint else None
+    dead_labels = {endpoint.label for endpoint in router.endpoints() if endpoint.url == dead_url}
+    login_failed = sum(1 for r in records if r.get("login_failed") and r["endpoint"] not in dead_labels)
+    dead_failed = sum(1 for r in records if r.get("login_failed") and r["endpoint"] in dead_labels)
+    errors = sum(r["errors"] for r in records)
+    print(f"  {sum(r['found'] for r in records):,} spins answered | {errors} error replies | {login_failed} failed login(s) | {violations} endpoint limit violation(s)"
+          + (f" | {dead_failed} job(s) lost to the dead endpoint before it backed off (no free sibling to move to)" if args.dead_endpoint else ""))
+    if errors or login_failed or violations:
+        raise SystemExit("FAIL: a job was misrouted, could not log in, or an endpoint ran over its limit")
+
+
+STARTUP_PROBE = """
+import json, time, main
+imported = main.process_uptime()
+started = time.perf_counter()
+if {eager}:
+    main.load_selenium()
+selenium_seconds = time.perf_counter() - started
+started = time.perf_counter()
+main.resolve_chromedriver()
+resolve_first = time.perf_counter() - started
+started = time.perf_counter()
+main.resolve_chromedriver()
+resolve_cached = time.perf_counter() - started
+manager_seconds = []
+if {manager}:
+    from webdriver_manager.chrome import ChromeDriverManager
+    for _ in range(3):
+        started = time.perf_counter()
+        try: ChromeDriverManager().install()
+        except Exception: pass
+        manager_seconds.append(time.perf_counter() - started)
+print(json.dumps({{"imported": imported, "ready": main.process_uptime(), "selenium": selenium_seconds, "resolve_first": resolve_first,
+                  "resolve_cached": resolve_cached, "manager": manager_seconds, "source": main.chromedriver_info.source}}))
+"""
+
+
+def run_startup_probe(eager: bool, manager: bool) -> dict:
+    """Starts a fresh interpreter that imports main (and, if `eager`, the Selenium stack, as before lazy imports)."""
+    env = dict(os.environ, LOG_QUEUE_SIZE="0", SPIN_LEDGER_PATH="")
+    output = subprocess.run([sys.executable, "-c", STARTUP_PROBE.format(eager=eager, manager=manager)], capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_startup_benchmark(args) -> None:
+    """Process start -> main imported, with lazy vs eager Selenium imports, plus the cost of resolving chromedriver."""
+    print(f"{args.runs} fresh interpreter(s) per mode (no Discord login: 'ready' is measured right after the browser stack would be loaded)")
+    for label, eager in (("eager Selenium imports (before)", True), ("lazy Selenium imports", False)):
+        probes = [run_startup_probe(eager, args.manager and eager) for _ in range(args.runs)]
+        imported = statistics.median(p["imported"] for p in probes)
+        ready = statistics.median(p["imported"] + (p["selenium"] if eager else 0.0) for p in probes)
+        print(f"  {label:<32} main imported after p50 {imported:.2f}s | start-up path incl. Selenium p50 {ready:.2f}s")
+    probe = probes[-1]
+    print(f"  chromedriver resolution (via {probe['source']}): first {probe['resolve_first'] * 1000:,.1f} ms, then {probe['resolve_cached'] * 1e6:,.1f} µs per browser start")
+    if args.manager:
+        manager_calls = [seconds for p in probes for seconds in p.get("manager", [])] or run_startup_probe(True, True)["manager"]
+        print(f"  ChromeDriverManager().install() per browser start (before): p50 {statistics.median(manager_calls) * 1000:,.0f} ms")
+
+
+async def run_workers_benchmark(args) -> None:
+    pool = main.RecaptchaProcessPool(args.processes, args.timeout, args.max_tasks, args.max_rss_mb, stub_delay=args.stub_delay)
+    await pool.start()
+    wall_start = time.perf_counter()
+    try:
+        tokens = await asyncio.gather(*(pool.get_token(f"bench{i}") for i in range(args.tasks)))
+    finally:
+        wall = time.perf_counter() - wall_start
+        await pool.shutdown()
+    print(f"{args.tasks} stub token requests on {args.processes} worker process(es) in {wall:.2f}s "
+          f"| {sum(1 for t in tokens if t)} tokens | {pool.stats_summary()}")
+
+
+def legacy_parse_reward_message(msg: str, rewards: defaultdict):
+    """parse_reward_message as it was before the table-driven decoder; reference for the decoder benchmark."""
+    try:
+        match = re.search(r"%xt%lws%1%0%(.*)%", msg) # Original regex seems fine
+        if not match:
+            if msg.startswith("%xt%"): # Non-reward xt message
+                pass # main.logger.debug(f"Non-reward xt message: {msg[:60]}")
+            return
+        json_str = match.group(1)
+        data = json.loads(json_str)
+
+        if "R" not in data or not isinstance(data["R"], list):
+            main.logger.info(f"ℹ️ No valid 'R' (Rewards) list in parsed JSON: {data}")
+            return
+
+        for item in data["R"]:
+            if not isinstance(item, list) or len(item) < 2:
+                main.logger.warning(f"  ⚠️ Skipping invalid reward item format: {item}")
+                continue
+            reward_type = item[0]
+            reward_data = item[1]
+            amount = 0
+            reward_name = None
+            try:
+                if reward_type == "U":
+                    if isinstance(reward_data, list) and len(reward_data) == 2:
+                        unit_id, amount = reward_data
+                        truppen_namen = { 215: "Schildmaid", 238: "Walküren-Scharfschützin", 227: "Beschützer des Nordens", 216: "Walküren-Waldläuferin" }
+                        reward_name = truppen_namen.get(unit_id, "Werkzeuge") # Default to Werkzeuge if unknown unit
+                    else: main.logger.warning(f"  ⚠️ Invalid format for type 'U': {reward_data}")
+                elif reward_type == "RI": amount = 1; reward_name = "Ausrüstung/Edelsteine"
+                elif reward_type == "CI": amount = 1; reward_name = "Konstrukte"
+                elif reward_type == "LM":
+                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Ausbaumarken"
+                    else: main.logger.warning(f"  ⚠️ Invalid format for type 'LM': {reward_data}")
+                elif reward_type == "LT":
+                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Baumarken"
+                    else: main.logger.warning(f"  ⚠️ Invalid format for type 'LT': {reward_data}")
+                elif reward_type == "STP":
+                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Sceattas"
+                    else: main.logger.warning(f"  ⚠️ Invalid format for type 'STP': {reward_data}")
+                elif reward_type == "SLWT":
+                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Lose"
+                    else: amount = 1; main.logger.warning(f"  ⚠️ Invalid/No quantity for 'SLWT', assuming 1: {reward_data}"); reward_name = "Lose"
+                elif reward_type == "LB":
+                    if isinstance(reward_data, list) and len(reward_data) > 1 and isinstance(reward_data[1], int): amount = reward_data[1]; reward_name = "Kisten"
+                    elif isinstance(reward_data, int): amount = reward_data; reward_name = "Kisten"
+                    else: amount = 1; main.logger.warning(f"  ⚠️ Unusual format for 'LB', assuming quantity 1: {reward_data}"); reward_name = "Kisten"
+                elif reward_type == "UE": amount = 1; reward_name = "Mehrweller"
+                elif reward_type == "C2":
+                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Rubine"
+                    else: main.logger.warning(f"  ⚠️ Invalid format for type 'C2': {reward_data}")
+                elif reward_type == "FKT":
+                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Ludwig-Geschenke"
+                    else: main.logger.warning(f"  ⚠️ Invalid format for type 'FKT': {reward_data}")
+                elif reward_type == "PTK":
+                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Beatrice-Geschenke"
+                    else: main.logger.warning(f"  ⚠️ Invalid format for type 'PTK': {reward_data}")
+                elif reward_type == "KTK":
+                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Ulrich-Geschenke"
+                    else: main.logger.warning(f"  ⚠️ Invalid format for type 'KTK': {reward_data}")
+                elif reward_type == "D": amount = 1; reward_name = "Dekorationen"
+                else:
+                    if isinstance(reward_data, int): amount = reward_data
+                    elif isinstance(reward_data, list) and len(reward_data) > 1 and isinstance(reward_data[1], int): amount = reward_data[1]
+                    else: amount = 1
+                    reward_name = f"Unbekannt_{reward_type}"
+                    main.logger.info(f"  -> Unknown reward type: {reward_type} with data {reward_data}. Counted as '{reward_name}'.")
+
+                if reward_name and amount > 0:
+                    rewards[reward_name] += amount
+            except Exception as parse_inner_err:
+                main.logger.error(f"  ❌ Error processing item {item}: {parse_inner_err}", exc_info=True)
+    except json.JSONDecodeError as e:
+        main.logger.error(f"❌ JSON parsing error for extracted string '{json_str}': {e}")
+    except Exception as e:
+        main.logger.error(f"❌ Unexpected error parsing message '{msg[:100]}...': {e}", exc_info=True)
+
+
+def synthetic_reward_frames(count: int, seed: int = 1) -> list:
+    """Reward frames like the stand-in sends, plus unknown types, invalid items and unrelated traffic."""
+    rng = random.Random(seed)
+    extra_lists = [
+        [["XYZ", 3]], [["Q", [1, 4]]], [["U", [999, 10]]], [["U", "bad"]], [["LB", "odd"]], [["SLWT", None]],
+        [["C2", 100], ["U", [216, 20]], ["D", 1]], ["not-a-list"], [["FKT", 0]],
+    ]
+    frames = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.05:
+            frames.append('%xt%gpi%1%0%{"PID":1}%') # Unrelated push traffic
+        elif roll < 0.15:
+            frames.append("%xt%lws%1%0%" + json.dumps({"R": rng.choice(extra_lists)}) + "%")
+        else:
+            frames.append("%xt%lws%1%0%" + json.dumps({"R": rng.choice(gge_standin.SAMPLE_REWARD_LISTS)}) + "%")
+    return frames
+
+
+def run_decoder_benchmark(args) -> None:
+    if args.frames:
+        with open(args.frames, encoding="utf-8") as f:
+            frames = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        frames = synthetic_reward_frames(args.count)
+
+    legacy_rewards = defaultdict(int)
+    for frame in frames:
+        legacy_parse_reward_message(frame, legacy_rewards)
+    counter = main.RewardCounter()
+    for frame in frames:
+        main.parse_reward_message(frame, counter)
+    identical = dict(legacy_rewards) == counter.to_dict()
+    print(f"{len(frames)} frames, output identical to legacy parser: {identical}")
+
+    for label, parse, make_rewards in (
+        ("legacy regex/if-chain", legacy_parse_reward_message, lambda: defaultdict(int)),
+        ("table-driven decoder", main.parse_reward_message, main.RewardCounter),
+    ):
+        best = float("inf")
+        for _ in range(args.repeat):
+            rewards = make_rewards()
+            start = time.perf_counter()
+            for frame in frames:
+                parse(frame, rewards)
+            best = min(best, time.perf_counter() - start)
+        print(f"{label:>22}: {len(frames) / best:,.0f} frames/s")
+
+
+
+def legacy_format_rewards_field_value(rewards: dict) -> str:
+    """format_rewards_field_value as it was before the reward catalog; reference for the render benchmark."""
+    if not rewards:
+        return "No rewards available."
+    direct_emoji_map = {
+        "Werkzeuge": "<:tools:1359522120509554922>", "Ausrüstung/Edelsteine": "<:gear:1359518850713911488>",
+        "Konstrukte": "<:konstrukte:1359518720531235047>", "Kisten": "<:chest:1359518414154104974>",
+        "Dekorationen": "<:dekorationen:1359518108900917359>", "Mehrweller": "<:mehrweller:1359517882064699483>",
+        "Sceattas": "<:sceatta:1359517377066438747>", "Beatrice-Geschenke": "<:beatrice:1359517272640721170>",
+        "Ulrich-Geschenke": "<:ulrich:1359516848474820789>", "Ludwig-Geschenke": "<:ludwig:1359516694716092416>",
+        "Baumarken": "<:baumarken:1359516243463373030>", "Ausbaumarken": "<:ausbaumarken:1359516063477268622>",
+        "Rubine": "<:ruby:1359515929951731812>", "Lose": "<:ticket:1359508197429219501>",
+        "Beschützer des Nordens": "<:beschuetzer:1359481568430915765>", "Schildmaid": "<:schildmaid:1359479372041683015>",
+        "Walküren-Scharfschützin": "<:scharfschuetzin:1359477765421793422>", "Walküren-Waldläuferin": "<:waldlaeuferin:1359477735856013576>",
+    }
+    sort_priority = {
+        "Schildmaid": 0, "Walküren-Scharfschützin": 0, "Beschützer des Nordens": 0, "Walküren-Waldläuferin": 0,
+        "Lose": 1, "Rubine": 2, "Ludwig-Geschenke": 3, "Ulrich-Geschenke": 4, "Beatrice-Geschenke": 5,
+        "Ausbaumarken": 6, "Baumarken": 7, "Sceattas": 8,
+    }
+
+    def get_reward_sort_key(item):
+        key, _ = item
+        return (sort_priority.get(key, 99), key)
+
+    reward_lines_list = []
+    for reward_key, reward_value in sorted(rewards.items(), key=get_reward_sort_key):
+        emoji_string = direct_emoji_map.get(reward_key)
+        if emoji_string:
+            reward_lines_list.append(f"{emoji_string} {reward_value:,}")
+        else:
+            reward_lines_list.append(f"**{reward_key}**: {reward_value:,}")
+    return "\n".join(reward_lines_list)
+
+
+def progress_snapshots(spins: int, edit_every: int) -> list:
+    """Reward totals as a live progress message sees them: one snapshot every `edit_every` decoded spins."""
+    counter = main.RewardCounter()
+    snapshots = []
+    for index, frame in enumerate(synthetic_reward_frames(spins), 1):
+        main.parse_reward_message(frame, counter)
+        if index % edit_every == 0:
+            snapshots.append(counter.to_dict())
+    return snapshots
+
+
+def best_seconds(repeat: int, work) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        work()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_render_benchmark(args) -> None:
+    catalog_rewards = {info.name: info.sample_amount for info in main.REWARD_CATALOG}
+    snapshots = progress_snapshots(args.spins, args.edit_every)
+    large_rewards = dict(catalog_rewards, **{f"Unbekannt_T{n}": 1000 + n * 37 for n in range(args.unknown)})
+
+    identical = all("\n".join(main.render_reward_lines(r)) == legacy_format_rewards_field_value(r) for r in [catalog_rewards] + snapshots)
+    print(f"Catalog set and {len(snapshots)} progress snapshots render identically to the legacy formatter: {identical}")
+
+    def cold_render():
+        main._reward_line_cache.clear()
+        main.format_rewards_field_value(catalog_rewards)
+
+    for label, seconds in (
+        ("legacy, catalog set", best_seconds(args.repeat, lambda: [legacy_format_rewards_field_value(catalog_rewards) for _ in range(args.renders)])),
+        ("catalog, cold cache", best_seconds(args.repeat, lambda: [cold_render() for _ in range(args.renders)])),
+        ("catalog, warm cache", best_seconds(args.repeat, lambda: [main.format_rewards_field_value(catalog_rewards) for _ in range(args.renders)])),
+    ):
+        print(f"{label:>22}: {seconds / args.renders * 1e6:7.2f} µs per render")
+
+    legacy_progress = best_seconds(args.repeat, lambda: [legacy_format_rewards_field_value(r) for r in snapshots])
+    main._reward_line_cache.clear()
+    catalog_progress = best_seconds(args.repeat, lambda: [main.chunk_reward_lines(main.render_reward_lines(r)) for r in snapshots])
+    unchanged = sum(1 for previous, current in zip(snapshots, snapshots[1:]) for name, amount in current.items() if previous.get(name) == amount)
+    lines = sum(len(r) for r in snapshots[1:])
+    print(f"Progress edits ({len(snapshots)} over {args.spins:,} spins, {unchanged / max(1, lines):.0%} of lines unchanged between edits): "
+          f"legacy {legacy_progress / len(snapshots) * 1e6:.2f} µs, catalog + chunking {catalog_progress / len(snapshots) * 1e6:.2f} µs per edit")
+
+    legacy_value = legacy_format_rewards_field_value(large_rewards)
+    chunks = main.chunk_reward_lines(main.render_reward_lines(large_rewards))
+    large_seconds = best_seconds(args.repeat, lambda: main.chunk_reward_lines(main.render_reward_lines(large_rewards)))
+    within_limits = all(len(chunk) <= main.EMBED_FIELD_VALUE_LIMIT for chunk in chunks) and sum(map(len, chunks)) <= main.EMBED_REWARD_FIELDS_BUDGET
+    print(f"Large set ({len(large_rewards)} reward types): legacy value {len(legacy_value):,} chars "
+          f"({'over' if len(legacy_value) > main.EMBED_FIELD_VALUE_LIMIT else 'within'} Discord's {main.EMBED_FIELD_VALUE_LIMIT}) | "
+          f"catalog: {len(chunks)} field(s), longest {max(map(len, chunks)):,}, {sum(map(len, chunks)):,} chars in total, "
+          f"{large_seconds * 1e6:.1f} µs | within limits: {within_limits}")
+    if not (identical and within_limits):
+        raise SystemExit(1)
+
+LOCAL_RECAPTCHA_STUB = """
+window.grecaptcha = {
+    ready: cb => cb(),
+    execute: (siteKey, options) => Promise.resolve('local-token-' + Date.now()),
+};
+document.addEventListener('DOMContentLoaded', () => {
+    const badge = document.createElement('div');
+    badge.className = 'grecaptcha-badge';
+    document.body.appendChild(badge);
+});
+"""
+ASSET_CONTENT_TYPES = {".png": "image/png", ".woff2": "font/woff2", ".mp3": "audio/mpeg"}
+
+
+def synthetic_game_page(assets: int) -> dict:
+    """A page shaped like the game page: heavy images/fonts/media around an iframe#game that carries the badge."""
+    images = "".join(f'<img src="/asset/outer{i}.png">' for i in range(assets // 2))
+    game_images = "".join(f'<img src="/asset/game{i}.png">' for i in range(assets - assets // 2))
+    font = "<style>@font-face{font-family:g;src:url(/asset/font.woff2)} body{font-family:g}</style>"
+    return {
+        "/": f"<html><head>{font}</head><body>{images}<iframe id=\"game\" src=\"/game.html\"></iframe></body></html>",
+        "/game.html": f"<html><head>{font}<script src=\"/recaptcha/api.js\"></script></head><body>{game_images}"
+                      f"<audio src=\"/asset/music.mp3\" preload=\"auto\"></audio></body></html>",
+    }
+
+
+def start_local_page_server(port: int, page_dir: str, assets: int, asset_kb: int, asset_latency: float):
+    """Serves the benchmark page on its own event loop thread."""
+    pages = synthetic_game_page(assets)
+    payload = os.urandom(asset_kb * 1024)
+
+    async def page(request):
+        return web.Response(text=pages[request.path], content_type="text/html")
+
+    async def asset(request):
+        await asyncio.sleep(asset_latency)
+        return web.Response(body=payload, content_type=ASSET_CONTENT_TYPES.get(os.path.splitext(request.path)[1], "application/octet-stream"))
+
+    async def recaptcha_stub(request):
+        return web.Response(text=LOCAL_RECAPTCHA_STUB, content_type="application/javascript")
+
+    app = web.Application()
+    if page_dir:
+        async def index(request):
+            return web.FileResponse(os.path.join(page_dir, "index.html"))
+        app.router.add_get("/", index)
+        app.router.add_static("/", page_dir)
+    else:
+        app.router.add_get("/", page)
+        app.router.add_get("/game.html", page)
+        app.router.add_get("/asset/{name}", asset)
+        app.router.add_get("/recaptcha/api.js", recaptcha_stub)
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="bench-page", daemon=True).start()
+    ready.wait()
+
+
+def run_browser_benchmark(args) -> None:
+    start_local_page_server(args.port, args.page_dir, args.assets, args.asset_kb, args.asset_latency)
+    main.GGE_LOGIN_URL_FOR_RCT = f"http://127.0.0.1:{args.port}/"
+    print(f"Page: {args.page_dir or f'synthetic, {args.assets} assets of {args.asset_kb} KiB, {args.asset_latency * 1000:.0f} ms each'} "
+          f"| block patterns: {len(main.lean_profile_block_patterns())}, allow patterns: {len(main.RECAPTCHA_ALLOW_URLS)}")
+    results = {}
+    for profile, lean in (("full", False), ("lean", True)):
+        reports = []
+        for run in range(args.runs):
+            driver = main.create_recaptcha_driver(lean=lean, report=True)
+            try:
+                reports.append(main.load_recaptcha_page(driver, f"bench-{profile}{run}"))
+                if not main.execute_recaptcha(driver, f"bench-{profile}{run}"):
+                    print(f"  {profile} run {run}: grecaptcha.execute returned no token")
+            finally:
+                driver.quit()
+        results[profile] = reports
+        print(f"  {profile}: time-to-badge median {statistics.median(r.time_to_badge for r in reports):.2f}s "
+              f"(min {min(r.time_to_badge for r in reports):.2f}s) | {statistics.median(r.requests for r in reports):.0f} requests | "
+              f"{statistics.median(r.bytes_loaded for r in reports) / 1024:,.0f} KiB loaded | {statistics.median(r.blocked_total for r in reports):.0f} blocked")
+    full_bytes = statistics.median(r.bytes_loaded for r in results["full"])
+    lean_bytes = statistics.median(r.bytes_loaded for r in results["lean"])
+    print(f"  lean profile saves {(full_bytes - lean_bytes) / 1024:,.0f} KiB per load "
+          f"({(1 - lean_bytes / full_bytes) * 100 if full_bytes else 0:.0f}%) and "
+          f"{statistics.median(r.time_to_badge for r in results['full']) - statistics.median(r.time_to_badge for r in results['lean']):.2f}s to the badge")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    sessions = sub.add_parser("sessions", help="Concurrent login+spin sessions: threaded websocket-client vs. asyncio")
+    sessions.add_argument("--sessions", type=int, default=50)
+    sessions.add_argument("--spins", type=int, default=20)
+    sessions.add_argument("--window", type=int, default=1, help="Spins in flight per session")
+    sessions.add_argument("--send-delay", type=float, default=0.0, help="Lockstep delay before each spin (the bot uses 0.3)")
+    sessions.add_argument("--timeout", type=float, default=15.0, help="Per-spin reward timeout")
+
+    e2e = sub.add_parser("e2e", help="Login latency, spins/s, spin RTT percentiles and CPU per spin through the asyncio path")
+    e2e.add_argument("--sessions", type=int, default=20)
+    e2e.add_argument("--concurrency", type=int, default=10, help="Sessions running at once")
+    e2e.add_argument("--spins", type=int, default=50)
+    e2e.add_argument("--window", type=int, default=1, help="Spins in flight per session")
+    e2e.add_argument("--send-delay", type=float, default=0.0, help="Lockstep delay before each spin (the bot uses 0.3)")
+    e2e.add_argument("--timeout", type=float, default=15.0, help="Per-spin reward timeout")
+    e2e.add_argument("--token-delay", type=float, default=0.0, help="Seconds the stubbed reCAPTCHA step takes")
+    e2e.add_argument("--login-mode", choices=("overlapped", "sequential"), default="overlapped", help="Connect while the token is obtained, or after it")
+    e2e.add_argument("--jitter", type=float, default=0.0, help="Stand-in extra uniform random reply delay")
+    e2e.add_argument("--noise", type=float, default=0.0, help="Stand-in unrelated push frames per second per session")
+    e2e.add_argument("--connect-delay", type=float, default=0.0, help="Stand-in delay before answering the WebSocket upgrade")
+    e2e.add_argument("--disconnect", type=float, default=0.0, help="Stand-in probability that a spin drops the connection")
+    e2e.add_argument("--drop", type=float, default=0.0, help="Stand-in probability that a spin is never answered")
+    e2e.add_argument("--adaptive", action="store_true", help="Drive the spin loop with SpinPacer instead of --window/--send-delay")
+    e2e.add_argument("--max-rate", type=float, default=10.0, help="Adaptive pacing: upper bound of the send rate, spins/s")
+    e2e.add_argument("--max-window", type=int, default=8, help="Adaptive pacing: upper bound of spins in flight")
+
+    workers = sub.add_parser("workers", help="reCAPTCHA worker process pool with the stub driver: queue wait, recycling, restarts")
+    workers.add_argument("--processes", type=int, default=2)
+    workers.add_argument("--tasks", type=int, default=20)
+    workers.add_argument("--stub-delay", type=float, default=0.5, help="Seconds the stub driver takes per token")
+    workers.add_argument("--timeout", type=float, default=5.0, help="Hard per-task timeout (set below --stub-delay to exercise kills)")
+    workers.add_argument("--max-tasks", type=int, default=5, help="Tokens before a worker is recycled")
+    workers.add_argument("--max-rss-mb", type=float, default=1500.0)
+
+    decoder = sub.add_parser("decoder", help="parse_reward_message throughput and equivalence with the legacy parser")
+    decoder.add_argument("--frames", help="File with one recorded frame per line (default: synthetic frames)")
+    decoder.add_argument("--count", type=int, default=50000, help="Number of synthetic frames")
+    decoder.add_argument("--repeat", type=int, default=5)
+
+    render = sub.add_parser("render", help="Reward embed rendering: legacy formatter vs catalog with line cache, progress edits and oversized reward sets")
+    render.add_argument("--renders", type=int, default=2000, help="Renders per timing of the catalog set")
+    render.add_argument("--spins", type=int, default=20000, help="Spins behind the progress-edit snapshots")
+    render.add_argument("--edit-every", type=int, default=50, help="Spins between progress edits")
+    render.add_argument("--unknown", type=int, default=300, help="Unknown reward types in the large set")
+    render.add_argument("--repeat", type=int, default=5)
+
+    browser = sub.add_parser("browser", help="Time-to-badge and bytes per page load, full vs lean Chrome profile (needs Chrome)")
+    browser.add_argument("--runs", type=int, default=3, help="Page loads per profile")
+    browser.add_argument("--page-dir", help="Serve a saved copy of the game page (index.html + files) instead of the synthetic page")
+    browser.add_argument("--assets", type=int, default=60, help="Synthetic page: number of image assets")
+    browser.add_argument("--asset-kb", type=int, default=200, help="Synthetic page: size of each asset")
+    browser.add_argument("--asset-latency", type=float, default=0.05, help="Synthetic page: seconds before each asset is served")
+    browser.add_argument("--port", type=int, default=8780)
+
+    logs = sub.add_parser("logging", help="Per-spin logging overhead: synchronous handler vs queued writer, with and without sampling")
+    logs.add_argument("--sessions", type=int, default=10)
+    logs.add_argument("--concurrency", type=int, default=10, help="Sessions running at once")
+    logs.add_argument("--spins", type=int, default=1000)
+    logs.add_argument("--window", type=int, default=8, help="Spins in flight per session")
+    logs.add_argument("--sink", default=os.devnull, help="Where the log lines go (a file or a terminal shows the I/O cost better than /dev/null)")
+    logs.add_argument("--queue-size", type=int, default=10000, help="Log queue capacity for the queued modes")
+    logs.add_argument("--sample-every", type=int, default=100, help="Reward message sampling for the last mode")
+    logs.set_defaults(login_mode="overlapped", adaptive=False, send_delay=0.0, timeout=15.0, token_delay=0.0, jitter=0.0, noise=0.0,
+                      connect_delay=0.0, disconnect=0.0, drop=0.0)
+
+    cancel = sub.add_parser("cancel", help="Cancel jobs at random points (queued, token step, spinning); checks the cancel -> freed bound")
+    cancel.add_argument("--jobs", type=int, default=30)
+    cancel.add_argument("--users", type=int, default=10, help="Distinct Discord users the jobs are spread over")
+    cancel.add_argument("--spins", type=int, default=500)
+    cancel.add_argument("--max-sessions", type=int, default=8, help="Scheduler WebSocket slots")
+    cancel.add_argument("--max-browsers", type=int, default=2, help="Scheduler browser slots")
+    cancel.add_argument("--token-delay", type=float, default=2.0, help="Seconds the stubbed reCAPTCHA step takes")
+    cancel.add_argument("--cancel-within", type=float, default=6.0, help="Each job is cancelled at a uniform random time in [0, this] after submission")
+    cancel.add_argument("--bound", type=float, default=main.SPIN_CANCEL_TIMEOUT, help="Worst-case seconds from cancel to freed resources")
+    cancel.add_argument("--ignore-cancel", action="store_true", help="Stubbed token step ignores cancellation (exercises the reclaim timeout)")
+    cancel.set_defaults(timeout=15.0, jitter=0.0, noise=0.0, connect_delay=0.0, disconnect=0.0, drop=0.0)
+
+    startup = sub.add_parser("startup", help="Process start to main imported with lazy vs eager Selenium imports, and chromedriver resolution cost")
+    startup.add_argument("--runs", type=int, default=5, help="Fresh interpreters per mode")
+    startup.add_argument("--manager", action="store_true", help="Also time ChromeDriverManager().install() per call (needs webdriver_manager, may hit the network)")
+
+    routing = sub.add_parser("routing", help="Jobs for several worlds over several stand-in endpoints: per-endpoint limits, slow and dead endpoints")
+    routing.add_argument("--worlds", type=int, default=2)
+    routing.add_argument("--endpoints-per-world", type=int, default=2)
+    routing.add_argument("--jobs", type=int, default=24)
+    routing.add_argument("--users", type=int, default=6, help="Distinct Discord users the jobs are spread over")
+    routing.add_argument("--spins", type=int, default=40)
+    routing.add_argument("--window", type=int, default=4, help="Spins in flight per job")
+    routing.add_argument("--max-per-endpoint", type=int, default=3, help="Jobs per endpoint at once")
+    routing.add_argument("--max-sessions", type=int, default=12, help="Scheduler WebSocket (and browser) slots overall")
+    routing.add_argument("--slow-latency", type=float, default=0.25, help="Reply latency of the first world's first endpoint")
+    routing.add_argument("--dead-endpoint", action="store_true", help="Add an endpoint with nothing listening to the first world")
+    routing.add_argument("--failure-threshold", type=int, default=2, help="Failures in a row before an endpoint backs off")
+    routing.add_argument("--backoff", type=float, default=5.0, help="First backoff in seconds")
+    routing.add_argument("--token-delay", type=float, default=0.0, help="Seconds the stubbed reCAPTCHA step takes")
+
+    for p in (sessions, e2e, logs, cancel, routing):
+        p.add_argument("--latency", type=float, default=0.05, help="Stand-in server reply latency in seconds")
+        p.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    main.logger.setLevel(logging.CRITICAL if args.benchmark in ("decoder", "render") else logging.INFO if args.benchmark == "logging" else logging.WARNING)
+    if args.benchmark == "decoder":
+        run_decoder_benchmark(args)
+        return
+    if args.benchmark == "render":
+        run_render_benchmark(args)
+        return
+    if args.benchmark == "browser":
+        main.logger.setLevel(logging.ERROR)
+        run_browser_benchmark(args)
+        return
+    if args.benchmark == "workers":
+        asyncio.run(run_workers_benchmark(args))
+        return
+    if args.benchmark == "startup":
+        run_startup_benchmark(args)
+        return
+
+    if args.benchmark == "routing":
+        # One stand-in process per endpoint, each hosting only its own world
+        worlds = [f"EmpireEx_{2 + n}" for n in range(args.worlds)]
+        endpoints, servers = [], []
+        for index in range(args.worlds * args.endpoints_per_world):
+            world, port = worlds[index // args.endpoints_per_world], args.port + index
+            latency = args.slow_latency if index == 0 else args.latency
+            ready = multiprocessing.Event()
+            options = {"latency": latency, "world": world, "seed": index}
+            servers.append(multiprocessing.Process(target=gge_standin.run_standin_process, args=(port, options, ready), daemon=True))
+            servers[-1].start()
+            ready.wait()
+            endpoints.append((world, f"ws://127.0.0.1:{port}/"))
+        if args.dead_endpoint:
+            endpoints.append((worlds[0], f"ws://127.0.0.1:{args.port + 100}/"))
+        stub_recaptcha_token(args.token_delay)
+        try:
+            asyncio.run(run_routing_benchmark(args, worlds, endpoints))
+        finally:
+            for server in servers:
+                server.terminate()
+        return
+
+    if args.benchmark in ("e2e", "logging", "cancel"):
+        # The stand-in runs in its own process so the CPU figures only cover the client code
+        args.seed = 1
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=gge_standin.run_standin_process, args=(args.port, gge_standin.server_options_from_args(args), ready), daemon=True)
+        server.start()
+        ready.wait()
+        main.GGE_WEBSOCKET_URL = f"ws://127.0.0.1:{args.port}/"
+        stub_recaptcha_token(args.token_delay, honour_cancel=not getattr(args, "ignore_cancel", False))
+        try:
+            if args.benchmark == "logging":
+                run_logging_benchmark(args)
+            elif args.benchmark == "cancel":
+                asyncio.run(run_cancel_benchmark(args))
+            else:
+                asyncio.run(run_e2e_benchmark(args))
+        finally:
+            server.terminate()
+        return
+
+    gge_standin.start_standin_in_thread(port=args.port, latency=args.latency, seed=1)
+    main.GGE_WEBSOCKET_URL = f"ws://127.0.0.1:{args.port}/"
+    if args.benchmark == "sessions":
+        asyncio.run(run_sessions_benchmark(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,258 @@
+"""Record-and-replay capture of raw GGE WebSocket sessions.
+
+Set GGE_CAPTURE_FILE to make main.py append every frame a session sends and receives to a
+gzip file. Each line is a compact JSON record:
+
+    [session id, seconds since session start (monotonic), direction, frame]
+
+direction is "s" (sent), "r" (received), "h" (session header; frame is a JSON object) or
+"e" (session end). Records are buffered per session and appended as separate gzip members,
+so concurrent sessions never interleave inside a member and the file stays append-only;
+gzip readers see one continuous stream. PW, RCT and NOM values are redacted before writing.
+Compression and file writes happen on one writer thread, never on the event loop.
+
+Replaying streams the file, so captures never have to fit in memory:
+
+    python gge_capture.py replay capture.jsonl.gz                       # received frames through the decoder, full speed
+    python gge_capture.py replay capture.jsonl.gz --realtime            # same, with the recorded pacing
+    python gge_capture.py replay capture.jsonl.gz --target ws://127.0.0.1:8765/ --realtime   # drive gge_standin.py
+"""
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger('discord.spinbot.capture')
+
+REDACTED = "<redacted>"
+_SECRET_FIELD_RE = re.compile(r'("(?:PW|RCT|NOM)"\s*:\s*)"(?:[^"\\]|\\.)*"')
+RECORD_SENT, RECORD_RECEIVED, RECORD_HEADER, RECORD_END = "s", "r", "h", "e"
+
+
+def redact_frame(frame: str) -> str:
+    """Blanks the password, reCAPTCHA token and account name fields of lli/vln payloads."""
+    if '"PW"' not in frame and '"RCT"' not in frame and '"NOM"' not in frame:
+        return frame
+    return _SECRET_FIELD_RE.sub(lambda m: f'{m.group(1)}"{REDACTED}"', frame)
+
+
+class CaptureWriter:
+    """Appends gzip members to one capture file; shared by all sessions of the process.
+
+    append() only queues a chunk of records; a writer thread, started on first use, compresses
+    and writes them. At most `max_pending` chunks wait: beyond that chunks are dropped and
+    counted, like LOG_QUEUE_SIZE does for log records. close() writes what is queued and stops.
+    """
+
+    def __init__(self, path: str, flush_records: int = 256, max_pending: int = 1024):
+        self.path = path
+        self.flush_records = flush_records
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._session_ids = itertools.count(1)
+        self._run_id = f"{os.getpid()}-{int(time.time())}"
+        self.records_written = 0
+        self.bytes_written = 0
+        self.chunks_dropped = 0
+
+    def session(self, **header) -> "SessionRecorder":
+        return SessionRecorder(self, f"{self._run_id}-{next(self._session_ids)}", header)
+
+    def append(self, lines: List[str]):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(lines)
+        except queue.Full:
+            self.chunks_dropped += 1
+            if self.chunks_dropped == 1:
+                logger.warning(f"Capture writer is falling behind; dropping records for {self.path}.")
+
+    def _run(self):
+        while True:
+            lines = self._queue.get()
+            if lines is None:
+                return
+            member = gzip.compress("".join(lines).encode("utf-8"))
+            try:
+                with open(self.path, "ab") as f:
+                    f.write(member)
+            except OSError as e:
+                logger.error(f"Could not append to capture file {self.path}: {e}")
+                continue
+            self.records_written += len(lines)
+            self.bytes_written += len(member)
+
+    def close(self, timeout: float = 10.0):
+        """Writes the queued chunks and stops the writer thread. Blocking."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+class SessionRecorder:
+    """Buffers the records of one session and hands them to the writer in chunks."""
+    __slots__ = ("writer", "session_id", "started", "buffer", "closed")
+
+    def __init__(self, writer: CaptureWriter, session_id: str, header: dict):
+        self.writer = writer
+        self.session_id = session_id
+        self.started = time.monotonic()
+        self.buffer: List[str] = []
+        self.closed = False
+        self._record(RECORD_HEADER, json.dumps(dict(header, started=time.time())))
+
+    def _record(self, direction: str, frame: str):
+        if self.closed:
+            return
+        elapsed = round(time.monotonic() - self.started, 6)
+        self.buffer.append(json.dumps([self.session_id, elapsed, direction, redact_frame(frame)], ensure_ascii=False) + "\n")
+        if len(self.buffer) >= self.writer.flush_records:
+            self.flush()
+
+    def sent(self, frame: str):
+        self._record(RECORD_SENT, frame)
+
+    def received(self, frame):
+        self._record(RECORD_RECEIVED, frame.decode("utf-8", errors="replace") if isinstance(frame, bytes) else frame)
+
+    def flush(self):
+        if self.buffer:
+            lines, self.buffer = self.buffer, []
+            self.writer.append(lines)
+
+    def close(self):
+        if not self.closed:
+            self._record(RECORD_END, "")
+            self.closed = True
+            self.flush()
+
+
+def iter_capture(path: str) -> Iterator[list]:
+    """Streams [session id, t, direction, frame] records from a capture file."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class ReplayPacer:
+    """Sleeps so each session's frames are replayed with their recorded spacing (divided by `speed`)."""
+    def __init__(self, realtime: bool, speed: float = 1.0):
+        self.realtime = realtime
+        self.speed = speed
+        self.session_starts = {}
+
+    def delay(self, session_id: str, t: float) -> float:
+        if not self.realtime:
+            return 0.0
+        start = self.session_starts.setdefault(session_id, time.monotonic() - t / self.speed)
+        return start + t / self.speed - time.monotonic()
+
+
+def replay_decoder(path: str, realtime: bool = False, speed: float = 1.0) -> dict:
+    """Feeds every received frame through main.parse_reward_message; returns per-run stats."""
+    import main
+    pacer = ReplayPacer(realtime, speed)
+    counter = main.RewardCounter()
+    classifier = main.FrameClassifier()
+    sessions = set()
+    frames = reward_frames = 0
+    decode_seconds = 0.0
+    for session_id, t, direction, frame in iter_capture(path):
+        sessions.add(session_id)
+        if direction != RECORD_RECEIVED:
+            continue
+        delay = pacer.delay(session_id, t)
+        if delay > 0:
+            time.sleep(delay)
+        frames += 1
+        start = time.perf_counter()
+        command, status = classifier.classify(frame)
+        if command == b"lws" and status == 0:
+            reward_frames += 1
+            main.parse_reward_message(frame, counter)
+        decode_seconds += time.perf_counter() - start
+    return {"sessions": len(sessions), "frames": frames, "reward_frames": reward_frames,
+            "decode_seconds": decode_seconds, "rewards": counter.to_dict(), "frame_counts": classifier.frame_counts()}
+
+
+async def replay_to_server(path: str, url: str, realtime: bool = False, speed: float = 1.0, reply_grace: float = 2.0) -> dict:
+    """Re-sends each recorded session's sent frames over its own connection to `url` (e.g. gge_standin.py)."""
+    import aiohttp
+    pacer = ReplayPacer(realtime, speed)
+    stats = {"sessions": 0, "frames_sent": 0, "frames_received": 0}
+    connections = {}
+
+    async def drain(ws):
+        async for msg in ws:
+            if msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                stats["frames_received"] += 1
+
+    async def finish(session_id):
+        ws, reader = connections.pop(session_id)
+        await asyncio.sleep(reply_grace if not realtime else 0.2)
+        await ws.close()
+        reader.cancel()
+
+    async with aiohttp.ClientSession() as http:
+        for session_id, t, direction, frame in iter_capture(path):
+            if direction == RECORD_HEADER:
+                ws = await http.ws_connect(url, max_msg_size=0)
+                connections[session_id] = (ws, asyncio.create_task(drain(ws)))
+                stats["sessions"] += 1
+            elif direction == RECORD_SENT and session_id in connections:
+                delay = pacer.delay(session_id, t)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await connections[session_id][0].send_str(frame)
+                stats["frames_sent"] += 1
+            elif direction == RECORD_END and session_id in connections:
+                await finish(session_id)
+        for session_id in list(connections):
+            await finish(session_id)
+    return stats
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay = sub.add_parser("replay", help="Stream a capture through the decoder or against a server")
+    replay.add_argument("path")
+    replay.add_argument("--realtime", action="store_true", help="Keep the recorded spacing between frames")
+    replay.add_argument("--speed", type=float, default=1.0, help="Pacing multiplier for --realtime")
+    replay.add_argument("--target", help="WebSocket URL to send the recorded client frames to instead of decoding")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.target:
+        stats = asyncio.run(replay_to_server(args.path, args.target, args.realtime, args.speed))
+        print(f"Replayed {stats['sessions']} sessions to {args.target} in {time.perf_counter() - start:.2f}s: "
+              f"{stats['frames_sent']} frames sent, {stats['frames_received']} received")
+        return
+
+    logging.getLogger('discord.spinbot').setLevel(logging.WARNING)
+    stats = replay_decoder(args.path, args.realtime, args.speed)
+    wall = time.perf_counter() - start
+    rate = stats["frames"] / stats["decode_seconds"] if stats["decode_seconds"] else 0.0
+    print(f"Replayed {stats['sessions']} sessions, {stats['frames']} received frames ({stats['reward_frames']} rewards) in {wall:.2f}s "
+          f"| decode {rate:,.0f} frames/s")
+    print(f"Frames by command: {stats['frame_counts']}")
+    print(f"Rewards: {stats['rewards']}")
+
+
+if __name__ == "__main__":
+    main_cli()
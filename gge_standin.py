@@ -0,0 +1,269 @@
+"""Local stand-in for the GGE game WebSocket server.
+
+Speaks the subset of the protocol GGEAsyncSession in main.py and the threaded baseline in
+benchmark.py use, so login and spinning can be exercised offline:
+
+    python gge_standin.py --port 8765 --latency 0.05 --jitter 0.02 --noise 20 --disconnect 0.001
+    GGE_WEBSOCKET_URL=ws://127.0.0.1:8765/ python main.py
+
+- verChk / login / vln get SmartFox-style acknowledgements.
+- pin (keepalive) answers %xt%pin%1%0%%.
+- lli answers %xt%lli%1%0%...% (or a non-zero status for tokens listed in reject_tokens).
+- lws answers %xt%lws%1%0%{"R": [...]}% with a weighted, realistic reward list.
+- The WebSocket upgrade can be delayed by `connect_delay` to mimic TCP + TLS setup.
+- Replies leave in order after latency + uniform(0, jitter) seconds.
+- After login, unrelated %xt% push traffic is sent at `noise_per_second`.
+- Each spin drops the connection with probability `disconnect_probability`.
+- Each spin goes unanswered with probability `drop_probability` (a lost reply).
+- With `world` set, %xt% commands addressed to another world get WRONG_WORLD_STATUS, so
+  several stand-ins on different ports can play different worlds.
+
+Replies are sent as binary frames, like the live server does.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import threading
+from typing import Iterable, Optional
+
+from aiohttp import web, WSMsgType
+
+logger = logging.getLogger('discord.spinbot.standin')
+
+# (weight, reward list) pairs; roughly the mix seen on the live wheel
+REWARD_OUTCOMES = [
+    (14, [["U", [215, 250]]]),
+    (10, [["U", [238, 190]]]),
+    (10, [["U", [227, 210]]]),
+    (8, [["U", [216, 175]]]),
+    (12, [["U", [1, 300]]]),
+    (8, [["C2", 500]]),
+    (10, [["SLWT", 1]]),
+    (6, [["LM", 40]]),
+    (6, [["LT", 12]]),
+    (5, [["STP", 5]]),
+    (3, [["FKT", 1]]),
+    (3, [["KTK", 1]]),
+    (3, [["PTK", 1]]),
+    (4, [["LB", [3, 1]]]),
+    (3, [["RI", {"ID": 1}]]),
+    (2, [["CI", {"ID": 7}]]),
+    (2, [["UE", {"ID": 3}]]),
+    (2, [["D", {"ID": 12}]]),
+    (4, [["U", [215, 125]], ["SLWT", 1]]),
+    (1, [["XYZ", 2]]), # An unknown type now and then
+]
+SAMPLE_REWARD_LISTS = [rewards for _, rewards in REWARD_OUTCOMES]
+REWARD_WEIGHTS = [weight for weight, _ in REWARD_OUTCOMES]
+
+NOISE_FRAMES = [
+    '%xt%gbd%1%0%{"gpi":{"PID":1},"gcu":{"C1":51234,"C2":500}}%',
+    '%xt%irc%1%0%{"CID":4,"M":"standin chat"}%',
+    '%xt%gcu%1%0%{"C1":51250,"C2":500}%',
+    '%xt%sce%1%0%{"SID":3}%',
+    '%xt%ain%1%0%{"A":{"AID":77}}%',
+]
+DEFAULT_REJECT_STATUS = 21 # Arbitrary non-zero lli status used for rejected tokens
+WRONG_WORLD_STATUS = 22 # Arbitrary non-zero status for commands addressed to a world this server does not host
+
+
+class GGEStandinServer:
+    """Minimal GGE game server with configurable latency, jitter, noise and disconnects."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, noise_per_second: float = 0.0,
+                 disconnect_probability: float = 0.0, reject_tokens: Iterable[str] = (),
+                 initial_message: bool = False, connect_delay: float = 0.0, drop_probability: float = 0.0, seed: Optional[int] = None,
+                 world: Optional[str] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.noise_per_second = noise_per_second
+        self.disconnect_probability = disconnect_probability
+        self.reject_tokens = set(reject_tokens)
+        self.initial_message = initial_message
+        self.connect_delay = connect_delay
+        self.drop_probability = drop_probability
+        self.world = world
+        self.random = random.Random(seed)
+        self.timing_random = random.Random(None if seed is None else seed + 1) # Own stream, so reply timing never changes which rewards and drops follow
+        self.connections = 0
+        self.logins = 0
+        self.spins_answered = 0
+        self.noise_frames_sent = 0
+        self.disconnects_injected = 0
+        self.replies_dropped = 0
+        self.wrong_world = 0
+        self.app = web.Application()
+        self.app.router.add_get("/", self.handle_ws)
+        self._runner: Optional[web.AppRunner] = None
+
+    def reply_delay(self) -> float:
+        return self.latency + (self.timing_random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    async def handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        if self.connect_delay:
+            await asyncio.sleep(self.connect_delay) # Stands in for TCP + TLS + upgrade round trips
+        await ws.prepare(request)
+        self.connections += 1
+        outbox: asyncio.Queue = asyncio.Queue()
+        sender = asyncio.create_task(self._send_loop(ws, outbox))
+        noise = None
+        loop = asyncio.get_running_loop()
+        last_due = 0.0
+        if self.initial_message:
+            outbox.put_nowait((0.0, "<cross-domain-policy><allow-access-from domain='*' to-ports='*' /></cross-domain-policy>"))
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                for reply in self.replies_for(msg.data):
+                    # Replies keep their order even when jitter would reorder them
+                    last_due = max(last_due, loop.time() + self.reply_delay())
+                    outbox.put_nowait((last_due, reply))
+                if noise is None and self.noise_per_second > 0 and "%lli%" in msg.data:
+                    noise = asyncio.create_task(self._noise_loop(outbox))
+        finally:
+            sender.cancel()
+            if noise:
+                noise.cancel()
+        return ws
+
+    async def _send_loop(self, ws: web.WebSocketResponse, outbox: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            due, reply = await outbox.get()
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if ws.closed:
+                return
+            if reply is None: # Injected disconnect
+                self.disconnects_injected += 1
+                await ws.close()
+                return
+            await ws.send_bytes(reply.encode("utf-8"))
+
+    async def _noise_loop(self, outbox: asyncio.Queue):
+        while True:
+            await asyncio.sleep(self.random.expovariate(self.noise_per_second))
+            self.noise_frames_sent += 1
+            outbox.put_nowait((0.0, self.random.choice(NOISE_FRAMES)))
+
+    def replies_for(self, data: str) -> list:
+        if data.startswith("<msg"):
+            if "action='verChk'" in data:
+                return ["<msg t='sys'><body action='apiOK' r='0'></body></msg>"]
+            if "action='login'" in data:
+                return ['%xt%rlu%-1%0%{}%']
+            return []
+        if not data.startswith("%xt%"):
+            return []
+        parts = data.split("%")
+        command = parts[3] if len(parts) > 3 else ""
+        if self.world and len(parts) > 3 and parts[2] != self.world:
+            self.wrong_world += 1
+            return [f'%xt%{command}%1%{WRONG_WORLD_STATUS}%%']
+        if command == "vln":
+            return ['%xt%vln%1%0%{}%']
+        if command == "pin":
+            return ['%xt%pin%1%0%%']
+        if command == "lli":
+            try:
+                token = json.loads(parts[5]).get("RCT")
+            except (IndexError, ValueError, AttributeError):
+                token = None
+            if token in self.reject_tokens:
+                return [f'%xt%lli%1%{DEFAULT_REJECT_STATUS}%{{}}%']
+            self.logins += 1
+            return ['%xt%lli%1%0%{"PN":"standin"}%']
+        if command == "lws":
+            if self.disconnect_probability and self.random.random() < self.disconnect_probability:
+                return [None]
+            if self.drop_probability and self.random.random() < self.drop_probability:
+                self.replies_dropped += 1
+                return []
+            self.spins_answered += 1
+            rewards = self.random.choices(SAMPLE_REWARD_LISTS, weights=REWARD_WEIGHTS)[0]
+            return ["%xt%lws%1%0%" + json.dumps({"R": rewards}) + "%"]
+        return []
+
+    def stats(self) -> dict:
+        return {"connections": self.connections, "logins": self.logins, "spins_answered": self.spins_answered,
+                "noise_frames_sent": self.noise_frames_sent, "disconnects_injected": self.disconnects_injected,
+                "replies_dropped": self.replies_dropped, "wrong_world": self.wrong_world}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"GGE stand-in listening on ws://{host}:{port}/ (latency {self.latency}s, jitter {self.jitter}s, noise {self.noise_per_second}/s, disconnect p={self.disconnect_probability})")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def start_standin_in_thread(port: int = 8765, server_class=GGEStandinServer, **server_options) -> GGEStandinServer:
+    """Runs a stand-in server (or a `server_class` subclass) on its own event loop thread; handy for scripts and tests driving the blocking code paths."""
+    server = server_class(**server_options)
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(server.start(port=port))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="gge-standin", daemon=True).start()
+    ready.wait()
+    return server
+
+
+def run_standin_process(port: int, server_options: dict, ready=None):
+    """Entry point for running the stand-in in a separate process (keeps its CPU out of client measurements)."""
+    async def serve():
+        server = GGEStandinServer(**server_options)
+        await server.start(port=port)
+        if ready is not None:
+            ready.set()
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each reply is sent")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random delay per reply, in seconds")
+    parser.add_argument("--noise", type=float, default=0.0, help="Unrelated push frames per second after login")
+    parser.add_argument("--disconnect", type=float, default=0.0, help="Probability that a spin drops the connection")
+    parser.add_argument("--drop", type=float, default=0.0, help="Probability that a spin is never answered")
+    parser.add_argument("--connect-delay", type=float, default=0.0, help="Seconds before the WebSocket upgrade is answered")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--world", default=None, help="Only serve this game world; commands for other worlds get an error status")
+
+
+def server_options_from_args(args) -> dict:
+    return {"latency": args.latency, "jitter": args.jitter, "noise_per_second": args.noise,
+            "disconnect_probability": args.disconnect, "connect_delay": args.connect_delay,
+            "drop_probability": args.drop, "seed": args.seed, "world": getattr(args, "world", None)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the GGE game WebSocket server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--initial-message", action="store_true", help="Send a policy message right after connecting")
+    parser.add_argument("--reject-token", action="append", default=[], help="RCT token to reject at lli (repeatable)")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = GGEStandinServer(reject_tokens=args.reject_token, initial_message=args.initial_message, **server_options_from_args(args))
+    await server.start(args.host, args.port)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] (%(name)s) %(message)s')
+    asyncio.run(main())
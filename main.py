@@ -1,496 +1,3558 @@
-import discord
-from discord import app_commands
 import asyncio
+import atexit
+import bisect
+import concurrent.futures
+import contextlib
+import hashlib
+import hmac
+import json
+import logging
+import logging.handlers
+import multiprocessing
 import os
-import websocket
-import time
+import queue
 import re
-import json
-from collections import defaultdict
+import shutil
+import signal
+import sqlite3
+import subprocess
+import threading
+import time
 import traceback
-from typing import Dict, Tuple, List
-import logging
+import urllib.parse
+import weakref
+from array import array
+from collections import OrderedDict, defaultdict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+import aiohttp.web
+import discord
+from discord import app_commands
+from selenium.common.exceptions import TimeoutException as SeleniumTimeoutException, WebDriverException # Cheap; the webdriver stack is loaded by load_selenium()
 
-# --- Selenium Imports ---
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service as ChromeService # For explicit chromedriver path
-from webdriver_manager.chrome import ChromeDriverManager # Optional: for auto-managing chromedriver
-from selenium.common.exceptions import WebDriverException, TimeoutException as SeleniumTimeoutException
+import gge_capture
 
 # --- Bot Configuration ---
 TOKEN = os.getenv("DISCORD_TOKEN")
 
 # --- GGE Configuration ---
 GGE_LOGIN_URL_FOR_RCT = "https://empire.goodgamestudios.com/"
-GGE_WEBSOCKET_URL = "wss://ep-live-de1-game.goodgamestudios.com/"
-GGE_GAME_WORLD = "EmpireEx_2" # Used in various game commands
+GGE_WEBSOCKET_URL = os.getenv("GGE_WEBSOCKET_URL", "wss://ep-live-de1-game.goodgamestudios.com/") # Overridable, e.g. to point at gge_standin.py
+GGE_GAME_WORLD = os.getenv("GGE_GAME_WORLD", "EmpireEx_2") # World of accounts not mapped by GGE_ACCOUNT_WORLDS or the /spin form
 GGE_RECAPTCHA_V3_SITE_KEY = "6Lc7w34oAAAAAFKhfmln41m96VQm4MNqEdpCYm-k"
 GGE_RECAPTCHA_ACTION = "submit"
 GGE_AID = "1728606031093813874" # From new login script
 GGE_STATIC_PWORD_PART = "1133015%de%0" # From new login script
 
+# --- Routing Configuration ---
+GGE_ENDPOINTS = os.getenv("GGE_ENDPOINTS", "") # Comma-separated world=url entries, a world repeated for several endpoints; empty = GGE_GAME_WORLD on GGE_WEBSOCKET_URL
+GGE_ACCOUNT_WORLDS = os.getenv("GGE_ACCOUNT_WORLDS", "") # Comma-separated account=world entries for accounts outside GGE_GAME_WORLD
+GGE_ENDPOINT_MAX_SESSIONS = int(os.getenv("GGE_ENDPOINT_MAX_SESSIONS", "0")) # Jobs per endpoint at the same time; 0 = only SPIN_MAX_WS_SESSIONS applies
+GGE_ENDPOINT_FAILURE_THRESHOLD = int(os.getenv("GGE_ENDPOINT_FAILURE_THRESHOLD", "3")) # Failed connects / login timeouts / disconnects in a row before an endpoint backs off
+GGE_ENDPOINT_BACKOFF_SECONDS = float(os.getenv("GGE_ENDPOINT_BACKOFF_SECONDS", "5")) # First backoff; doubles with every further failure in a row
+GGE_ENDPOINT_MAX_BACKOFF_SECONDS = float(os.getenv("GGE_ENDPOINT_MAX_BACKOFF_SECONDS", "300"))
+
+# --- Spin Configuration ---
+SPIN_PIPELINE_WINDOW = int(os.getenv("SPIN_PIPELINE_WINDOW", "1")) # Spin commands kept in flight; 1 = lockstep (send, wait for reward, repeat)
+SPIN_ADAPTIVE_PACING = os.getenv("SPIN_ADAPTIVE_PACING", "0") == "1" # Derive send rate, window and per-spin timeout from observed lws RTTs (overrides SPIN_PIPELINE_WINDOW)
+SPIN_PACING_MAX_RATE = float(os.getenv("SPIN_PACING_MAX_RATE", "10")) # Upper bound of the adaptive send rate, spins/s
+SPIN_STATS_FIELD = os.getenv("SPIN_STATS_FIELD", "0") == "1" # Add a per-spin statistics field (mean/variance per reward, drop rates, RTT) to the /spin result
+SPIN_PACING_MAX_WINDOW = int(os.getenv("SPIN_PACING_MAX_WINDOW", "8")) # Upper bound of adaptive spins in flight
+
+# --- Batch Configuration ---
+SPIN_BATCH_MAX_ACCOUNTS = int(os.getenv("SPIN_BATCH_MAX_ACCOUNTS", "10")) # Accounts accepted by one /spinbatch
+SPIN_BATCH_MAX_CONCURRENCY = int(os.getenv("SPIN_BATCH_MAX_CONCURRENCY", "3")) # Accounts of one batch running at the same time (global limits still apply)
+
+# --- Progress Configuration ---
+SPIN_PROGRESS_MIN_INTERVAL = float(os.getenv("SPIN_PROGRESS_MIN_INTERVAL", "5")) # Min seconds between live edits of a status message
+
+# --- Scheduler Configuration ---
+SPIN_MAX_BROWSER_SESSIONS = int(os.getenv("SPIN_MAX_BROWSER_SESSIONS", "2")) # Jobs allowed to drive Chrome at the same time
+SPIN_MAX_WS_SESSIONS = int(os.getenv("SPIN_MAX_WS_SESSIONS", "10")) # Jobs allowed to hold a GGE WebSocket at the same time
+SPIN_CANCEL_TIMEOUT = float(os.getenv("SPIN_CANCEL_TIMEOUT", "10")) # Max seconds from cancelling a job until its browser, socket and slot are freed
+
+# --- reCAPTCHA Browser Pool Configuration ---
+RECAPTCHA_POOL_SIZE = int(os.getenv("RECAPTCHA_POOL_SIZE", "0")) # Warm Chrome instances kept alive; 0 = fresh browser per token
+RECAPTCHA_POOL_MAX_USES = int(os.getenv("RECAPTCHA_POOL_MAX_USES", "20")) # Tokens minted before a pooled browser is recycled
+RECAPTCHA_POOL_MAX_AGE_MINUTES = float(os.getenv("RECAPTCHA_POOL_MAX_AGE_MINUTES", "15")) # Max lifetime of a pooled browser
+
+# --- reCAPTCHA Page Profile Configuration ---
+# Patterns are scheme://host/path with * wildcards
+RECAPTCHA_LEAN_PROFILE = os.getenv("RECAPTCHA_LEAN_PROFILE", "0") == "1" # Block requests the badge and grecaptcha.execute don't need while loading the game page
+RECAPTCHA_BLOCK_TYPES = [t.strip().lower() for t in os.getenv("RECAPTCHA_BLOCK_TYPES", "image,font,media").split(",") if t.strip()] # Resource types blocked by the lean profile (see RESOURCE_TYPE_PATTERNS)
+RECAPTCHA_BLOCK_URLS = [u.strip() for u in os.getenv("RECAPTCHA_BLOCK_URLS", "*://*.google-analytics.com/*,*://*.googletagmanager.com/*,*://*.doubleclick.net/*").split(",") if u.strip()] # Extra URL patterns blocked by the lean profile
+RECAPTCHA_ALLOW_URLS = [u.strip() for u in os.getenv("RECAPTCHA_ALLOW_URLS", "*://www.google.com/recaptcha/*,*://www.gstatic.com/recaptcha/*,*://www.recaptcha.net/recaptcha/*").split(",") if u.strip()] # Never blocked, even if a block pattern matches
+RECAPTCHA_DISABLE_SITE_ISOLATION = os.getenv("RECAPTCHA_DISABLE_SITE_ISOLATION", "0") == "1" # Keep the game iframe in the page's renderer (see create_recaptcha_driver)
+
+# --- Browser Start-up Configuration ---
+CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH", "") # Explicit chromedriver binary; empty = webdriver_manager if installed, else /usr/local/bin/chromedriver, else PATH
+CHROME_BINARY = os.getenv("CHROME_BINARY", "") # Explicit Chrome binary; empty = the first of CHROME_BINARY_NAMES on PATH
+RECAPTCHA_PREWARM = os.getenv("RECAPTCHA_PREWARM", "0") == "1" # Start one browser with the game page loaded after on_ready, so the first /spin skips Chrome start-up
+
+# --- reCAPTCHA Worker Process Configuration ---
+RECAPTCHA_WORKER_PROCESSES = int(os.getenv("RECAPTCHA_WORKER_PROCESSES", "0")) # Supervised processes doing the Selenium work; 0 = run it in bot threads
+RECAPTCHA_WORKER_TIMEOUT = float(os.getenv("RECAPTCHA_WORKER_TIMEOUT", "90")) # Hard limit per token; the worker's process tree is killed after it
+RECAPTCHA_WORKER_MAX_TASKS = int(os.getenv("RECAPTCHA_WORKER_MAX_TASKS", "20")) # Tokens before a worker (and its browser) is replaced
+RECAPTCHA_WORKER_MAX_RSS_MB = float(os.getenv("RECAPTCHA_WORKER_MAX_RSS_MB", "1500")) # Memory cap for a worker incl. Chrome; exceeded = replaced
+RECAPTCHA_WORKER_STUB_DELAY = os.getenv("RECAPTCHA_WORKER_STUB_DELAY", "") # Seconds; when set, workers return fake tokens instead of starting Chrome
+
+# --- reCAPTCHA Token Prefetch Configuration ---
+RECAPTCHA_TOKEN_PREFETCH = int(os.getenv("RECAPTCHA_TOKEN_PREFETCH", "0")) # Max tokens buffered by the background producer; 0 = mint on demand
+RECAPTCHA_TOKEN_TTL_SECONDS = float(os.getenv("RECAPTCHA_TOKEN_TTL_SECONDS", "90")) # Evict before the ~120s v3 token validity ends
+
+# --- Session Cache Configuration ---
+GGE_SESSION_CACHE_SIZE = int(os.getenv("GGE_SESSION_CACHE_SIZE", "0")) # Logged-in sockets kept for follow-up /spin jobs of the same account; 0 = close after each job
+GGE_SESSION_IDLE_SECONDS = float(os.getenv("GGE_SESSION_IDLE_SECONDS", "300")) # How long a parked session is kept
+GGE_SESSION_KEEPALIVE_SECONDS = float(os.getenv("GGE_SESSION_KEEPALIVE_SECONDS", "30")) # Interval of pin keepalives on parked sessions
+
+# --- Ledger Configuration ---
+SPIN_LEDGER_PATH = os.getenv("SPIN_LEDGER_PATH", "") # SQLite file for reward history and /spinhistory; empty = off
+
+# --- Metrics Configuration ---
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) # Port of the Prometheus /metrics endpoint; 0 = disabled
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1") # Bind address of the metrics endpoint (local only by default)
+
+# --- Capture Configuration ---
+GGE_CAPTURE_FILE = os.getenv("GGE_CAPTURE_FILE", "") # gzip file that every session's raw frames are appended to (credentials redacted); empty = off
+
+# --- Logging Configuration ---
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000")) # Records buffered for the log writer thread; records beyond it are dropped and counted; 0 = write synchronously
+SPIN_LOG_SAMPLE_EVERY = int(os.getenv("SPIN_LOG_SAMPLE_EVERY", "100")) # Log the reward message of the first and every Nth spin; 1 = every spin, 0 = none
+
 # --- Logging Setup ---
 #logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] (%(module)s.%(funcName)s) %(message)s')
 #logger = logging.getLogger("SpinBot")
 # More advanced logging setup for Discord bot context
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the logging thread: records beyond the queue's capacity are dropped and counted.
+
+    Formatting is left to the writer thread's handler, so prepare() hands the record over as is.
+    """
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_log_pipeline(target: logging.Logger, output: logging.Handler, queue_size: int) -> Tuple[Optional[DroppingQueueHandler], Optional[logging.handlers.QueueListener]]:
+    """Routes `target` through a bounded queue to `output` on a writer thread (queue_size 0: attach `output` directly)."""
+    for existing in list(target.handlers):
+        target.removeHandler(existing)
+    if queue_size <= 0:
+        target.addHandler(output)
+        return None, None
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    listener = logging.handlers.QueueListener(queue_handler.queue, output, respect_handler_level=True)
+    listener.start()
+    target.addHandler(queue_handler)
+    return queue_handler, listener
+
+
 logger = logging.getLogger('discord.spinbot')
 logger.setLevel(logging.INFO)
 handler = logging.StreamHandler()
 handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] (%(name)s) %(message)s'))
-logger.addHandler(handler)
-
-
-def format_rewards_field_value(rewards: Dict[str, int]) -> str:
-    """Formats the rewards dictionary into a string for the Discord embed field,
-    applying emoji mapping and custom sorting.
+log_queue_handler, log_listener = configure_log_pipeline(logger, handler, LOG_QUEUE_SIZE)
+if log_listener is not None:
+    atexit.register(log_listener.stop) # Flushes the queued records on exit
+
+
+def spin_log_sampled(spin: int) -> bool:
+    """True for the spins whose reward message is logged (see SPIN_LOG_SAMPLE_EVERY)."""
+    return SPIN_LOG_SAMPLE_EVERY > 0 and (spin == 1 or spin % SPIN_LOG_SAMPLE_EVERY == 0)
+
+
+# --- Metrics ---
+PHASE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0) # Seconds
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is cheap enough for the per-spin hot path."""
+    __slots__ = ("bounds", "counts", "total", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...] = PHASE_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # Last bucket is +Inf
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock() # Selenium phases are observed from worker threads
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile by linear interpolation inside the bucket that contains it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+
+class MetricsRegistry:
+    """In-process phase histograms, counters and gauges, rendered in the Prometheus text format."""
+    def __init__(self):
+        self.phases: Dict[str, Histogram] = {}
+        self.counters: Dict[Tuple[str, str, str], int] = defaultdict(int) # (name, label, value) -> count
+        self.gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self.help: Dict[str, str] = {}
+        self._lock = threading.Lock() # Counters are incremented from worker threads too
+
+    def observe(self, phase: str, seconds: float):
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases.setdefault(phase, Histogram())
+        histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def span(self, phase: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started)
+
+    def inc(self, name: str, label: str, value: str, amount: int = 1):
+        with self._lock:
+            self.counters[(name, label, value)] += amount
+
+    def counter_items(self) -> List[Tuple[Tuple[str, str, str], int]]:
+        """Sorted snapshot of the counters, safe while other threads increment them."""
+        with self._lock:
+            return sorted(self.counters.items())
+
+    def register_gauge(self, name: str, help_text: str, read: Callable[[], float]):
+        self.gauges[name] = (help_text, read)
+
+    def render_prometheus(self) -> str:
+        lines = ["# HELP spinbot_phase_seconds Duration of /spin phases.", "# TYPE spinbot_phase_seconds histogram"]
+        for phase, histogram in sorted(self.phases.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'spinbot_phase_seconds_bucket{{phase="{phase}",le="{le}"}} {cumulative}')
+            lines.append(f'spinbot_phase_seconds_sum{{phase="{phase}"}} {histogram.total}')
+            lines.append(f'spinbot_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+        counters = self.counter_items()
+        counter_names = sorted({name for (name, _, _), _ in counters})
+        for name in counter_names:
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, label, value), count in counters:
+                if counter_name == name:
+                    lines.append(f'{name}{{{label}="{value}"}} {count}')
+        for name, (help_text, read) in sorted(self.gauges.items()):
+            try: value = float(read())
+            except Exception: continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves MetricsRegistry.render_prometheus() at http://<host>:<port>/metrics."""
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional[aiohttp.web.AppRunner] = None
+
+    async def _handle(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
+        return aiohttp.web.Response(text=self.registry.render_prometheus(), content_type="text/plain")
+
+    async def start(self):
+        app = aiohttp.web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = aiohttp.web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await aiohttp.web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"📈 Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics = MetricsRegistry()
+metrics.register_gauge("spinbot_log_records_dropped", "Log records dropped because the log queue was full.", lambda: log_queue_handler.dropped if log_queue_handler else 0)
+metrics.register_gauge("spinbot_log_queue_depth", "Log records waiting for the writer thread.", lambda: log_queue_handler.queue.qsize() if log_queue_handler else 0)
+
+
+# --- Reward Catalog ---
+class RewardInfo:
+    """A canonical reward: slot id, display name, Discord emoji, display order and the lws reward codes that decode to it."""
+    __slots__ = ("slot", "name", "emoji", "prefix", "sort_key", "type_code", "decode", "unit_ids", "sample_amount")
+
+    def __init__(self, name: str, emoji: str, priority: int, type_code: str, decode: str, unit_ids: Tuple[int, ...] = (), sample_amount: int = 1):
+        self.slot = -1 # Set from the catalog position
+        self.name = name
+        self.emoji = emoji
+        self.prefix = f"{emoji} "
+        self.sort_key = (priority, name)
+        self.type_code = type_code
+        self.decode = decode # Extractor kind, see REWARD_EXTRACTORS
+        self.unit_ids = unit_ids
+        self.sample_amount = sample_amount # Shown by /spintest
+
+
+DEFAULT_REWARD_PRIORITY = 99 # Rewards without an explicit priority sort by name after the prioritized ones
+
+# The position is the slot id used by RewardCounter and SpinOutcomeLog; append new rewards at the end
+REWARD_CATALOG = (
+    RewardInfo("Werkzeuge", "<:tools:1359522120509554922>", DEFAULT_REWARD_PRIORITY, "U", "unit", sample_amount=3000), # U rewards with unit ids not listed below
+    RewardInfo("Schildmaid", "<:schildmaid:1359479372041683015>", 0, "U", "unit", (215,), 300000),
+    RewardInfo("Walküren-Scharfschützin", "<:scharfschuetzin:1359477765421793422>", 0, "U", "unit", (238,), 114000),
+    RewardInfo("Beschützer des Nordens", "<:beschuetzer:1359481568430915765>", 0, "U", "unit", (227,), 126000),
+    RewardInfo("Walküren-Waldläuferin", "<:waldlaeuferin:1359477735856013576>", 0, "U", "unit", (216,), 197500),
+    RewardInfo("Ausrüstung/Edelsteine", "<:gear:1359518850713911488>", DEFAULT_REWARD_PRIORITY, "RI", "one", sample_amount=2),
+    RewardInfo("Konstrukte", "<:konstrukte:1359518720531235047>", DEFAULT_REWARD_PRIORITY, "CI", "one"),
+    RewardInfo("Ausbaumarken", "<:ausbaumarken:1359516063477268622>", 6, "LM", "int", sample_amount=6592),
+    RewardInfo("Baumarken", "<:baumarken:1359516243463373030>", 7, "LT", "int", sample_amount=672),
+    RewardInfo("Sceattas", "<:sceatta:1359517377066438747>", 8, "STP", "int", sample_amount=610),
+    RewardInfo("Lose", "<:ticket:1359508197429219501>", 1, "SLWT", "tickets", sample_amount=120),
+    RewardInfo("Kisten", "<:chest:1359518414154104974>", DEFAULT_REWARD_PRIORITY, "LB", "chests", sample_amount=3),
+    RewardInfo("Mehrweller", "<:mehrweller:1359517882064699483>", DEFAULT_REWARD_PRIORITY, "UE", "one"),
+    RewardInfo("Rubine", "<:ruby:1359515929951731812>", 2, "C2", "int", sample_amount=100000),
+    RewardInfo("Ludwig-Geschenke", "<:ludwig:1359516694716092416>", 3, "FKT", "int", sample_amount=6),
+    RewardInfo("Beatrice-Geschenke", "<:beatrice:1359517272640721170>", 5, "PTK", "int", sample_amount=5),
+    RewardInfo("Ulrich-Geschenke", "<:ulrich:1359516848474820789>", 4, "KTK", "int", sample_amount=7),
+    RewardInfo("Dekorationen", "<:dekorationen:1359518108900917359>", DEFAULT_REWARD_PRIORITY, "D", "one"),
+)
+for _slot, _info in enumerate(REWARD_CATALOG):
+    _info.slot = _slot
+REWARD_BY_NAME = {info.name: info for info in REWARD_CATALOG}
+REWARD_SORT_KEYS = {info.name: info.sort_key for info in REWARD_CATALOG}
+REWARD_SLOT_NAMES = tuple(info.name for info in REWARD_CATALOG)
+REWARD_SLOT = {info.name: info.slot for info in REWARD_CATALOG}
+UNIT_REWARD_SLOTS = {unit_id: info.slot for info in REWARD_CATALOG for unit_id in info.unit_ids}
+UNIT_FALLBACK_SLOT = REWARD_SLOT["Werkzeuge"]
+
+
+# --- Reward Rendering ---
+EMBED_FIELD_VALUE_LIMIT = 1024 # Discord's limit for one embed field value
+EMBED_REWARD_FIELDS_BUDGET = 4000 # Characters the reward fields of one embed may take together (Discord allows 6000 per embed)
+REWARD_LINE_CACHE_SIZE = 4096
+
+# Reward name -> (amount, rendered line). Live progress edits re-render the same rewards, most with the same amount.
+_reward_line_cache: Dict[str, Tuple[int, str]] = {}
+_logged_unrendered_rewards = set()
+
+def _reward_sort_key(item: Tuple[str, int]):
+    return REWARD_SORT_KEYS.get(item[0]) or (DEFAULT_REWARD_PRIORITY, item[0])
+
+def _render_reward_line(name: str, amount: int) -> str:
+    info = REWARD_BY_NAME.get(name)
+    if info is not None:
+        line = f"{info.prefix}{amount:,}"
+    else:
+        if not name.startswith("Unbekannt_") and name not in _logged_unrendered_rewards:
+            _logged_unrendered_rewards.add(name)
+            logger.info(f"ℹ️ No catalog emoji for '{name}'. Displaying name.")
+        line = f"**{name}**: {amount:,}"
+    if len(_reward_line_cache) >= REWARD_LINE_CACHE_SIZE:
+        _reward_line_cache.clear()
+    _reward_line_cache[name] = (amount, line)
+    return line
+
+def render_reward_lines(rewards: Dict[str, int]) -> List[str]:
+    """One line per reward in display order: emoji and amount, or the bold name for rewards outside the catalog."""
+    lines = []
+    for name, amount in sorted(rewards.items(), key=_reward_sort_key):
+        cached = _reward_line_cache.get(name)
+        lines.append(cached[1] if cached is not None and cached[0] == amount else _render_reward_line(name, amount))
+    return lines
+
+def chunk_reward_lines(lines: List[str], chunk_limit: int = EMBED_FIELD_VALUE_LIMIT, budget: int = EMBED_REWARD_FIELDS_BUDGET) -> List[str]:
+    """Packs rendered lines into field values of at most `chunk_limit` characters and `budget` characters in total.
+
+    Lines past the budget are summarized in a final "… and N more" line instead of being cut mid-line.
     """
+    total = sum(map(len, lines)) + len(lines)
+    if total <= chunk_limit + 1 and total <= budget + 1: # Fits one field, the usual case
+        return ["\n".join(lines)]
+    if total > budget:
+        kept, used = [], len(f"… and {len(lines):,} more") # Room for the summary line
+        for line in lines:
+            if used + len(line) + 1 > budget:
+                break
+            kept.append(line)
+            used += len(line) + 1
+        lines = kept + [f"… and {len(lines) - len(kept):,} more"]
+    chunks, current, current_length = [], [], 0
+    for line in lines:
+        line = line[:chunk_limit]
+        if current and current_length + 1 + len(line) > chunk_limit:
+            chunks.append("\n".join(current))
+            current, current_length = [], 0
+        current_length += len(line) + (1 if current else 0)
+        current.append(line)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def format_rewards_field_value(rewards: Dict[str, int], limit: Optional[int] = None) -> str:
+    """Formats the rewards as one embed field value, in catalog order with emojis; `limit` caps its length."""
     if not rewards:
         return "No rewards available."
+    if limit is None:
+        return "\n".join(render_reward_lines(rewards))
+    return chunk_reward_lines(render_reward_lines(rewards), limit, limit)[0]
 
-    direct_emoji_map = {
-        "Werkzeuge": "<:tools:1359522120509554922>",
-                    "Ausrüstung/Edelsteine": "<:gear:1359518850713911488>",
-                    "Konstrukte": "<:konstrukte:1359518720531235047>",
-                    "Kisten": "<:chest:1359518414154104974>",
-                    "Dekorationen": "<:dekorationen:1359518108900917359>",
-                    "Mehrweller": "<:mehrweller:1359517882064699483>",
-                    "Sceattas": "<:sceatta:1359517377066438747>",
-                    "Beatrice-Geschenke": "<:beatrice:1359517272640721170>",
-                    "Ulrich-Geschenke": "<:ulrich:1359516848474820789>",
-                    "Ludwig-Geschenke": "<:ludwig:1359516694716092416>",
-                    "Baumarken": "<:baumarken:1359516243463373030>",
-                    "Ausbaumarken": "<:ausbaumarken:1359516063477268622>",
-                    "Rubine": "<:ruby:1359515929951731812>",
-                    "Lose": "<:ticket:1359508197429219501>",
-                    "Beschützer des Nordens": "<:beschuetzer:1359481568430915765>",
-                    "Schildmaid": "<:schildmaid:1359479372041683015>",
-                    "Walküren-Scharfschützin": "<:scharfschuetzin:1359477765421793422>",
-                    "Walküren-Waldläuferin": "<:waldlaeuferin:1359477735856013576>"
-    }
+def add_reward_fields(embed: discord.Embed, rewards: Dict[str, int], name: str, budget: int = EMBED_REWARD_FIELDS_BUDGET) -> int:
+    """Adds the rewards as as many fields as needed (continuations are named "<name> (cont.)"). Returns the number added."""
+    chunks = chunk_reward_lines(render_reward_lines(rewards), budget=budget) if rewards else ["No rewards available."]
+    for index, value in enumerate(chunks):
+        embed.add_field(name=name if index == 0 else f"{name} (cont.)", value=value, inline=False)
+    return len(chunks)
 
-    sort_priority = {
-        "Schildmaid": 0, "Walküren-Scharfschützin": 0, "Beschützer des Nordens": 0, "Walküren-Waldläuferin": 0,
-        "Lose": 1, "Rubine": 2,
-        "Ludwig-Geschenke": 3, "Ulrich-Geschenke": 4, "Beatrice-Geschenke": 5,
-        "Ausbaumarken": 6, "Baumarken": 7, "Sceattas": 8,
-    }
-    DEFAULT_PRIORITY = 99
+# --- Start-up Timing ---
+MODULE_LOADED_AT = time.monotonic()
 
-    def get_reward_sort_key(item: Tuple[str, int]):
-        key, _ = item
-        priority = sort_priority.get(key, DEFAULT_PRIORITY)
-        return (priority, key)
 
+def process_uptime() -> float:
+    """Seconds since this process started, interpreter start-up included (Linux /proc; elsewhere since this module loaded)."""
     try:
-        sorted_rewards = sorted(rewards.items(), key=get_reward_sort_key)
-    except Exception as e:
-        logger.error(f"Error sorting rewards: {e}")
-        sorted_rewards = sorted(rewards.items())
-
-    reward_lines_list = []
-    for reward_key, reward_value in sorted_rewards:
-        emoji_string = direct_emoji_map.get(reward_key)
-        if emoji_string:
-            reward_lines_list.append(f"{emoji_string} {reward_value:,}")
-        else:
-            if not reward_key.startswith("Unbekannt_"):
-                logger.info(f"ℹ️ No direct emoji string for '{reward_key}' in map. Displaying name.")
-            reward_lines_list.append(f"**{reward_key}**: {reward_value:,}")
+        with open("/proc/self/stat", "rb") as f:
+            start_ticks = int(f.read().rsplit(b")", 1)[1].split()[19])
+        with open("/proc/uptime", "rb") as f:
+            system_uptime = float(f.read().split()[0])
+        return system_uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - MODULE_LOADED_AT
+
+
+class StartupTimer:
+    """Start-up milestones: process start to module imported and to the first on_ready, and the first token's latency."""
+    def __init__(self):
+        self.imported: Optional[float] = None
+        self.ready: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.first_token_uptime: Optional[float] = None
+
+    def mark_imported(self):
+        self.imported = process_uptime()
+
+    def mark_ready(self) -> bool:
+        """Records the first on_ready; False on reconnects."""
+        if self.ready is not None:
+            return False
+        self.ready = process_uptime()
+        metrics.observe("startup_to_ready", self.ready)
+        logger.info(f"⏱️ Ready {self.ready:.2f}s after process start (module imported after {self.imported or 0:.2f}s).")
+        return True
+
+    def note_token(self, seconds: float):
+        """Called with the latency of every obtained token; only the first one after start-up is recorded."""
+        if self.first_token is not None:
+            return
+        self.first_token = seconds
+        self.first_token_uptime = process_uptime()
+        metrics.observe("first_token", seconds)
+        logger.info(f"⏱️ First reCAPTCHA token after start-up took {seconds:.2f}s ({self.first_token_uptime:.1f}s after process start).")
+
+    def summary(self) -> str:
+        parts = [f"imported {self.imported:.2f}s" if self.imported is not None else "imported ?",
+                 f"ready {self.ready:.2f}s" if self.ready is not None else "not ready yet",
+                 f"first token {self.first_token:.2f}s" if self.first_token is not None else "no token yet"]
+        return " | ".join(parts)
+
+
+startup_timer = StartupTimer()
+metrics.register_gauge("spinbot_startup_ready_seconds", "Seconds from process start to the first on_ready.", lambda: startup_timer.ready)
+metrics.register_gauge("spinbot_first_token_seconds", "Latency of the first reCAPTCHA token after start-up.", lambda: startup_timer.first_token)
+
+
+# --- Job Cancellation ---
+class JobCancelled(Exception):
+    """Raised inside a spin job's blocking steps once the job was cancelled."""
+
+
+class CancelToken:
+    """Cancellation flag of one spin job, shared by its event-loop code and its worker threads.
+
+    cancel() runs the registered callbacks right away on the cancelling thread (killing a
+    browser, waking a blocked wait), so blocking steps end without waiting for their timeouts.
+    Work that keeps running after the job's task was cancelled is tracked so reclaim() can wait for it.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._pending: List[asyncio.Future] = []
+        self.cancelled_at: Optional[float] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancelled_at is not None
+
+    def raise_if_cancelled(self):
+        if self.cancelled_at is not None:
+            raise JobCancelled("The spin job was cancelled.")
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Registers `callback` for cancel() (runs it now if already cancelled); returns a function that unregisters it."""
+        with self._lock:
+            if self.cancelled_at is None:
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def cancel(self) -> bool:
+        """Marks the job cancelled and runs the callbacks; False if it already was."""
+        with self._lock:
+            if self.cancelled_at is not None:
+                return False
+            self.cancelled_at = time.monotonic()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try: callback()
+            except Exception as e_callback: logger.warning(f"Cancellation callback failed: {e_callback}")
+        return True
+
+    def track(self, future: asyncio.Future):
+        """Remembers work that still has to finish before the job's resources are free."""
+        self._pending.append(future)
+
+    async def reclaim(self, timeout: float) -> Tuple[float, bool]:
+        """Waits for tracked work until `timeout` seconds after cancel(); returns (seconds since cancel(), all finished)."""
+        pending = [future for future in self._pending if not future.done()]
+        if pending:
+            remaining = max(0.0, timeout - (time.monotonic() - self.cancelled_at))
+            _, pending = await asyncio.wait(pending, timeout=remaining) if remaining > 0 else (set(), set(pending))
+        return time.monotonic() - self.cancelled_at, not pending
+
+
+async def run_cancellable_in_thread(cancel: Optional[CancelToken], func, *args):
+    """asyncio.to_thread whose thread, if the awaiting task is cancelled, is tracked by `cancel` until it returns."""
+    thread_task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(thread_task)
+    except asyncio.CancelledError:
+        thread_task.add_done_callback(lambda task: task.cancelled() or task.exception()) # Nobody awaits its JobCancelled
+        if cancel is not None:
+            cancel.track(thread_task)
+        raise
+
+
+def child_pids(pid: int) -> List[int]:
+    """All descendants of `pid`, read from /proc (Linux)."""
+    children = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                parent = int(f.read().rsplit(b")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[parent].append(int(entry))
+    descendants, frontier = [], [pid]
+    while frontier:
+        next_frontier = children.get(frontier.pop(), [])
+        descendants.extend(next_frontier)
+        frontier.extend(next_frontier)
+    return descendants
+
+
+def kill_driver(driver):
+    """Kills chromedriver and the Chrome processes under it at once; a blocked Selenium call then fails fast."""
+    process = getattr(getattr(driver, "service", None), "process", None)
+    if process is None or process.poll() is not None:
+        return
+    for pid in [process.pid] + child_pids(process.pid):
+        try: os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError): pass
+
+
+# --- Browser Stack Start-up ---
+DOCKER_CHROMEDRIVER_PATH = "/usr/local/bin/chromedriver" # Where the dockerfile installs it
+CHROME_BINARY_NAMES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser")
+_selenium_lock = threading.Lock()
+
+
+class SeleniumStack:
+    """The Selenium names the browser code uses, imported by load_selenium()."""
+    __slots__ = ("webdriver", "By", "WebDriverWait", "EC", "ChromeService")
+
+    def __init__(self, webdriver, By, WebDriverWait, EC, ChromeService):
+        self.webdriver = webdriver
+        self.By = By
+        self.WebDriverWait = WebDriverWait
+        self.EC = EC
+        self.ChromeService = ChromeService
+
+
+selenium_stack: Optional[SeleniumStack] = None
+
+
+def load_selenium() -> SeleniumStack:
+    """Imports the Selenium webdriver stack once per process (about 0.3 s) and returns it. Thread-safe."""
+    global selenium_stack
+    if selenium_stack is not None:
+        return selenium_stack
+    with _selenium_lock:
+        if selenium_stack is None:
+            started = time.perf_counter()
+            from selenium import webdriver
+            from selenium.webdriver.chrome.service import Service as ChromeService
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support import expected_conditions as EC
+            from selenium.webdriver.support.ui import WebDriverWait
+            selenium_stack = SeleniumStack(webdriver, By, WebDriverWait, EC, ChromeService)
+            metrics.observe("selenium_import", time.perf_counter() - started)
+            logger.info(f"🧩 Selenium imported in {time.perf_counter() - started:.2f}s.")
+    return selenium_stack
+
+
+def binary_version(path: str) -> Optional[str]:
+    """The version number printed by `<path> --version`, or None."""
+    try:
+        output = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=15).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"\d+(?:\.\d+)+", output)
+    return match.group(0) if match else None
+
+
+def find_chromedriver() -> Tuple[Optional[str], str]:
+    """(chromedriver path or None, where it came from). None leaves the lookup to Selenium Manager."""
+    if CHROMEDRIVER_PATH:
+        return CHROMEDRIVER_PATH, "CHROMEDRIVER_PATH"
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+    except ImportError:
+        pass
+    else:
+        try:
+            return ChromeDriverManager().install(), "webdriver_manager"
+        except Exception as e_manager:
+            logger.warning(f"webdriver_manager could not provide chromedriver ({e_manager}); trying {DOCKER_CHROMEDRIVER_PATH}.")
+    if os.access(DOCKER_CHROMEDRIVER_PATH, os.X_OK):
+        return DOCKER_CHROMEDRIVER_PATH, "dockerfile"
+    on_path = shutil.which("chromedriver")
+    if on_path:
+        return on_path, "PATH"
+    return None, "selenium-manager"
+
+
+class ChromeDriverInfo:
+    """chromedriver and Chrome as found by resolve_chromedriver()."""
+    __slots__ = ("driver_path", "driver_version", "chrome_path", "chrome_version", "source", "seconds")
+
+    def __init__(self, driver_path: Optional[str], driver_version: Optional[str], chrome_path: Optional[str], chrome_version: Optional[str], source: str, seconds: float):
+        self.driver_path = driver_path
+        self.driver_version = driver_version
+        self.chrome_path = chrome_path
+        self.chrome_version = chrome_version
+        self.source = source
+        self.seconds = seconds
+
+    def summary(self) -> str:
+        return (f"chromedriver {self.driver_version or '?'} ({self.driver_path or 'left to Selenium Manager'}, via {self.source}), "
+                f"Chrome {self.chrome_version or '?'} ({self.chrome_path or 'not found'})")
+
+
+chromedriver_info: Optional[ChromeDriverInfo] = None
+_chromedriver_lock = threading.Lock()
+
+
+def resolve_chromedriver() -> ChromeDriverInfo:
+    """Finds chromedriver and the Chrome version once per process; every create_recaptcha_driver reuses the result."""
+    global chromedriver_info
+    if chromedriver_info is not None:
+        return chromedriver_info
+    with _chromedriver_lock:
+        if chromedriver_info is None:
+            started = time.perf_counter()
+            driver_path, source = find_chromedriver()
+            chrome_path = CHROME_BINARY or next(filter(None, map(shutil.which, CHROME_BINARY_NAMES)), None)
+            info = ChromeDriverInfo(driver_path, binary_version(driver_path) if driver_path else None,
+                                    chrome_path, binary_version(chrome_path) if chrome_path else None, source, time.perf_counter() - started)
+            metrics.observe("chromedriver_resolve", info.seconds)
+            logger.info(f"🔎 Resolved in {info.seconds:.2f}s: {info.summary()}.")
+            if info.driver_version and info.chrome_version and info.driver_version.split(".")[0] != info.chrome_version.split(".")[0]:
+                logger.warning(f"⚠️ chromedriver {info.driver_version} does not match Chrome {info.chrome_version}; browser start-up will likely fail.")
+            chromedriver_info = info
+    return chromedriver_info
+
+
+prewarmed_browser: Optional["PooledBrowser"] = None
+_prewarm_lock = threading.Lock()
+
+
+def prewarm_recaptcha_browser():
+    """Starts one browser with the game page loaded for the next one-shot get_gge_recaptcha_token. Blocking."""
+    global prewarmed_browser
+    started = time.monotonic()
+    try:
+        driver = create_recaptcha_driver()
+    except Exception as e_prewarm:
+        logger.error(f"❌ Could not start the pre-warmed reCAPTCHA browser: {e_prewarm}")
+        return
+    try:
+        load_recaptcha_page(driver, "Prewarm")
+    except Exception as e_prewarm:
+        logger.error(f"❌ Could not load the reCAPTCHA page in the pre-warmed browser: {e_prewarm}")
+        try: driver.quit()
+        except Exception: pass
+        return
+    with _prewarm_lock:
+        previous, prewarmed_browser = prewarmed_browser, PooledBrowser(driver)
+    if previous:
+        previous.quit()
+    metrics.observe("prewarm", time.monotonic() - started)
+    logger.info(f"🔥 Pre-warmed a reCAPTCHA browser in {time.monotonic() - started:.2f}s.")
+
+
+def take_prewarmed_browser() -> Optional["PooledBrowser"]:
+    """Hands out the pre-warmed browser once, if it is still fresh and responsive."""
+    global prewarmed_browser
+    with _prewarm_lock:
+        browser, prewarmed_browser = prewarmed_browser, None
+    if browser is None:
+        return None
+    if browser.is_expired(1, RECAPTCHA_POOL_MAX_AGE_MINUTES * 60) or not browser.is_healthy():
+        logger.info("♻️ Pre-warmed reCAPTCHA browser is stale; starting a fresh one.")
+        browser.quit()
+        return None
+    return browser
+
+
+def discard_prewarmed_browser():
+    browser = take_prewarmed_browser()
+    if browser:
+        browser.quit()
+
+
+def warm_up_browser_stack():
+    """Runs in a thread after on_ready: imports Selenium and resolves chromedriver off the first /spin's path, then
+    fills the browser pool, or starts one pre-warmed browser if RECAPTCHA_PREWARM is set."""
+    try:
+        load_selenium()
+        resolve_chromedriver()
+    except Exception as e_warm:
+        logger.error(f"❌ Browser stack warm-up failed: {e_warm}")
+        return
+    if recaptcha_browser_pool is not None:
+        logger.info(f"🔥 Warming up {recaptcha_browser_pool.size} pooled reCAPTCHA browser(s) in the background...")
+        recaptcha_browser_pool.warm_up()
+    elif RECAPTCHA_PREWARM:
+        prewarm_recaptcha_browser()
 
-    return "\n".join(reward_lines_list)
 
 # --- Selenium Function to Get reCAPTCHA Token (Adapted) ---
-def get_gge_recaptcha_token(user_id_for_logging: str = "System", quiet: bool = False):
-    logger.info(f"[{user_id_for_logging}] Attempting to get GGE reCAPTCHA token with Selenium...")
-    driver = None
-    # Optional: Define path to your ChromeDriver if not in PATH
-    # CHROMEDRIVER_PATH = "/path/to/your/chromedriver" # Example
+RECAPTCHA_EXECUTE_SCRIPT = f"""
+    return new Promise((resolve, reject) => {{
+        if (typeof window.grecaptcha === 'undefined' || typeof window.grecaptcha.ready === 'undefined') {{
+            let err_msg = 'grecaptcha object not ready or not defined!';
+            console.error('[JS] ' + err_msg);
+            reject(err_msg);
+            return;
+        }}
+        window.grecaptcha.ready(() => {{
+            console.log('[JS] grecaptcha is ready. Executing execute...');
+            try {{
+                window.grecaptcha.execute('{GGE_RECAPTCHA_V3_SITE_KEY}', {{ action: '{GGE_RECAPTCHA_ACTION}' }})
+                    .then(token => {{
+                        console.log('[JS] Token received from execute:', token ? token.substring(0,10) + '...' : 'null');
+                        resolve(token);
+                     }},
+                     err => {{
+                         console.error('[JS] grecaptcha.execute promise (inline) rejected:', err);
+                         reject(err ? err.toString() : "Promise rejected with no error");
+                     }}
+                    )
+                   .catch(err => {{
+                        console.error('[JS] grecaptcha.execute .catch(err) triggered:', err);
+                       reject(err ? err.toString() : "Promise caught with no error");
+                    }});
+            }} catch (e) {{
+                console.error('[JS] Error during direct call of grecaptcha.execute:', e);
+                reject(e.toString());
+            }}
+        }});
+    }});
+"""
+
+RECAPTCHA_READY_SCRIPT = "return typeof window.grecaptcha !== 'undefined' && typeof window.grecaptcha.execute === 'function';"
+
+# File extensions per blockable resource type. Matching is by URL only, so extensionless URLs of these types still load
+RESOURCE_TYPE_PATTERNS = {
+    "image": ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico"],
+    "font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "media": ["mp3", "mp4", "ogg", "webm", "wav", "m4a"],
+}
+
+
+def lean_profile_block_patterns() -> List[str]:
+    """Block patterns for RECAPTCHA_BLOCK_TYPES plus RECAPTCHA_BLOCK_URLS.
+
+    Each extension is anchored to the end of the path, with or without a query string, so e.g.
+    /icons.gif.js or /page?img=x.svg&y=1 are not blocked as images.
+    """
+    patterns = []
+    for resource_type in RECAPTCHA_BLOCK_TYPES:
+        if resource_type not in RESOURCE_TYPE_PATTERNS:
+            logger.warning(f"Unknown resource type '{resource_type}' in RECAPTCHA_BLOCK_TYPES; known: {', '.join(RESOURCE_TYPE_PATTERNS)}.")
+            continue
+        for extension in RESOURCE_TYPE_PATTERNS[resource_type]:
+            patterns += [f"*://*/*.{extension}", f"*://*/*.{extension}?*"]
+    return patterns + RECAPTCHA_BLOCK_URLS
+
+
+def apply_lean_profile(driver):
+    """Blocks the lean profile's URL patterns in `driver` through the DevTools Network domain.
+
+    `urlPatterns` carries the allow list first (block: false). Chrome versions that reject it
+    get the block patterns as plain `urls` instead, which block without the allow-list exemptions.
+    """
+    block = lean_profile_block_patterns()
+    driver.execute_cdp_cmd("Network.enable", {})
     try:
-        options = webdriver.ChromeOptions()
-        options.add_argument("--window-size=800,600")
-        options.add_argument("--headless") # Run headless for server environment
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option("useAutomationExtension", False)
-        options.add_argument('--disable-blink-features=AutomationControlled')
-        options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36") # Keep User-Agent somewhat up-to-date
-
-        try:
-            driver = webdriver.Chrome(
-            service=ChromeService(ChromeDriverManager().install()),
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {
+            "urlPatterns": [{"urlPattern": p, "block": False} for p in RECAPTCHA_ALLOW_URLS] + [{"urlPattern": p, "block": True} for p in block],
+        })
+    except WebDriverException as e_patterns:
+        logger.warning(f"This Chrome does not accept urlPatterns in Network.setBlockedURLs ({str(e_patterns).strip()[:200]}); "
+                       f"blocking with plain urls, so RECAPTCHA_ALLOW_URLS exemptions do not apply.")
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": block})
+
+
+class PageLoadReport:
+    """Requests, bytes and blocked requests of one page load, read from Chrome's performance log."""
+    def __init__(self):
+        self.requests = 0
+        self.bytes_loaded = 0
+        self.blocked: Dict[str, int] = defaultdict(int) # Resource type -> blocked requests
+        self.time_to_badge = 0.0
+
+    @property
+    def blocked_total(self) -> int:
+        return sum(self.blocked.values())
+
+    def read(self, driver):
+        for entry in driver.get_log("performance"):
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            method = message.get("method")
+            if method == "Network.requestWillBeSent":
+                self.requests += 1
+            elif method == "Network.loadingFinished":
+                self.bytes_loaded += int(message["params"].get("encodedDataLength", 0))
+            elif method == "Network.loadingFailed" and message["params"].get("blockedReason") == "inspector":
+                self.blocked[message["params"].get("type", "Other")] += 1
+
+    def summary(self) -> str:
+        by_type = ", ".join(f"{t} {n}" for t, n in sorted(self.blocked.items())) or "none"
+        return (f"badge after {self.time_to_badge:.2f}s, {self.requests} requests, {self.bytes_loaded / 1024:,.0f} KiB loaded, "
+                f"{self.blocked_total} blocked ({by_type})")
+
+
+def create_recaptcha_driver(lean: Optional[bool] = None, report: Optional[bool] = None):
+    """Starts a headless Chrome configured for the reCAPTCHA page.
+
+    `lean` (default RECAPTCHA_LEAN_PROFILE) applies the request-blocking profile; `report`
+    (default: same as lean) enables the performance log that load_recaptcha_page reports from.
+    """
+    lean = RECAPTCHA_LEAN_PROFILE if lean is None else lean
+    report = lean if report is None else report
+    selenium = load_selenium()
+    driver_info = resolve_chromedriver()
+    options = selenium.webdriver.ChromeOptions()
+    if CHROME_BINARY:
+        options.binary_location = CHROME_BINARY
+    options.add_argument("--window-size=800,600")
+    options.add_argument("--headless") # Run headless for server environment
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36") # Keep User-Agent somewhat up-to-date
+    if RECAPTCHA_DISABLE_SITE_ISOLATION:
+        # Out-of-process iframes get their own DevTools target: without this, request blocking and the
+        # performance log only cover the top page, not the game iframe. It weakens the browser's
+        # isolation between sites, so it is never turned on implicitly by the lean profile or report.
+        options.add_argument("--disable-features=IsolateOrigins,site-per-process")
+    if report:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    with metrics.span("chrome_start"):
+        driver = selenium.webdriver.Chrome(
+            service=selenium.ChromeService(driver_info.driver_path) if driver_info.driver_path else selenium.ChromeService(),
             options=options
         )
-            
-        except WebDriverException as e_init_driver:
-            logger.error(f"[{user_id_for_logging}] ChromeDriver could not be initialized: {e_init_driver}")
-            logger.error(f"[{user_id_for_logging}] Ensure ChromeDriver is in PATH, matches Chrome version, or path is correctly specified.")
-            return None
-        logger.info(f"[{user_id_for_logging}] ChromeDriver initialized.")
+    if lean:
+        try:
+            apply_lean_profile(driver)
+        except Exception:
+            driver.quit()
+            raise
+    driver.spinbot_lean_profile = lean # Read by load_recaptcha_page
+    driver.spinbot_load_report = report
+    return driver
+
+def load_recaptcha_page(driver, user_id_for_logging: str = "System") -> Optional[PageLoadReport]:
+    """Loads the game page and waits until grecaptcha can be executed inside the game iframe.
 
+    Returns a PageLoadReport if the driver was created with reporting enabled, else None.
+    """
+    selenium = load_selenium()
+    started = time.monotonic()
+    with metrics.span("page_load"):
         driver.get(GGE_LOGIN_URL_FOR_RCT)
-        wait = WebDriverWait(driver, 45, poll_frequency=0.1)
-
-        logger.info(f"[{user_id_for_logging}] Waiting for game iframe (iframe#game)...")
-        iframe_element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'iframe#game')))
-        driver.switch_to.frame(iframe_element)
-        logger.info(f"[{user_id_for_logging}] Switched to game iframe. Waiting for reCAPTCHA badge (.grecaptcha-badge)...")
-
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '.grecaptcha-badge')))
-        logger.info(f"[{user_id_for_logging}] reCAPTCHA badge found.")
-
-        logger.info(f"[{user_id_for_logging}] Waiting 2 additional seconds for potential initialization...")
-        time.sleep(2.0)
-
-        logger.info(f"[{user_id_for_logging}] Executing grecaptcha.execute script...")
-        script_to_execute = f"""
-            return new Promise((resolve, reject) => {{
-                if (typeof window.grecaptcha === 'undefined' || typeof window.grecaptcha.ready === 'undefined') {{
-                    let err_msg = 'grecaptcha object not ready or not defined!';
-                    console.error('[JS] ' + err_msg);
-                    reject(err_msg);
-                    return;
-                }}
-                window.grecaptcha.ready(() => {{
-                    console.log('[JS] grecaptcha is ready. Executing execute...');
-                    try {{
-                        window.grecaptcha.execute('{GGE_RECAPTCHA_V3_SITE_KEY}', {{ action: '{GGE_RECAPTCHA_ACTION}' }})
-                            .then(token => {{
-                                console.log('[JS] Token received from execute:', token ? token.substring(0,10) + '...' : 'null');
-                                resolve(token);
-                             }},
-                             err => {{
-                                 console.error('[JS] grecaptcha.execute promise (inline) rejected:', err);
-                                 reject(err ? err.toString() : "Promise rejected with no error");
-                             }}
-                            )
-                           .catch(err => {{
-                                console.error('[JS] grecaptcha.execute .catch(err) triggered:', err);
-                               reject(err ? err.toString() : "Promise caught with no error");
-                            }});
-                    }} catch (e) {{
-                        console.error('[JS] Error during direct call of grecaptcha.execute:', e);
-                        reject(e.toString());
-                    }}
-                }});
-            }});
-        """
-        recaptcha_token = driver.execute_script(script_to_execute)
+    wait = selenium.WebDriverWait(driver, 45, poll_frequency=0.1)
 
-        if recaptcha_token:
-            logger.info(f"[{user_id_for_logging}] ✅ Successfully obtained reCAPTCHA token: {recaptcha_token[:20]}...")
-            return recaptcha_token
-        else:
-            logger.error(f"[{user_id_for_logging}] ❌ Failed to retrieve reCAPTCHA token (execute returned null/undefined).")
+    logger.info(f"[{user_id_for_logging}] Waiting for game iframe (iframe#game)...")
+    with metrics.span("iframe_wait"):
+        iframe_element = wait.until(selenium.EC.presence_of_element_located((selenium.By.CSS_SELECTOR, 'iframe#game')))
+    driver.switch_to.frame(iframe_element)
+    logger.info(f"[{user_id_for_logging}] Switched to game iframe. Waiting for reCAPTCHA badge (.grecaptcha-badge)...")
+
+    with metrics.span("badge_wait"):
+        wait.until(selenium.EC.presence_of_element_located((selenium.By.CSS_SELECTOR, '.grecaptcha-badge')))
+    time_to_badge = time.monotonic() - started
+    logger.info(f"[{user_id_for_logging}] reCAPTCHA badge found.")
+
+    logger.info(f"[{user_id_for_logging}] Waiting until grecaptcha.execute is available...")
+    with metrics.span("grecaptcha_ready"):
+        wait.until(lambda d: d.execute_script(RECAPTCHA_READY_SCRIPT))
+
+    if not getattr(driver, "spinbot_load_report", False):
+        return None
+    report = PageLoadReport()
+    report.time_to_badge = time_to_badge
+    report.read(driver)
+    profile = "lean" if getattr(driver, "spinbot_lean_profile", False) else "full"
+    metrics.inc("spinbot_page_requests_total", "outcome", "loaded", report.requests - report.blocked_total)
+    metrics.inc("spinbot_page_requests_total", "outcome", "blocked", report.blocked_total)
+    metrics.inc("spinbot_page_bytes_total", "profile", profile, report.bytes_loaded)
+    logger.info(f"[{user_id_for_logging}] 📄 Page load ({profile} profile): {report.summary()}.")
+    return report
+
+def execute_recaptcha(driver, user_id_for_logging: str = "System") -> Optional[str]:
+    """Runs grecaptcha.execute on an already loaded page and returns the token (None if empty)."""
+    logger.info(f"[{user_id_for_logging}] Executing grecaptcha.execute script...")
+    with metrics.span("recaptcha_execute"):
+        recaptcha_token = driver.execute_script(RECAPTCHA_EXECUTE_SCRIPT)
+
+    if recaptcha_token:
+        logger.info(f"[{user_id_for_logging}] ✅ Successfully obtained reCAPTCHA token: {recaptcha_token[:20]}...")
+        return recaptcha_token
+    logger.error(f"[{user_id_for_logging}] ❌ Failed to retrieve reCAPTCHA token (execute returned null/undefined).")
+    return None
+
+
+class PooledBrowser:
+    """A Chrome instance kept by RecaptchaBrowserPool with the reCAPTCHA page already loaded."""
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.monotonic()
+        self.uses = 0
+
+    def is_expired(self, max_uses: int, max_age_seconds: float) -> bool:
+        return self.uses >= max_uses or (time.monotonic() - self.created_at) >= max_age_seconds
+
+    def is_healthy(self) -> bool:
+        try:
+            return bool(self.driver.execute_script(RECAPTCHA_READY_SCRIPT))
+        except Exception:
+            return False
+
+    def quit(self):
+        try: self.driver.quit()
+        except Exception as e_quit: logger.warning(f"Error quitting pooled browser: {e_quit}")
+
+
+class RecaptchaBrowserPool:
+    """Bounded pool of warm headless Chrome instances for get_gge_recaptcha_token.
+
+    Each browser keeps the game iframe loaded with grecaptcha ready, so a warm acquisition only
+    costs a health check and the grecaptcha.execute call. Browsers are recycled after `max_uses`
+    tokens or `max_age_minutes`, and never more than `size` exist at once.
+    Thread-safe; acquire/release are called from the executor threads running spin jobs.
+    """
+    def __init__(self, size: int, max_uses: int = 20, max_age_minutes: float = 15.0):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_age_seconds = max_age_minutes * 60
+        self._idle: deque = deque()
+        self._total = 0 # Idle + in use + being started
+        self._closed = False
+        self._cond = threading.Condition()
+        self.cold_acquisitions = 0
+        self.warm_acquisitions = 0
+        self.cold_latency_total = 0.0
+        self.warm_latency_total = 0.0
+        self.recycled = 0
+
+    def _start_browser(self, user_id_for_logging: str, cancel: Optional[CancelToken] = None) -> PooledBrowser:
+        driver = create_recaptcha_driver()
+        unregister = cancel.add_callback(lambda: kill_driver(driver)) if cancel else None
+        try:
+            if cancel: cancel.raise_if_cancelled()
+            load_recaptcha_page(driver, user_id_for_logging)
+            if cancel: cancel.raise_if_cancelled()
+        except Exception:
+            try: driver.quit()
+            except Exception: pass
+            raise
+        finally:
+            if unregister: unregister()
+        return PooledBrowser(driver)
+
+    def _discard(self, browser: PooledBrowser):
+        browser.quit()
+        with self._cond:
+            self._total -= 1
+            self.recycled += 1
+            self._cond.notify()
+
+    def _wake_waiters(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def acquire(self, user_id_for_logging: str = "System", timeout: float = 120.0, cancel: Optional[CancelToken] = None) -> PooledBrowser:
+        """Returns a ready browser, starting one if the pool has room and none is idle.
+
+        Raises JobCancelled if `cancel` fires while waiting for a slot or starting the browser.
+        """
+        started = time.monotonic()
+        unregister = cancel.add_callback(self._wake_waiters) if cancel else None
+        try:
+            return self._acquire(user_id_for_logging, timeout, started, cancel)
+        finally:
+            if unregister: unregister()
+
+    def _acquire(self, user_id_for_logging: str, timeout: float, started: float, cancel: Optional[CancelToken]) -> PooledBrowser:
+        while True:
+            with self._cond:
+                while not self._idle and self._total >= self.size and not self._closed:
+                    if cancel: cancel.raise_if_cancelled()
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        raise TimeoutError(f"No pooled browser became available within {timeout}s.")
+                    self._cond.wait(remaining)
+                if self._closed:
+                    raise RuntimeError("reCAPTCHA browser pool is shut down.")
+                browser = self._idle.popleft() if self._idle else None
+                if browser is None:
+                    self._total += 1 # Reserve the slot before starting Chrome outside the lock
+
+            if browser is None:
+                try:
+                    browser = self._start_browser(user_id_for_logging, cancel)
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+                latency = time.monotonic() - started
+                with self._cond:
+                    self.cold_acquisitions += 1
+                    self.cold_latency_total += latency
+                logger.info(f"[{user_id_for_logging}] 🧊 Cold browser acquisition took {latency:.2f}s ({self.stats_summary()}).")
+                return browser
+
+            if browser.is_expired(self.max_uses, self.max_age_seconds) or not browser.is_healthy():
+                logger.info(f"[{user_id_for_logging}] ♻️ Recycling pooled browser after {browser.uses} use(s).")
+                self._discard(browser)
+                continue
+            latency = time.monotonic() - started
+            with self._cond:
+                self.warm_acquisitions += 1
+                self.warm_latency_total += latency
+            logger.info(f"[{user_id_for_logging}] 🔥 Warm browser acquisition took {latency:.2f}s ({self.stats_summary()}).")
+            return browser
+
+    def release(self, browser: PooledBrowser, healthy: bool = True):
+        """Returns a browser to the pool; unhealthy, worn-out or post-shutdown browsers are quit."""
+        browser.uses += 1
+        with self._cond:
+            keep = healthy and not self._closed and not browser.is_expired(self.max_uses, self.max_age_seconds)
+            if keep:
+                self._idle.append(browser)
+                self._cond.notify()
+                return
+        self._discard(browser)
+
+    def warm_up(self, user_id_for_logging: str = "System"):
+        """Starts browsers until the pool is full. Blocking; run it in a thread."""
+        while True:
+            with self._cond:
+                if self._closed or self._total >= self.size:
+                    return
+                self._total += 1
+            try:
+                browser = self._start_browser(user_id_for_logging)
+            except Exception as e_warm:
+                logger.error(f"[{user_id_for_logging}] ❌ Failed to warm up pooled browser: {e_warm}")
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                return
+            with self._cond:
+                if self._closed:
+                    self._total -= 1
+                else:
+                    self._idle.append(browser)
+                    self._cond.notify()
+                    browser = None
+            if browser:
+                browser.quit()
+
+    def shutdown(self):
+        """Quits all idle browsers; browsers still in use are quit when released."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for browser in idle:
+            browser.quit()
+        logger.info(f"reCAPTCHA browser pool shut down ({self.stats_summary()}).")
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "size": self.size, "total": self._total, "idle": len(self._idle),
+                "cold_acquisitions": self.cold_acquisitions, "warm_acquisitions": self.warm_acquisitions,
+                "avg_cold_latency": self.cold_latency_total / self.cold_acquisitions if self.cold_acquisitions else 0.0,
+                "avg_warm_latency": self.warm_latency_total / self.warm_acquisitions if self.warm_acquisitions else 0.0,
+                "recycled": self.recycled,
+            }
+
+    def stats_summary(self) -> str:
+        s = self.stats()
+        return (f"cold {s['cold_acquisitions']}x avg {s['avg_cold_latency']:.2f}s, "
+                f"warm {s['warm_acquisitions']}x avg {s['avg_warm_latency']:.2f}s, "
+                f"{s['idle']}/{s['total']} idle, {s['recycled']} recycled")
+
+
+recaptcha_browser_pool: Optional[RecaptchaBrowserPool] = RecaptchaBrowserPool(RECAPTCHA_POOL_SIZE, RECAPTCHA_POOL_MAX_USES, RECAPTCHA_POOL_MAX_AGE_MINUTES) if RECAPTCHA_POOL_SIZE > 0 else None
+
+
+def get_gge_recaptcha_token_pooled(pool: RecaptchaBrowserPool, user_id_for_logging: str = "System", quiet: bool = False, cancel: Optional[CancelToken] = None):
+    """Gets a token from a warm pooled browser; same return contract as get_gge_recaptcha_token."""
+    browser = None
+    healthy = False
+    unregister = None
+    try:
+        browser = pool.acquire(user_id_for_logging, cancel=cancel)
+        if cancel: unregister = cancel.add_callback(lambda: kill_driver(browser.driver))
+        recaptcha_token = execute_recaptcha(browser.driver, user_id_for_logging)
+        healthy = recaptcha_token is not None and not (cancel and cancel.cancelled)
+        return recaptcha_token
+    except JobCancelled:
+        logger.info(f"[{user_id_for_logging}] 🛑 reCAPTCHA step cancelled while waiting for a pooled browser.")
+        return None
+    except SeleniumTimeoutException as e_timeout:
+        logger.error(f"[{user_id_for_logging}] Selenium Timeout while preparing pooled browser: {e_timeout}")
+        if not quiet: traceback.print_exc()
+        return None
+    except WebDriverException as e_wd:
+        if cancel and cancel.cancelled: # The driver was killed on purpose
+            logger.info(f"[{user_id_for_logging}] 🛑 reCAPTCHA step cancelled; pooled browser killed.")
+            return None
+        logger.error(f"[{user_id_for_logging}] WebDriver error in pooled browser: {e_wd}")
+        if not quiet: traceback.print_exc()
+        return None
+    except Exception as e:
+        if cancel and cancel.cancelled:
+            logger.info(f"[{user_id_for_logging}] 🛑 reCAPTCHA step cancelled; pooled browser killed.")
             return None
+        logger.error(f"[{user_id_for_logging}] General error while obtaining reCAPTCHA token from pool: {e}")
+        if not quiet: traceback.print_exc()
+        return None
+    finally:
+        if unregister: unregister()
+        if browser:
+            pool.release(browser, healthy=healthy)
+
+def get_gge_recaptcha_token(user_id_for_logging: str = "System", quiet: bool = False, cancel: Optional[CancelToken] = None):
+    """Mints one reCAPTCHA token; None on failure. If `cancel` fires, the browser is killed and None returned at once."""
+    if recaptcha_process_pool is not None:
+        logger.info(f"[{user_id_for_logging}] Attempting to get GGE reCAPTCHA token from a worker process...")
+        return recaptcha_process_pool.get_token_blocking(user_id_for_logging, cancel)
+    if recaptcha_browser_pool is not None:
+        logger.info(f"[{user_id_for_logging}] Attempting to get GGE reCAPTCHA token from the browser pool...")
+        return get_gge_recaptcha_token_pooled(recaptcha_browser_pool, user_id_for_logging, quiet, cancel)
 
+    logger.info(f"[{user_id_for_logging}] Attempting to get GGE reCAPTCHA token with Selenium...")
+    driver = None
+    unregister = None
+    try:
+        if cancel: cancel.raise_if_cancelled()
+        prewarmed = take_prewarmed_browser()
+        if prewarmed:
+            driver = prewarmed.driver
+            logger.info(f"[{user_id_for_logging}] Using the pre-warmed browser.")
+        else:
+            try:
+                driver = create_recaptcha_driver()
+            except WebDriverException as e_init_driver:
+                logger.error(f"[{user_id_for_logging}] ChromeDriver could not be initialized: {e_init_driver}")
+                logger.error(f"[{user_id_for_logging}] Ensure ChromeDriver is in PATH, matches Chrome version, or set CHROMEDRIVER_PATH.")
+                return None
+            logger.info(f"[{user_id_for_logging}] ChromeDriver initialized.")
+        if cancel:
+            unregister = cancel.add_callback(lambda: kill_driver(driver))
+            cancel.raise_if_cancelled()
+
+        if not prewarmed:
+            load_recaptcha_page(driver, user_id_for_logging)
+        return execute_recaptcha(driver, user_id_for_logging)
+
+    except JobCancelled:
+        logger.info(f"[{user_id_for_logging}] 🛑 reCAPTCHA step cancelled.")
+        return None
     except SeleniumTimeoutException as e_timeout:
         logger.error(f"[{user_id_for_logging}] Selenium Timeout while waiting for an element: {e_timeout}")
         if driver: driver.save_screenshot(f"selenium_timeout_{user_id_for_logging}.png")
         if not quiet: traceback.print_exc()
         return None
     except WebDriverException as e_wd:
+        if cancel and cancel.cancelled: # kill_driver() ended the blocked call
+            logger.info(f"[{user_id_for_logging}] 🛑 reCAPTCHA step cancelled; browser killed.")
+            return None
         logger.error(f"[{user_id_for_logging}] WebDriver error during initialization or execution: {e_wd}")
         if not quiet: traceback.print_exc()
         return None
     except Exception as e:
+        if cancel and cancel.cancelled:
+            logger.info(f"[{user_id_for_logging}] 🛑 reCAPTCHA step cancelled; browser killed.")
+            return None
         logger.error(f"[{user_id_for_logging}] General error while obtaining reCAPTCHA token: {e}")
         if not quiet: traceback.print_exc()
         return None
     finally:
+        if unregister: unregister()
         if driver:
-            driver.quit()
+            try: driver.quit()
+            except Exception as e_quit: logger.warning(f"[{user_id_for_logging}] Error quitting Selenium browser: {e_quit}")
         logger.info(f"[{user_id_for_logging}] Selenium browser for reCAPTCHA closed.")
 
-# --- GGE Login Worker with reCAPTCHA (Adapted) ---
-def gge_login_sync_worker_with_rct(username, password, rct_token, user_id_for_logging="User"):
-    ws = None
-    connect_timeout = 20.0
-    login_confirmation_timeout = 15.0 # Increased slightly
-    individual_recv_timeout = 0.5
-
+# --- reCAPTCHA Worker Processes ---
+def process_group_rss_mb(pgid: int) -> float:
+    """Sums the resident memory of every process in a process group (the worker plus its Chrome tree). Linux only."""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
     try:
-        logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) GGE Login for '{username}'...")
-        ws = websocket.create_connection(GGE_WEBSOCKET_URL, timeout=connect_timeout)
-        logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) ✅ WebSocket connection established!")
-
-        try:
-            ws.settimeout(2.0)
-            initial_msg = ws.recv()
-            logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) Initial message from GGE: {initial_msg[:100]}")
-        except websocket.WebSocketTimeoutException:
-            logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) No initial message from GGE within 2s.")
-        except Exception as e_init_recv:
-            logger.warning(f"[{user_id_for_logging}] (SyncWorker-RCT) Error receiving initial message: {e_init_recv}")
-
-        ws.settimeout(connect_timeout) # Reset to default
-
-        logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) Sending login sequence...")
-        ws.send("<msg t='sys'><body action='verChk' r='0'><ver v='166' /></body></msg>")
-        ws.send(f"<msg t='sys'><body action='login' r='0'><login z='{GGE_GAME_WORLD}'><nick><![CDATA[]]></nick><pword><![CDATA[{GGE_STATIC_PWORD_PART}]]></pword></login></body></msg>")
-        ws.send(f"%xt%{GGE_GAME_WORLD}%vln%1%{{\"NOM\":\"{username}\"}}%")
-
-        login_payload = {
-            "CONM": 297, "RTM": 54, "ID": 0, "PL": 1,
-            "NOM": username, "PW": password, "LT": None, "LANG": "de",
-            "DID": "0", "AID": GGE_AID, "KID": "",
-            "REF": "https://empire.goodgamestudios.com", "GCI": "",
-            "SID": 9, "PLFID": 1, "RCT": rct_token
-        }
-        login_command = f"%xt%{GGE_GAME_WORLD}%lli%1%{json.dumps(login_payload)}%"
-        logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) Sending login command (sensitive parts like PW, RCT omitted from this log line for security if they were printed).")
-        # logger.debug(f"[{user_id_for_logging}] (SyncWorker-RCT) Full Login Command: {login_command}") # For debugging only
-        ws.send(login_command)
-        login_command_sent_time = time.time()
-
-        time.sleep(0.5) # Small delay to allow server to process
-        if not ws.connected:
-            logger.error(f"[{user_id_for_logging}] (SyncWorker-RCT) GGE WS connection lost immediately after sending login command."); return None
-
-        logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) Waiting for login confirmation (%xt%lli%1%0%)...")
-        confirmation_found = False
-        login_related_messages_snippets = []
-
-        while (time.time() - login_command_sent_time) < login_confirmation_timeout:
-            if not ws.connected:
-                logger.warning(f"[{user_id_for_logging}] (SyncWorker-RCT) WS disconnected while waiting for login confirmation.")
-                break
-            ws.settimeout(individual_recv_timeout)
-            try:
-                raw_msg = ws.recv()
-            except websocket.WebSocketTimeoutException:
-                continue
-            except Exception as e_inner_recv:
-                logger.error(f"[{user_id_for_logging}] (SyncWorker-RCT) Inner recv error: {e_inner_recv}")
-                break
+        entries = os.listdir("/proc")
+    except OSError:
+        return 0.0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                fields = f.read().rsplit(b")", 1)[1].split()
+            if int(fields[2]) == pgid: # Fields after the command: state, ppid, pgrp, ..., rss (22nd)
+                total += int(fields[21]) * page_size
+        except (OSError, ValueError, IndexError):
+            continue
+    return total / (1024 * 1024)
+
+
+def recaptcha_worker_main(conn, stub_delay: Optional[float] = None, prewarm: bool = False):
+    """Worker process loop: keeps one browser warm and answers ("token", user) requests over `conn`.
+
+    The worker starts its own session, so it and every Chrome/chromedriver process it spawns share
+    one process group that the parent can kill as a whole. With `stub_delay` set, no browser is
+    started and a fake token is returned after sleeping that long (local testing). With `prewarm`,
+    the browser is started and the page loaded before the first request arrives.
+    """
+    os.setsid()
+    driver = None
+    served = 0
+    if prewarm and stub_delay is None:
+        try:
+            driver = create_recaptcha_driver()
+            load_recaptcha_page(driver, f"RecaptchaWorker {os.getpid()}")
+        except Exception as e:
+            logger.error(f"(RecaptchaWorker {os.getpid()}) Pre-warm failed, starting the browser on first request instead: {e}")
+            if driver is not None:
+                try: driver.quit()
+                except Exception: pass
+                driver = None
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request[0] == "stop":
+            break
+        user_id_for_logging = request[1]
+        metrics.phases.clear() # Only this task's phases are sent back
+        started = time.monotonic()
+        try:
+            if stub_delay is not None:
+                with metrics.span("recaptcha_execute"):
+                    time.sleep(stub_delay)
+                token = f"stub-token-{os.getpid()}-{served}"
+            else:
+                if driver is None:
+                    driver = create_recaptcha_driver()
+                    load_recaptcha_page(driver, user_id_for_logging)
+                token = execute_recaptcha(driver, user_id_for_logging)
+                if token is None:
+                    driver.quit()
+                    driver = None
+            reply = ("ok", token)
+        except Exception as e:
+            logger.error(f"[{user_id_for_logging}] (RecaptchaWorker {os.getpid()}) Error while obtaining reCAPTCHA token: {e}")
+            if driver is not None:
+                try: driver.quit()
+                except Exception: pass
+                driver = None
+            reply = ("error", f"{type(e).__name__}: {e}")
+        served += 1
+        phases = {phase: histogram.total for phase, histogram in metrics.phases.items()}
+        try:
+            conn.send(reply + (time.monotonic() - started, phases))
+        except (OSError, ValueError):
+            break
+    if driver is not None:
+        driver.quit()
 
-            msg_str = raw_msg.decode('utf-8', errors='ignore') if isinstance(raw_msg, bytes) else str(raw_msg)
-            login_related_messages_snippets.append(msg_str[:200])
 
-            if f"%xt%{GGE_GAME_WORLD}%lli%1%0%" in msg_str or "%xt%lli%1%0%" in msg_str: # Handle potential world prefix
-                logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) ✅ Login confirmation (%xt%...%lli%1%0%) received!")
-                confirmation_found = True
-                break
-        
-        if login_related_messages_snippets:
-             logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) Message snippets during login confirmation wait: {login_related_messages_snippets}")
+class RecaptchaWorker:
+    """Parent-side handle of one worker process."""
+    __slots__ = ("process", "conn", "tasks")
 
-        if confirmation_found:
-            logger.info(f"[{user_id_for_logging}] (SyncWorker-RCT) Login confirmed. Discarding further messages for 1 second...")
-            discard_start_time = time.time()
-            try:
-                ws.settimeout(0.1)
-                while time.time() - discard_start_time < 1.0:
-                    if not ws.connected: break
-                    ws.recv()
-            except websocket.WebSocketTimeoutException: pass
-            except Exception as e_discard: logger.warning(f"[{user_id_for_logging}] (SyncWorker-RCT) Error discarding messages post-login: {e_discard}")
-            
-            ws.settimeout(connect_timeout) # Reset to a reasonable default for subsequent operations
-            return ws
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.tasks = 0
+
+
+class RecaptchaProcessPool:
+    """Fixed-size pool of supervised worker processes doing the Selenium/Chrome work.
+
+    The event loop only exchanges small (request, reply) tuples with the workers over pipes.
+    Each task has a hard timeout; on expiry the worker's whole process group (the worker plus
+    Chrome and chromedriver) is killed with SIGKILL and a fresh worker is started. Workers are
+    also replaced after `max_tasks` tokens, or when their process group's RSS exceeds `max_rss_mb`.
+    """
+    def __init__(self, processes: int, task_timeout: float = 90.0, max_tasks: int = 20, max_rss_mb: float = 1500.0, stub_delay: Optional[float] = None, prewarm: bool = False):
+        self.processes = processes
+        self.task_timeout = task_timeout
+        self.max_tasks = max_tasks
+        self.max_rss_mb = max_rss_mb
+        self.stub_delay = stub_delay
+        self.prewarm = prewarm
+        self._context = multiprocessing.get_context("spawn") # Never fork the bot's event loop and sockets
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[RecaptchaWorker] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closed = False
+        self._replacements = set() # Graceful worker replacements still running; shutdown() waits for them
+        self.tasks = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.restarts = 0 # Workers replaced after a timeout or crash
+        self.recycled = 0 # Workers replaced after max_tasks or the memory cap
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    def _spawn(self) -> RecaptchaWorker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=recaptcha_worker_main, args=(child_conn, self.stub_delay, self.prewarm), name="recaptcha-worker", daemon=True)
+        process.start()
+        child_conn.close()
+        worker = RecaptchaWorker(process, parent_conn)
+        self._workers.append(worker)
+        return worker
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Queue()
+        for _ in range(self.processes):
+            self._idle.put_nowait(self._spawn())
+        logger.info(f"🧰 Started {self.processes} reCAPTCHA worker process(es){' (stub driver)' if self.stub_delay is not None else ''}.")
+
+    def _kill(self, worker: RecaptchaWorker):
+        """Kills the worker's process group (Chrome included) and reaps the worker."""
+        if worker in self._workers:
+            self._workers.remove(worker)
+        try: os.killpg(worker.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError, TypeError): pass
+        try: worker.process.kill()
+        except Exception: pass
+        worker.process.join(5)
+        worker.conn.close()
+
+    async def _replace(self, worker: RecaptchaWorker, graceful: bool):
+        if graceful:
+            try: worker.conn.send(("stop",))
+            except (OSError, ValueError): pass
+            await asyncio.to_thread(worker.process.join, 10)
+        await asyncio.to_thread(self._kill, worker) # Also sweeps up Chrome children a graceful exit left behind
+        if not self._closed:
+            self._idle.put_nowait(self._spawn())
+
+    async def _wait_reply(self, worker: RecaptchaWorker, timeout: float):
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = worker.conn.fileno()
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        try:
+            await asyncio.wait_for(readable, timeout)
+        finally:
+            loop.remove_reader(fd)
+        return worker.conn.recv()
+
+    async def get_token(self, user_id_for_logging: str = "System") -> Optional[str]:
+        """Runs one token request on the next idle worker. Returns None on failure or timeout."""
+        if self._closed or not self.started:
+            raise RuntimeError("reCAPTCHA process pool is not running.")
+        queued_at = time.monotonic()
+        worker = await self._idle.get()
+        waited = time.monotonic() - queued_at
+        self.queue_wait_total += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+        metrics.observe("recaptcha_queue_wait", waited)
+        self.tasks += 1
+        try:
+            worker.conn.send(("token", user_id_for_logging))
+            status, result, elapsed, phases = await self._wait_reply(worker, self.task_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.restarts += 1
+            logger.error(f"[{user_id_for_logging}] ⏰ reCAPTCHA worker {worker.process.pid} exceeded {self.task_timeout:.0f}s. Killing its process tree. ({self.stats_summary()})")
+            await self._replace(worker, graceful=False)
+            return None
+        except asyncio.CancelledError:
+            await self._replace(worker, graceful=False) # The reply would land on the next request otherwise
+            raise
+        except (EOFError, OSError, ValueError) as e_conn:
+            self.restarts += 1
+            logger.error(f"[{user_id_for_logging}] ❌ reCAPTCHA worker {worker.process.pid} died: {e_conn!r}. Restarting it.")
+            await self._replace(worker, graceful=False)
+            return None
+
+        for phase, seconds in phases.items():
+            metrics.observe(phase, seconds)
+        worker.tasks += 1
+        rss_mb = await asyncio.to_thread(process_group_rss_mb, worker.process.pid)
+        if worker.tasks >= self.max_tasks or (self.max_rss_mb and rss_mb > self.max_rss_mb):
+            self.recycled += 1
+            logger.info(f"♻️ Recycling reCAPTCHA worker {worker.process.pid} after {worker.tasks} task(s) ({rss_mb:.0f} MB).")
+            replacement = asyncio.create_task(self._replace(worker, graceful=True))
+            self._replacements.add(replacement)
+            replacement.add_done_callback(self._replacements.discard)
         else:
-            logger.error(f"[{user_id_for_logging}] (SyncWorker-RCT) Login confirmation (%xt%...%lli%1%0%) NOT received within {login_confirmation_timeout}s.")
-            if ws.connected: ws.close()
+            self._idle.put_nowait(worker)
+
+        if status != "ok":
+            self.failures += 1
+            logger.error(f"[{user_id_for_logging}] ❌ reCAPTCHA worker failed after {elapsed:.2f}s: {result}")
+            return None
+        if result:
+            logger.info(f"[{user_id_for_logging}] ✅ reCAPTCHA worker returned a token after {elapsed:.2f}s (queued {waited:.2f}s).")
+        return result
+
+    def get_token_blocking(self, user_id_for_logging: str = "System", cancel: Optional[CancelToken] = None) -> Optional[str]:
+        """get_token for worker threads (e.g. the token prefetch producer). Cancelling kills the worker's Chrome tree."""
+        future = asyncio.run_coroutine_threadsafe(self.get_token(user_id_for_logging), self._loop)
+        unregister = cancel.add_callback(future.cancel) if cancel else None
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            logger.info(f"[{user_id_for_logging}] 🛑 reCAPTCHA worker request cancelled.")
+            return None
+        finally:
+            if unregister: unregister()
+
+    async def shutdown(self):
+        self._closed = True
+        if self._replacements:
+            await asyncio.gather(*self._replacements, return_exceptions=True)
+        for worker in list(self._workers):
+            try: worker.conn.send(("stop",))
+            except (OSError, ValueError): pass
+        for worker in list(self._workers):
+            await asyncio.to_thread(worker.process.join, 5)
+            await asyncio.to_thread(self._kill, worker)
+        logger.info(f"reCAPTCHA process pool shut down ({self.stats_summary()}).")
+
+    def stats(self) -> dict:
+        return {"processes": self.processes, "alive": sum(1 for w in self._workers if w.process.is_alive()),
+                "tasks": self.tasks, "failures": self.failures, "timeouts": self.timeouts,
+                "restarts": self.restarts, "recycled": self.recycled,
+                "avg_queue_wait": self.queue_wait_total / self.tasks if self.tasks else 0.0, "max_queue_wait": self.queue_wait_max}
+
+    def stats_summary(self) -> str:
+        s = self.stats()
+        return (f"{s['alive']}/{s['processes']} workers alive, {s['tasks']} tasks, {s['failures']} failed, {s['timeouts']} timed out, "
+                f"{s['restarts']} restarts, {s['recycled']} recycled, queue wait avg {s['avg_queue_wait']:.2f}s / max {s['max_queue_wait']:.2f}s")
+
+
+recaptcha_process_pool: Optional[RecaptchaProcessPool] = RecaptchaProcessPool(
+    RECAPTCHA_WORKER_PROCESSES, RECAPTCHA_WORKER_TIMEOUT, RECAPTCHA_WORKER_MAX_TASKS, RECAPTCHA_WORKER_MAX_RSS_MB,
+    float(RECAPTCHA_WORKER_STUB_DELAY) if RECAPTCHA_WORKER_STUB_DELAY else None, RECAPTCHA_PREWARM,
+) if RECAPTCHA_WORKER_PROCESSES > 0 else None
+
+
+class MintedToken:
+    """A reCAPTCHA token together with the monotonic time it was minted."""
+    def __init__(self, token: str, minted_at: Optional[float] = None):
+        self.token = token
+        self.minted_at = time.monotonic() if minted_at is None else minted_at
+
+    def age(self) -> float:
+        return time.monotonic() - self.minted_at
+
+
+class TokenDemand:
+    """One job's claim on a buffered token, from note_demand() until take() uses it up or release() drops it."""
+    __slots__ = ("cache", "open")
+
+    def __init__(self, cache: "RecaptchaTokenCache"):
+        self.cache = cache
+        self.open = True
+
+    def release(self):
+        """Drops the claim if take() has not used it up yet (the job reused a session, was cancelled or failed early)."""
+        self.cache._close_demand(self)
+
+
+class RecaptchaTokenCache:
+    """Background producer keeping a small buffer of fresh reCAPTCHA tokens.
+
+    The buffer target follows demand: one token per /spin job holding an open TokenDemand,
+    plus one spare while submissions arrived within the last `idle_seconds`.
+    When idle the target drops to zero and buffered tokens simply age out. Tokens are evicted
+    once older than `ttl_seconds`, which should stay below the ~2 minute validity of v3 tokens.
+    """
+    def __init__(self, max_size: int, ttl_seconds: float = 90.0, idle_seconds: float = 300.0, mint=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.idle_seconds = idle_seconds
+        self._mint = mint or (lambda: get_gge_recaptcha_token(user_id_for_logging="TokenCache", quiet=True))
+        self._buffer: deque = deque()
+        self._pending_demand = 0
+        self._last_demand = float("-inf")
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.rejected = 0
+
+    def target_size(self) -> int:
+        with self._cond:
+            spare = 1 if (time.monotonic() - self._last_demand) < self.idle_seconds else 0
+            return min(self.max_size, self._pending_demand + spare)
+
+    def note_demand(self) -> TokenDemand:
+        """Called when a /spin job is submitted; the job passes the returned handle to take() or releases it."""
+        with self._cond:
+            self._pending_demand += 1
+            self._last_demand = time.monotonic()
+            self._cond.notify_all()
+        return TokenDemand(self)
+
+    def _close_demand(self, demand: TokenDemand):
+        with self._cond:
+            if demand.open:
+                demand.open = False
+                self._pending_demand -= 1
+                self._cond.notify_all()
+
+    def _evict_expired(self):
+        while self._buffer and self._buffer[0].age() >= self.ttl_seconds:
+            self._buffer.popleft()
+            self.expired += 1
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def take(self, timeout: float = 60.0, cancel: Optional[CancelToken] = None, demand: Optional[TokenDemand] = None) -> Optional[MintedToken]:
+        """Returns the oldest still-fresh token, waiting up to `timeout` for the producer. None on timeout or cancellation.
+
+        `demand`, the job's handle from note_demand(), is used up either way.
+        """
+        deadline = time.monotonic() + timeout
+        waited = False
+        unregister = cancel.add_callback(self._wake) if cancel else None
+        with self._cond:
+            self._last_demand = time.monotonic()
+            self._cond.notify_all()
+            try:
+                while True:
+                    self._evict_expired()
+                    if self._buffer:
+                        if waited: self.misses += 1
+                        else: self.hits += 1
+                        return self._buffer.popleft()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._stopped or self._thread is None or (cancel and cancel.cancelled):
+                        self.misses += 1
+                        return None
+                    waited = True
+                    self._cond.wait(remaining)
+            finally:
+                if demand is not None: self._close_demand(demand) # The condition's lock is reentrant
+                if unregister: unregister()
+
+    def discard(self, token: MintedToken):
+        """Records a token the server rejected; it was already removed from the buffer by take()."""
+        with self._cond:
+            self.rejected += 1
+        logger.warning(f"[TokenCache] 🗑️ Discarded rejected reCAPTCHA token (age {token.age():.1f}s).")
+
+    def _run(self):
+        logger.info(f"[TokenCache] Token producer started (max buffer {self.max_size}, TTL {self.ttl_seconds}s).")
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    self._evict_expired()
+                    if len(self._buffer) < self.target_size():
+                        break
+                    # Sleep until demand changes or the oldest token is due for eviction
+                    wait_for = self.ttl_seconds - self._buffer[0].age() if self._buffer else None
+                    self._cond.wait(wait_for)
+            token = self._mint()
+            if not token:
+                logger.warning("[TokenCache] Failed to mint reCAPTCHA token, retrying in 5s.")
+                time.sleep(5.0)
+                continue
+            with self._cond:
+                self._buffer.append(MintedToken(token))
+                logger.info(f"[TokenCache] Buffered token ({len(self._buffer)}/{self.target_size()} target, {self._pending_demand} waiting).")
+                self._cond.notify_all()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="recaptcha-token-producer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._buffer.clear()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {"buffered": len(self._buffer), "target": self.target_size(), "waiting": self._pending_demand,
+                    "hits": self.hits, "misses": self.misses, "expired": self.expired, "rejected": self.rejected}
+
+
+recaptcha_token_cache: Optional[RecaptchaTokenCache] = RecaptchaTokenCache(RECAPTCHA_TOKEN_PREFETCH, RECAPTCHA_TOKEN_TTL_SECONDS) if RECAPTCHA_TOKEN_PREFETCH > 0 else None
+
+
+# --- GGE Endpoint Routing ---
+def parse_world_mapping(value: str) -> List[Tuple[str, str]]:
+    """Parses comma-separated key=value entries (GGE_ENDPOINTS, GGE_ACCOUNT_WORLDS). Raises ValueError on a malformed entry."""
+    pairs = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        key, separator, item = entry.partition("=")
+        if not separator or not key.strip() or not item.strip():
+            raise ValueError(f"Malformed entry '{entry}' (expected key=value).")
+        pairs.append((key.strip(), item.strip()))
+    return pairs
+
+
+class GGEEndpoint:
+    """One game server WebSocket URL serving a world, with its own job count, latency estimate and backoff state."""
+    def __init__(self, world: str, url: str, max_sessions: int = 0, failure_threshold: int = 3, backoff_seconds: float = 5.0, max_backoff_seconds: float = 300.0):
+        self.world = world
+        self.url = url
+        self.label = f"{world}@{urllib.parse.urlsplit(url).netloc or url}"
+        self.max_sessions = max_sessions
+        self.failure_threshold = max(1, failure_threshold)
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.jobs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_failure: Optional[str] = None
+        self.backoff_until = 0.0 # time.monotonic()
+        self.latency: Optional[float] = None # Moving average of spin RTTs, seconds
+
+    def has_capacity(self) -> bool:
+        return not self.max_sessions or self.in_use < self.max_sessions
+
+    def backing_off(self, now: Optional[float] = None) -> bool:
+        return (time.monotonic() if now is None else now) < self.backoff_until
+
+    def load(self) -> float:
+        return self.in_use / self.max_sessions if self.max_sessions else float(self.in_use)
+
+    def on_latency(self, seconds: float):
+        self.latency = seconds if self.latency is None else 0.9 * self.latency + 0.1 * seconds
+
+    def on_success(self):
+        """A login was confirmed: the endpoint is serving again."""
+        if self.consecutive_failures >= self.failure_threshold:
+            logger.info(f"[Router] Endpoint {self.label} recovered after {self.consecutive_failures} failure(s).")
+        self.consecutive_failures = 0
+
+    def on_failure(self, reason: str):
+        """A connect failed, a login went unanswered or the connection dropped. Enough of them in a row start a backoff."""
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_failure = reason
+        metrics.inc("spinbot_endpoint_failures_total", "endpoint", self.label)
+        if self.consecutive_failures >= self.failure_threshold:
+            backoff = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (self.consecutive_failures - self.failure_threshold))
+            self.backoff_until = time.monotonic() + backoff
+            logger.warning(f"[Router] ⚠️ Endpoint {self.label} failed {self.consecutive_failures} time(s) in a row ({reason}); no new jobs for {backoff:.0f}s.")
+
+    def status(self) -> str:
+        limit = self.max_sessions or "∞"
+        rtt = f"RTT {self.latency * 1000:.0f} ms" if self.latency is not None else "RTT n/a"
+        remaining = self.backoff_until - time.monotonic()
+        health = f"backing off {remaining:.0f}s ({self.last_failure})" if remaining > 0 else "healthy"
+        return f"{self.label}: {self.in_use}/{limit} running, {self.jobs} job(s), {rtt}, {self.failures} failure(s), {health}"
+
+
+class EndpointLease:
+    """A job's slot on one endpoint, taken when SpinScheduler admits the job and given back by finish()."""
+    __slots__ = ("router", "endpoint", "released")
+
+    def __init__(self, router: "GGERouter", endpoint: GGEEndpoint):
+        self.router = router
+        self.endpoint = endpoint
+        self.released = False
+
+    def reroute(self) -> bool:
+        """Moves the slot to another endpoint of the same world with room and no backoff. False if there is none."""
+        return self.router.reroute(self)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.endpoint.in_use -= 1
+
+
+class GGERouter:
+    """Maps game accounts to their world and spreads jobs over the endpoints serving it.
+
+    - An account's world is the one given on the /spin form, else its `account_worlds` entry, else `default_world`.
+    - Each endpoint runs at most `max_sessions` jobs at once (0 = no per-endpoint limit).
+    - A job goes to the least loaded endpoint of its world, ties broken by the lower spin RTT.
+    - An endpoint with `failure_threshold` failures in a row gets no new jobs for an exponentially
+      growing backoff. Its running jobs and all other endpoints carry on.
+    """
+    def __init__(self, endpoints: List[Tuple[str, str]], default_world: str, account_worlds: List[Tuple[str, str]] = (), max_sessions: int = 0,
+                 failure_threshold: int = 3, backoff_seconds: float = 5.0, max_backoff_seconds: float = 300.0):
+        self.worlds: Dict[str, List[GGEEndpoint]] = {}
+        for world, url in endpoints:
+            self.worlds.setdefault(world, []).append(GGEEndpoint(world, url, max_sessions, failure_threshold, backoff_seconds, max_backoff_seconds))
+        self._world_names = {world.lower(): world for world in self.worlds}
+        self.default_world = self._canonical_world(default_world)
+        self.account_worlds = {account.lower(): self._canonical_world(world) for account, world in account_worlds}
+
+    def _canonical_world(self, world: str) -> str:
+        canonical = self._world_names.get(world.strip().lower())
+        if canonical is None:
+            raise ValueError(f"Unknown game world '{world}'. Configured worlds: {', '.join(self.worlds)}.")
+        return canonical
+
+    def world_for(self, username: str, world: Optional[str] = None) -> str:
+        """The world `username` plays on. Raises ValueError for a world without endpoints."""
+        if world and world.strip():
+            return self._canonical_world(world)
+        return self.account_worlds.get(username.lower(), self.default_world)
+
+    def endpoints(self) -> List[GGEEndpoint]:
+        return [endpoint for world_endpoints in self.worlds.values() for endpoint in world_endpoints]
+
+    def _pick(self, world: str, exclude: Optional[GGEEndpoint] = None) -> Optional[GGEEndpoint]:
+        now = time.monotonic()
+        candidates = [endpoint for endpoint in self.worlds[world] if endpoint is not exclude and endpoint.has_capacity() and not endpoint.backing_off(now)]
+        if not candidates:
             return None
+        return min(candidates, key=lambda endpoint: (endpoint.load(), endpoint.latency or 0.0))
 
-    except websocket.WebSocketException as e_ws: # Catch specific websocket errors
-        logger.error(f"[{user_id_for_logging}] (SyncWorker-RCT) WebSocket GGE Login Error: {e_ws}", exc_info=True)
-    except Exception as e_main:
-        logger.error(f"[{user_id_for_logging}] (SyncWorker-RCT) Unexpected GGE Login Error: {e_main}", exc_info=True)
+    def _take(self, endpoint: GGEEndpoint):
+        endpoint.in_use += 1
+        endpoint.peak_in_use = max(endpoint.peak_in_use, endpoint.in_use)
 
-    if ws and ws.connected:
-        try: ws.close()
-        except: pass
+    def try_lease(self, world: str) -> Optional[EndpointLease]:
+        """A slot on the best endpoint of `world`, or None while all of them are full or backing off."""
+        endpoint = self._pick(world)
+        if endpoint is None:
+            return None
+        self._take(endpoint)
+        endpoint.jobs += 1
+        metrics.inc("spinbot_endpoint_jobs_total", "endpoint", endpoint.label)
+        return EndpointLease(self, endpoint)
+
+    def reroute(self, lease: EndpointLease) -> bool:
+        alternative = self._pick(lease.endpoint.world, exclude=lease.endpoint)
+        if alternative is None or lease.released:
+            return False
+        logger.info(f"[Router] Moving a job from {lease.endpoint.label} to {alternative.label}.")
+        self.move(lease, alternative)
+        return True
+
+    def move(self, lease: EndpointLease, endpoint: GGEEndpoint):
+        """Points the lease at `endpoint` without checking its limit (a parked session on it is being reused)."""
+        if lease.released or endpoint is lease.endpoint:
+            return
+        lease.endpoint.in_use -= 1
+        self._take(endpoint)
+        lease.endpoint = endpoint
+
+    def retry_at(self) -> Optional[float]:
+        """time.monotonic() at which the earliest backoff ends, if any endpoint is backing off."""
+        now = time.monotonic()
+        return min((endpoint.backoff_until for endpoint in self.endpoints() if endpoint.backing_off(now)), default=None)
+
+    def status_lines(self) -> List[str]:
+        return [endpoint.status() for endpoint in self.endpoints()]
+
+
+gge_router = GGERouter(parse_world_mapping(GGE_ENDPOINTS) or [(GGE_GAME_WORLD, GGE_WEBSOCKET_URL)], GGE_GAME_WORLD, parse_world_mapping(GGE_ACCOUNT_WORLDS),
+                       GGE_ENDPOINT_MAX_SESSIONS, GGE_ENDPOINT_FAILURE_THRESHOLD, GGE_ENDPOINT_BACKOFF_SECONDS, GGE_ENDPOINT_MAX_BACKOFF_SECONDS)
+
+
+# --- GGE Login Worker with reCAPTCHA (Adapted) ---
+def build_pre_login_commands(username: str, world: str = GGE_GAME_WORLD) -> List[str]:
+    """The verChk / login / vln messages sent before lli; none of them need the reCAPTCHA token."""
+    return [
+        "<msg t='sys'><body action='verChk' r='0'><ver v='166' /></body></msg>",
+        f"<msg t='sys'><body action='login' r='0'><login z='{world}'><nick><![CDATA[]]></nick><pword><![CDATA[{GGE_STATIC_PWORD_PART}]]></pword></login></body></msg>",
+        f"%xt%{world}%vln%1%{{\"NOM\":\"{username}\"}}%",
+    ]
+
+def build_login_command(username: str, password: str, rct_token: str, world: str = GGE_GAME_WORLD) -> str:
+    login_payload = {
+        "CONM": 297, "RTM": 54, "ID": 0, "PL": 1,
+        "NOM": username, "PW": password, "LT": None, "LANG": "de",
+        "DID": "0", "AID": GGE_AID, "KID": "",
+        "REF": "https://empire.goodgamestudios.com", "GCI": "",
+        "SID": 9, "PLFID": 1, "RCT": rct_token
+    }
+    return f"%xt%{world}%lli%1%{json.dumps(login_payload)}%"
+
+def build_spin_command(world: str = GGE_GAME_WORLD) -> str:
+    return f"%xt%{world}%lws%1%{{\"LWET\":1}}%" # LWET:1 seems to be the spin type
+
+def build_keepalive_command(world: str = GGE_GAME_WORLD) -> str:
+    return f"%xt%{world}%pin%1%<RoundHouseKick>%" # What the game client sends to keep idle connections open
+
+# --- Frame Classification ---
+FRAME_NON_XT = b"<non-xt>" # Counter key for sys/XML frames
+
+class FrameClassifier:
+    """Classifies raw frames by their command and status fields without decoding them.
+
+    Server frames look like %xt%<cmd>%<request id>%<status>%<payload>% (optionally with the
+    world as an extra first field). Only the frames a session handles (lws rewards, lli login
+    results) need to be decoded; everything else is counted per command and dropped.
+    One instance is shared by the login and spin phases of a session.
+    """
+    __slots__ = ("world", "counters")
+
+    def __init__(self, world: str = GGE_GAME_WORLD):
+        self.world = world.encode("utf-8")
+        self.counters: Dict[bytes, int] = defaultdict(int)
+
+    def classify(self, raw) -> Tuple[bytes, Optional[int]]:
+        """Returns (command, status). command is b"" for non-%xt% frames; status is None if missing or not numeric."""
+        if raw.__class__ is str: # websocket-client decodes text frames; GGE normally sends binary
+            raw = raw.encode("utf-8")
+        if not raw.startswith(b"%xt%"):
+            self.counters[FRAME_NON_XT] += 1
+            return b"", None
+        end = raw.find(b"%", 4)
+        if end < 0:
+            self.counters[FRAME_NON_XT] += 1
+            return b"", None
+        command = raw[4:end]
+        if command == self.world: # Handle potential world prefix
+            start = end + 1
+            end = raw.find(b"%", start)
+            if end < 0:
+                self.counters[FRAME_NON_XT] += 1
+                return b"", None
+            command = raw[start:end]
+        self.counters[command] += 1
+        request_id_end = raw.find(b"%", end + 1)
+        status_end = raw.find(b"%", request_id_end + 1) if request_id_end >= 0 else -1
+        if status_end < 0:
+            return command, None
+        try:
+            return command, int(raw[request_id_end + 1:status_end])
+        except ValueError:
+            return command, None
+
+    def frame_counts(self) -> Dict[str, int]:
+        return {command.decode("utf-8", errors="replace"): count for command, count in self.counters.items()}
+
+class LoginHandshake:
+    """State machine for the login handshake, advanced by classified server frames.
+
+    verChk, login, vln and lli are sent back to back; the handshake then waits only for the
+    lli answer. Status 0 means CONFIRMED and anything else means REJECTED. Frames that arrive
+    earlier (an optional initial message, apiOK, the vln answer, push traffic) are recorded
+    but do not hold anything up. The caller stops reading as soon as the state is final, so
+    frames after the confirmation stay queued on the socket for the spin phase.
+    """
+    AWAITING_LLI = "awaiting_lli"
+    CONFIRMED = "confirmed"
+    REJECTED = "rejected"
+    __slots__ = ("state", "status", "seen", "lli_snippets")
+
+    def __init__(self):
+        self.state = self.AWAITING_LLI
+        self.status: Optional[int] = None
+        self.seen: Dict[str, int] = {} # Command -> frames observed before the lli answer, in first-seen order
+        self.lli_snippets: List[str] = []
+
+    @property
+    def done(self) -> bool:
+        return self.state != self.AWAITING_LLI
+
+    def feed(self, command: bytes, status: Optional[int], raw) -> bool:
+        """Advances the state with one classified frame; returns True once the state is final."""
+        if command != b"lli":
+            name = command.decode("utf-8", errors="replace") if command else FRAME_NON_XT.decode()
+            self.seen[name] = self.seen.get(name, 0) + 1
+            return False
+        self.lli_snippets.append(raw[:200].decode("utf-8", errors="ignore") if isinstance(raw, bytes) else raw[:200])
+        self.status = status
+        self.state = self.CONFIRMED if status == 0 else self.REJECTED
+        return True
+
+    def seen_summary(self) -> str:
+        return ", ".join(name if count == 1 else f"{name} x{count}" for name, count in self.seen.items()) or "none"
+
+
+# --- Reward Decoding ---
+# Slot ids, names and unit mappings come from REWARD_CATALOG
+LWS_REWARD_PREFIX = "%xt%lws%1%0%"
+
+
+class RewardCounter:
+    """Index-based reward totals: one int per canonical slot, plus a small dict for unknown reward types."""
+    __slots__ = ("counts", "unknown")
+
+    def __init__(self):
+        self.counts = [0] * len(REWARD_SLOT_NAMES)
+        self.unknown: Dict[str, int] = {}
+
+    def add_unknown(self, name: str, amount: int):
+        self.unknown[name] = self.unknown.get(name, 0) + amount
+
+    def to_dict(self) -> Dict[str, int]:
+        rewards = {REWARD_SLOT_NAMES[slot]: amount for slot, amount in enumerate(self.counts) if amount}
+        rewards.update(self.unknown)
+        return rewards
+
+    def __bool__(self):
+        return any(self.counts) or bool(self.unknown)
+
+
+def _fixed_amount(slot: int, amount: int):
+    def extract(reward_type, reward_data):
+        return slot, amount
+    return extract
+
+def _int_amount(slot: int):
+    def extract(reward_type, reward_data):
+        if isinstance(reward_data, int): return slot, reward_data
+        logger.warning(f"  ⚠️ Invalid format for type '{reward_type}': {reward_data}")
+        return None
+    return extract
+
+def _extract_unit(reward_type, reward_data):
+    if isinstance(reward_data, list) and len(reward_data) == 2:
+        unit_id, amount = reward_data
+        return UNIT_REWARD_SLOTS.get(unit_id, UNIT_FALLBACK_SLOT), amount # Default to Werkzeuge if unknown unit
+    logger.warning(f"  ⚠️ Invalid format for type 'U': {reward_data}")
     return None
 
-def parse_reward_message(msg: str, rewards: defaultdict):
-    """Parses the specific reward message format from the game server."""
+def _ticket_amount(slot: int):
+    def extract(reward_type, reward_data):
+        if isinstance(reward_data, int): return slot, reward_data
+        logger.warning(f"  ⚠️ Invalid/No quantity for '{reward_type}', assuming 1: {reward_data}")
+        return slot, 1
+    return extract
+
+def _chest_amount(slot: int):
+    def extract(reward_type, reward_data):
+        if isinstance(reward_data, list) and len(reward_data) > 1 and isinstance(reward_data[1], int): return slot, reward_data[1]
+        if isinstance(reward_data, int): return slot, reward_data
+        logger.warning(f"  ⚠️ Unusual format for '{reward_type}', assuming quantity 1: {reward_data}")
+        return slot, 1
+    return extract
+
+# RewardInfo.decode -> extractor factory taking the slot
+REWARD_EXTRACTORS = {
+    "one": lambda slot: _fixed_amount(slot, 1),
+    "int": _int_amount,
+    "tickets": _ticket_amount,
+    "chests": _chest_amount,
+}
+
+# Reward type code -> extractor returning (slot, amount), or None for an invalid item
+REWARD_DECODERS = {"U": _extract_unit}
+REWARD_DECODERS.update((info.type_code, REWARD_EXTRACTORS[info.decode](info.slot)) for info in REWARD_CATALOG if info.decode != "unit")
+
+_logged_unknown_rewards = set()
+
+def _decode_reward_items(reward_items: list) -> tuple:
+    """Turns an 'R' list into a tuple of (slot id or Unbekannt_* name, amount) pairs."""
+    decoded = []
+    for item in reward_items:
+        if not isinstance(item, list) or len(item) < 2:
+            logger.warning(f"  ⚠️ Skipping invalid reward item format: {item}")
+            continue
+        reward_type = item[0]
+        reward_data = item[1]
+        try:
+            extract = REWARD_DECODERS.get(reward_type) if isinstance(reward_type, str) else None
+            if extract is None:
+                if isinstance(reward_data, int): amount = reward_data
+                elif isinstance(reward_data, list) and len(reward_data) > 1 and isinstance(reward_data[1], int): amount = reward_data[1]
+                else: amount = 1
+                reward_name = f"Unbekannt_{reward_type}"
+                if reward_name not in _logged_unknown_rewards:
+                    _logged_unknown_rewards.add(reward_name)
+                    logger.info(f"  -> Unknown reward type: {reward_type} with data {reward_data}. Counted as '{reward_name}' (logged once per type).")
+                if amount > 0:
+                    decoded.append((reward_name, amount))
+                continue
+            slot_amount = extract(reward_type, reward_data)
+            if slot_amount is not None and slot_amount[1] > 0:
+                decoded.append(slot_amount)
+        except Exception as parse_inner_err:
+            logger.error(f"  ❌ Error processing item {item}: {parse_inner_err}", exc_info=True)
+    return tuple(decoded)
+
+def decode_reward_message(msg: str, counter: RewardCounter) -> tuple:
+    """Parses the specific reward message format from the game server into `counter`.
+
+    Returns the decoded (slot id or Unbekannt_* name, amount) pairs; empty if nothing was counted.
+    """
+    json_str = None
     try:
-        match = re.search(r"%xt%lws%1%0%(.*)%", msg) # Original regex seems fine
-        if not match:
-            if msg.startswith("%xt%"): # Non-reward xt message
-                pass # logger.debug(f"Non-reward xt message: {msg[:60]}")
-            return
-        json_str = match.group(1)
-        data = json.loads(json_str)
+        start = msg.find(LWS_REWARD_PREFIX)
+        if start < 0:
+            return ()
+        start += len(LWS_REWARD_PREFIX)
+        line_end = msg.find("\n", start) # The reward JSON never spans lines
+        end = msg.rfind("%", start, line_end if line_end >= 0 else len(msg))
+        if end < 0:
+            return ()
+        json_str = msg[start:end]
 
-        if "R" not in data or not isinstance(data["R"], list):
+        data = json.loads(json_str)
+        reward_items = data.get("R") if isinstance(data, dict) else None
+        if not isinstance(reward_items, list):
             logger.info(f"ℹ️ No valid 'R' (Rewards) list in parsed JSON: {data}")
-            return
+            return ()
+        decoded = _decode_reward_items(reward_items)
 
-        for item in data["R"]:
-            if not isinstance(item, list) or len(item) < 2:
-                logger.warning(f"  ⚠️ Skipping invalid reward item format: {item}")
-                continue
-            reward_type = item[0]
-            reward_data = item[1]
-            amount = 0
-            reward_name = None
-            try:
-                if reward_type == "U":
-                    if isinstance(reward_data, list) and len(reward_data) == 2:
-                        unit_id, amount = reward_data
-                        truppen_namen = { 215: "Schildmaid", 238: "Walküren-Scharfschützin", 227: "Beschützer des Nordens", 216: "Walküren-Waldläuferin" }
-                        reward_name = truppen_namen.get(unit_id, "Werkzeuge") # Default to Werkzeuge if unknown unit
-                    else: logger.warning(f"  ⚠️ Invalid format for type 'U': {reward_data}")
-                elif reward_type == "RI": amount = 1; reward_name = "Ausrüstung/Edelsteine"
-                elif reward_type == "CI": amount = 1; reward_name = "Konstrukte"
-                elif reward_type == "LM":
-                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Ausbaumarken"
-                    else: logger.warning(f"  ⚠️ Invalid format for type 'LM': {reward_data}")
-                elif reward_type == "LT":
-                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Baumarken"
-                    else: logger.warning(f"  ⚠️ Invalid format for type 'LT': {reward_data}")
-                elif reward_type == "STP":
-                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Sceattas"
-                    else: logger.warning(f"  ⚠️ Invalid format for type 'STP': {reward_data}")
-                elif reward_type == "SLWT":
-                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Lose"
-                    else: amount = 1; logger.warning(f"  ⚠️ Invalid/No quantity for 'SLWT', assuming 1: {reward_data}"); reward_name = "Lose"
-                elif reward_type == "LB":
-                    if isinstance(reward_data, list) and len(reward_data) > 1 and isinstance(reward_data[1], int): amount = reward_data[1]; reward_name = "Kisten"
-                    elif isinstance(reward_data, int): amount = reward_data; reward_name = "Kisten"
-                    else: amount = 1; logger.warning(f"  ⚠️ Unusual format for 'LB', assuming quantity 1: {reward_data}"); reward_name = "Kisten"
-                elif reward_type == "UE": amount = 1; reward_name = "Mehrweller"
-                elif reward_type == "C2":
-                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Rubine"
-                    else: logger.warning(f"  ⚠️ Invalid format for type 'C2': {reward_data}")
-                elif reward_type == "FKT":
-                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Ludwig-Geschenke"
-                    else: logger.warning(f"  ⚠️ Invalid format for type 'FKT': {reward_data}")
-                elif reward_type == "PTK":
-                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Beatrice-Geschenke"
-                    else: logger.warning(f"  ⚠️ Invalid format for type 'PTK': {reward_data}")
-                elif reward_type == "KTK":
-                    if isinstance(reward_data, int): amount = reward_data; reward_name = "Ulrich-Geschenke"
-                    else: logger.warning(f"  ⚠️ Invalid format for type 'KTK': {reward_data}")
-                elif reward_type == "D": amount = 1; reward_name = "Dekorationen"
-                else:
-                    if isinstance(reward_data, int): amount = reward_data
-                    elif isinstance(reward_data, list) and len(reward_data) > 1 and isinstance(reward_data[1], int): amount = reward_data[1]
-                    else: amount = 1
-                    reward_name = f"Unbekannt_{reward_type}"
-                    logger.info(f"  -> Unknown reward type: {reward_type} with data {reward_data}. Counted as '{reward_name}'.")
-
-                if reward_name and amount > 0:
-                    rewards[reward_name] += amount
-            except Exception as parse_inner_err:
-                logger.error(f"  ❌ Error processing item {item}: {parse_inner_err}", exc_info=True)
+        counts = counter.counts
+        for slot, amount in decoded:
+            if slot.__class__ is int:
+                counts[slot] += amount
+            else:
+                counter.add_unknown(slot, amount)
+        return decoded
     except json.JSONDecodeError as e:
         logger.error(f"❌ JSON parsing error for extracted string '{json_str}': {e}")
     except Exception as e:
         logger.error(f"❌ Unexpected error parsing message '{msg[:100]}...': {e}", exc_info=True)
+    return ()
 
 
-def spin_lucky_wheel(username, password, spins, user_id_for_logging="User"):
-    """Connects via reCAPTCHA, logs in, performs spins, and waits for reward messages."""
-    rewards = defaultdict(int)
-    ws = None
-    receive_timeout_per_spin = 15.0
-    spin_send_delay = 0.3 # Small delay between sending spin commands
+def parse_reward_message(msg: str, rewards) -> tuple:
+    """Parses a reward message into `rewards`: a RewardCounter, or a name -> amount dict as before.
 
-    logger.info(f"[{user_id_for_logging}] Starting spin_lucky_wheel for {username} with {spins} spins.")
+    Returns the decoded items like decode_reward_message.
+    """
+    if isinstance(rewards, RewardCounter):
+        return decode_reward_message(msg, rewards)
+    counter = RewardCounter()
+    decoded = decode_reward_message(msg, counter)
+    for reward_name, amount in counter.to_dict().items():
+        rewards[reward_name] = rewards.get(reward_name, 0) + amount
+    return decoded
 
-    try:
-        # Step 1: Get reCAPTCHA token
-        logger.info(f"[{user_id_for_logging}] Attempting to obtain reCAPTCHA token for {username}...")
-        rct_token = get_gge_recaptcha_token(user_id_for_logging=user_id_for_logging, quiet=False)
-        if not rct_token:
-            logger.error(f"[{user_id_for_logging}] Failed to obtain reCAPTCHA token for {username}. Aborting spins.")
-            raise ConnectionError("Failed to obtain reCAPTCHA token. Check bot logs and Selenium/ChromeDriver setup.")
-
-        # Step 2: Login with reCAPTCHA token
-        logger.info(f"[{user_id_for_logging}] Attempting GGE login for {username} using reCAPTCHA token...")
-        ws = gge_login_sync_worker_with_rct(username, password, rct_token, user_id_for_logging=user_id_for_logging)
-        if not ws or not ws.connected:
-            logger.error(f"[{user_id_for_logging}] GGE login failed for {username} after obtaining reCAPTCHA token. Aborting spins.")
-            raise ConnectionError("GGE login failed. Check credentials or game server status. Token might have expired or been invalid.")
 
-        logger.info(f"[{user_id_for_logging}] ✅ GGE Login successful for {username}. Proceeding with spins.")
-        ws.settimeout(receive_timeout_per_spin) # Set timeout for spin reward messages
-
-        # Step 3: Perform spins
-        logger.info(f"[{user_id_for_logging}] 🚀 Starting {spins} lucky wheel spins for {username}...")
-        for i in range(spins):
-            current_spin = i + 1
-            if not ws.connected:
-                logger.warning(f"[{user_id_for_logging}] [{current_spin}/{spins}] WebSocket disconnected before sending spin command. Aborting.")
+# --- Spin Outcome Capture ---
+UNKNOWN_REWARD_SLOT = -1 # Slot id of reward types without a canonical slot
+EMPTY_REWARD_SLOT = -2 # Row of an answered spin whose reward list decoded to nothing
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class SpinOutcomeLog:
+    """Columnar per-spin capture: one row per decoded reward item of an answered spin.
+
+    Four fixed-width arrays (spin index uint32, slot int8, amount int32, RTT float32 seconds)
+    make 13 bytes per row, so a 10,000-spin job stays around 150 KB. Rows arrive in reply order, so a
+    late reply lands after later spins; each spin's rows stay together.
+    record() is called from the spin loop; summarize() does the statistics in one batch pass at the end.
+    """
+    __slots__ = ("spin", "slot", "amount", "rtt", "answered")
+
+    def __init__(self):
+        self.spin = array("I")
+        self.slot = array("b")
+        self.amount = array("i")
+        self.rtt = array("f")
+        self.answered = 0
+
+    def record(self, spin: int, decoded: tuple, rtt: float):
+        self.answered += 1
+        if not decoded:
+            decoded = ((EMPTY_REWARD_SLOT, 0),)
+        for slot, amount in decoded:
+            self.spin.append(spin)
+            self.slot.append(slot if slot.__class__ is int else UNKNOWN_REWARD_SLOT)
+            self.amount.append(amount)
+            self.rtt.append(rtt)
+
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in (self.spin, self.slot, self.amount, self.rtt))
+
+    def summarize(self) -> Optional[dict]:
+        """Per-reward mean / variance per answered spin and drop rate, tickets back per ticket, RTT percentiles."""
+        spins = self.answered
+        if not spins:
+            return None
+        slot_count = len(REWARD_SLOT_NAMES) + 1 # Last entry collects unknown reward types
+        totals = [0] * slot_count
+        squares = [0] * slot_count
+        hits = [0] * slot_count
+        per_spin = [0] * slot_count # Amounts of the spin being summed up
+        touched: List[int] = []
+        rtts = []
+        ticket_slot = REWARD_SLOT["Lose"]
+        dry_streak = longest_dry_streak = 0
+        previous_spin = None
+
+        def close_spin():
+            nonlocal dry_streak, longest_dry_streak
+            dry_streak = 0 if per_spin[ticket_slot] else dry_streak + 1
+            longest_dry_streak = max(longest_dry_streak, dry_streak)
+            for index in touched:
+                amount = per_spin[index]
+                totals[index] += amount
+                squares[index] += amount * amount
+                hits[index] += 1
+                per_spin[index] = 0
+            touched.clear()
+
+        for spin, slot, amount, rtt in zip(self.spin, self.slot, self.amount, self.rtt):
+            if spin != previous_spin:
+                if previous_spin is not None:
+                    close_spin()
+                previous_spin = spin
+                rtts.append(rtt)
+            if slot == EMPTY_REWARD_SLOT:
+                continue
+            index = slot if slot >= 0 else slot_count - 1
+            if not per_spin[index]:
+                touched.append(index)
+            per_spin[index] += amount
+        close_spin()
+
+        rewards = {}
+        for index in range(slot_count):
+            if not hits[index]:
+                continue
+            mean = totals[index] / spins
+            rewards[REWARD_SLOT_NAMES[index] if index < len(REWARD_SLOT_NAMES) else "Unbekannt"] = {
+                "total": totals[index], "mean": mean, "variance": squares[index] / spins - mean * mean, "drop_rate": hits[index] / spins,
+            }
+        rtts.sort()
+        return {
+            "spins": spins, "rows": len(self.spin), "bytes": self.nbytes(),
+            "tickets_per_ticket": totals[ticket_slot] / spins, "longest_dry_streak": longest_dry_streak,
+            "rtt_ms": {q: round(percentile(rtts, f) * 1000, 1) for q, f in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))},
+            "rewards": rewards,
+        }
+
+
+def format_outcome_stats_field(stats: dict) -> str:
+    """Renders SpinOutcomeLog.summarize() for the optional 'Spin Statistics' embed field (max 1024 chars)."""
+    rtt = stats["rtt_ms"]
+    lines = [
+        f"**Answered spins:** {stats['spins']:,} | **RTT** p50 {rtt['p50']:.0f} ms, p90 {rtt['p90']:.0f} ms, p99 {rtt['p99']:.0f} ms",
+        f"**Tickets back per ticket:** {stats['tickets_per_ticket']:.3f} | longest run without tickets: {stats['longest_dry_streak']:,}",
+        "**Per spin** (mean ± sd, drop rate):",
+    ]
+    for name, reward in sorted(stats["rewards"].items(), key=lambda item: -item[1]["drop_rate"]):
+        lines.append(f"{name}: {reward['mean']:,.2f} ± {max(0.0, reward['variance']) ** 0.5:,.2f} ({reward['drop_rate'] * 100:.1f}%)")
+    value = ""
+    for line in lines:
+        if len(value) + len(line) + 1 > 1024:
+            break
+        value += line + "\n"
+    return value.rstrip("\n")
+
+
+# --- Spin Reply Matching ---
+class SpinReplyMatcher:
+    """Matches lws replies, which carry no id, to the spins waiting for them.
+
+    The server answers commands in order, so a reply normally belongs to the oldest waiting spin.
+    A spin past its deadline may still be answered late, or never (a lost reply), and until that
+    is known the next lws frame could be either. Expired spins are therefore kept as stale: an lws
+    frame arriving while any are stale is taken as the oldest stale spin's late reply. After an
+    expiry the spin loop sends a keepalive as a barrier; its answer proves that every spin sent
+    before it was answered or lost, so stale spins up to it are forgotten and spins from before it
+    that are still waiting are resolved as lost. Bookkeeping only: the loops do the I/O and pass in the times.
+    """
+    __slots__ = ("pending", "stale", "barriers", "sent")
+
+    def __init__(self):
+        self.pending = deque() # (spin number, sent at, deadline) of spins waiting for their reply
+        self.stale = deque() # (spin number, sent at) of expired spins whose reply may still arrive
+        self.barriers = deque() # Spins sent before each keepalive in flight
+        self.sent = 0
+
+    def add(self, sent_at: float, timeout: float) -> int:
+        """Registers a sent spin and returns its number."""
+        self.sent += 1
+        self.pending.append((self.sent, sent_at, sent_at + timeout))
+        return self.sent
+
+    def expire(self, now: float) -> list:
+        """Moves the spins past their deadline to stale; returns them as (spin number, sent at, deadline)."""
+        expired = []
+        while self.pending and self.pending[0][2] <= now:
+            expired.append(self.pending.popleft())
+            self.stale.append(expired[-1][:2])
+        return expired
+
+    def give_up(self) -> list:
+        """Moves every waiting spin to stale regardless of its deadline (the lockstep baseline in benchmark.py gives up on a spin early after a recv error)."""
+        expired = list(self.pending)
+        self.pending.clear()
+        self.stale.extend(spin[:2] for spin in expired)
+        return expired
+
+    def needs_barrier(self) -> bool:
+        """True if a stale spin was sent after the last keepalive in flight."""
+        return bool(self.stale) and (not self.barriers or self.barriers[-1] < self.stale[-1][0])
+
+    def add_barrier(self):
+        """Registers a keepalive sent now. It has no deadline: its answer queues behind any late reply."""
+        self.barriers.append(self.sent)
+
+    def match(self) -> Optional[Tuple[int, float, bool]]:
+        """Takes the spin an lws frame answers: (spin number, sent at, late), or None if no spin is waiting."""
+        if self.stale:
+            spin, sent_at = self.stale.popleft()
+            return spin, sent_at, True
+        if self.pending:
+            spin, sent_at, _ = self.pending.popleft()
+            return spin, sent_at, False
+        return None
+
+    def on_barrier(self) -> list:
+        """Handles a keepalive answer; returns the waiting spins it proves lost as (spin number, sent at, deadline)."""
+        if not self.barriers:
+            return [] # Not one of ours
+        covered = self.barriers.popleft()
+        self._forget_stale(covered)
+        lost = []
+        while self.pending and self.pending[0][0] <= covered:
+            lost.append(self.pending.popleft())
+        return lost
+
+    def _forget_stale(self, covered: int):
+        while self.stale and self.stale[0][0] <= covered:
+            self.stale.popleft()
+
+
+def count_late_reply(raw, status: Optional[int], rewards: RewardCounter, stats: Dict[str, int]) -> tuple:
+    """Books the late answer of a spin already counted as timed out; returns its decoded rewards."""
+    stats["timed_out"] -= 1
+    if status != 0:
+        stats["errors"] += 1
+        return ()
+    stats["found"] += 1
+    return parse_reward_message(raw.decode("utf-8", errors="ignore") if isinstance(raw, bytes) else raw, rewards)
+
+
+def obtain_recaptcha_token(user_id_for_logging: str = "User", cancel: Optional[CancelToken] = None, demand: Optional[TokenDemand] = None) -> Tuple[Optional[str], Optional[MintedToken]]:
+    """Takes a prefetched token if the token cache is enabled, otherwise mints one now.
+
+    Returns (token, cached token entry or None). Raises JobCancelled if `cancel` fired meanwhile.
+    `demand` is the job's TokenDemand, used up by the cache.
+    """
+    if recaptcha_token_cache is not None:
+        cached_token = recaptcha_token_cache.take(cancel=cancel, demand=demand)
+        if cached_token:
+            logger.info(f"[{user_id_for_logging}] Using prefetched reCAPTCHA token (age {cached_token.age():.1f}s).")
+            return cached_token.token, cached_token
+        if cancel: cancel.raise_if_cancelled()
+        logger.warning(f"[{user_id_for_logging}] No prefetched reCAPTCHA token available, minting one directly.")
+    token = get_gge_recaptcha_token(user_id_for_logging=user_id_for_logging, quiet=False, cancel=cancel)
+    if cancel: cancel.raise_if_cancelled()
+    return token, None
+
+
+# --- Adaptive Pacing ---
+class SpinPacer:
+    """AIMD send-rate controller with an RTT-derived per-spin timeout (RFC 6298 style).
+
+    Keeps a smoothed lws reply RTT (srtt) and its mean deviation (rttvar); the per-spin timeout
+    is srtt + 4 * rttvar, clamped to [min_timeout, max_timeout] (max_timeout until the first
+    sample). The send rate grows by `additive_increase` spins/s per cleanly answered spin and is
+    multiplied by `decrease_factor` on a timeout, error frame or disconnect, at most once per
+    RTT so one burst of losses counts as a single congestion event. Spins in flight are capped
+    at rate * srtt (plus one), up to `max_window`. Purely arithmetic: the caller passes in the
+    times, so the controller behaves the same for the same sequence of events.
+    """
+    def __init__(self, initial_rate: float = 1 / 0.3, min_rate: float = 0.5, max_rate: float = 20.0,
+                 additive_increase: float = 0.25, decrease_factor: float = 0.5, min_timeout: float = 1.0,
+                 max_timeout: float = 15.0, max_window: int = 8, label: str = "User"):
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.max_window = max_window
+        self.label = label
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.decreases = 0
+        self._last_decrease_at = float("-inf")
+        self._last_logged_window = self.window()
+
+    def timeout(self) -> float:
+        if self.srtt is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.srtt + 4 * self.rttvar))
+
+    def interval(self) -> float:
+        """Seconds between spin sends at the current rate."""
+        return 1.0 / self.rate
+
+    def window(self) -> int:
+        if self.srtt is None:
+            return 1
+        return max(1, min(self.max_window, int(self.rate * self.srtt) + 1))
+
+    def on_reply(self, rtt: float):
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rate = min(self.max_rate, self.rate + self.additive_increase)
+        window = self.window()
+        if window != self._last_logged_window:
+            logger.info(f"[{self.label}] 📈 Pacing: {self.rate:.2f} spins/s, window {self._last_logged_window} -> {window}, timeout {self.timeout():.2f}s (srtt {self.srtt * 1000:.0f} ms).")
+            self._last_logged_window = window
+
+    def on_loss(self, reason: str, now: float):
+        """Multiplicative decrease after a timeout, error frame or disconnect."""
+        if now - self._last_decrease_at < (self.srtt or 0.0):
+            return # Same congestion event
+        self._last_decrease_at = now
+        self.decreases += 1
+        old_rate = self.rate
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self._last_logged_window = self.window()
+        logger.info(f"[{self.label}] 📉 Pacing: {reason}; rate {old_rate:.2f} -> {self.rate:.2f} spins/s, window {self._last_logged_window}, timeout {self.timeout():.2f}s.")
+
+
+active_pacers: "weakref.WeakSet[SpinPacer]" = weakref.WeakSet()
+metrics.register_gauge("spinbot_spin_send_rate", "Sum of the current adaptive spin send rates (spins/s).", lambda: sum(p.rate for p in list(active_pacers)))
+metrics.register_gauge("spinbot_spin_timeout_seconds", "Largest current adaptive per-spin timeout.", lambda: max((p.timeout() for p in list(active_pacers)), default=0.0))
+
+
+# --- Asyncio GGE Session ---
+class GGEAsyncSession:
+    """Asyncio-native GGE game session: connect, verChk/login/vln/lli handshake, spins and close.
+
+    Runs directly on the bot's event loop, so many sessions can be multiplexed without a
+    thread per session.
+    With an `endpoint`, its URL and world are used and it is fed spin RTTs and failures.
+    """
+    def __init__(self, user_id_for_logging: str = "User", url: Optional[str] = None, http_session: Optional[aiohttp.ClientSession] = None, endpoint: Optional[GGEEndpoint] = None):
+        self.user_id_for_logging = user_id_for_logging
+        self.endpoint = endpoint
+        self.url = url or (endpoint.url if endpoint else GGE_WEBSOCKET_URL)
+        self.world = endpoint.world if endpoint else GGE_GAME_WORLD
+        self._http_session = http_session
+        self._owns_http_session = http_session is None
+        self.ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self.classifier = FrameClassifier(self.world)
+        self.login_seconds = 0.0 # Token + login time, credited by GGESessionCache when the session is reused
+        self.recorder = gge_capture_writer.session(url=self.url, world=self.world) if gge_capture_writer else None
+
+    @property
+    def connected(self) -> bool:
+        return self.ws is not None and not self.ws.closed
+
+    async def connect(self, timeout: float = 20.0):
+        if self._http_session is None:
+            self._http_session = aiohttp.ClientSession()
+        try:
+            with metrics.span("ws_connect"):
+                self.ws = await asyncio.wait_for(self._http_session.ws_connect(self.url, autoping=True, max_msg_size=0), timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e_connect:
+            if self.endpoint: self.endpoint.on_failure(f"connect: {type(e_connect).__name__}")
+            raise
+        logger.info(f"[{self.user_id_for_logging}] (AsyncSession) ✅ WebSocket connection established!")
+
+    async def recv(self, timeout: float):
+        """Returns the next frame undecoded (bytes, or str for text frames).
+
+        Raises asyncio.TimeoutError, or ConnectionResetError once the socket is closed.
+        """
+        msg = await self.ws.receive(timeout=timeout)
+        if msg.type == aiohttp.WSMsgType.BINARY or msg.type == aiohttp.WSMsgType.TEXT:
+            if self.recorder: self.recorder.received(msg.data)
+            return msg.data
+        raise ConnectionResetError(f"WebSocket closed ({msg.type.name}).")
+
+    async def send(self, command: str):
+        if self.recorder: self.recorder.sent(command)
+        await self.ws.send_str(command)
+
+    async def login(self, username: str, password: str, rct_token: str, login_info: Optional[Dict] = None) -> bool:
+        """Runs the login handshake on an open connection. Returns True once %xt%lli%1%0% is received.
+
+        Driven by LoginHandshake: no fixed delays, the timeout only bounds the failure path, and
+        frames after the confirmation are left for spin() instead of being discarded.
+        """
+        try:
+            await self.send_pre_login(username)
+        except ConnectionResetError as e_closed:
+            logger.error(f"[{self.user_id_for_logging}] (AsyncSession) Connection closed during login: {e_closed}")
+            return False
+        return await self.confirm_login(username, password, rct_token, login_info)
+
+    async def send_pre_login(self, username: str):
+        """Sends verChk / login / vln; none of them need the reCAPTCHA token."""
+        logger.info(f"[{self.user_id_for_logging}] (AsyncSession) Sending pre-login sequence...")
+        for pre_login_command in build_pre_login_commands(username, self.world):
+            await self.send(pre_login_command)
+
+    async def confirm_login(self, username: str, password: str, rct_token: str, login_info: Optional[Dict] = None) -> bool:
+        """Sends lli on a connection that already got the pre-login sequence and waits for the answer."""
+        login_confirmation_timeout = 15.0
+        try:
+            await self.send(build_login_command(username, password, rct_token, self.world))
+            loop = asyncio.get_running_loop()
+            lli_sent_at = loop.time()
+            confirmation_deadline = lli_sent_at + login_confirmation_timeout
+
+            logger.info(f"[{self.user_id_for_logging}] (AsyncSession) Waiting for login confirmation (%xt%lli%1%0%)...")
+            handshake = LoginHandshake()
+            while not handshake.done:
+                remaining = confirmation_deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    raw_msg = await self.recv(remaining)
+                except asyncio.TimeoutError:
+                    break
+                handshake.feed(*self.classifier.classify(raw_msg), raw_msg)
+
+            if handshake.lli_snippets:
+                logger.info(f"[{self.user_id_for_logging}] (AsyncSession) lli messages during login confirmation wait: {handshake.lli_snippets}")
+            logger.info(f"[{self.user_id_for_logging}] (AsyncSession) Frames before the lli answer: {handshake.seen_summary()}")
+            if handshake.state == LoginHandshake.CONFIRMED:
+                metrics.observe("login_confirm", loop.time() - lli_sent_at)
+                logger.info(f"[{self.user_id_for_logging}] (AsyncSession) ✅ Login confirmation (%xt%...%lli%1%0%) received!")
+                if self.endpoint: self.endpoint.on_success()
+                return True
+            if handshake.state == LoginHandshake.REJECTED:
+                logger.error(f"[{self.user_id_for_logging}] (AsyncSession) ❌ Login rejected by server with status {handshake.status}.")
+                if login_info is not None: login_info["rejected_status"] = handshake.status
+            else:
+                logger.error(f"[{self.user_id_for_logging}] (AsyncSession) Login confirmation (%xt%...%lli%1%0%) NOT received within {login_confirmation_timeout}s.")
+                if self.endpoint: self.endpoint.on_failure("no login answer")
+            return False
+        except ConnectionResetError as e_closed:
+            logger.error(f"[{self.user_id_for_logging}] (AsyncSession) Connection closed during login: {e_closed}")
+            if self.endpoint: self.endpoint.on_failure("closed during login")
+            return False
+
+    async def spin(self, spins: int, rewards: RewardCounter, stats: Dict[str, int], window: int = 1, spin_send_delay: float = 0.3, receive_timeout_per_spin: float = 15.0, on_progress: Optional[Callable[[], None]] = None, rtt_samples: Optional[List[float]] = None, pacer: Optional[SpinPacer] = None, outcomes: Optional[SpinOutcomeLog] = None):
+        """Performs the spins with up to `window` spin commands in flight.
+
+        With window=1 this is the lockstep loop (delay, send, wait for reward); larger windows
+        pipeline spin commands and skip the send delay. Reward messages are matched FIFO
+        to pending spins, and each pending spin expires on its own deadline; a reply that still
+        arrives for an expired spin is credited to that spin (see SpinReplyMatcher).
+        With a `pacer`, its rate, window and timeout replace window / spin_send_delay /
+        receive_timeout_per_spin, and it is fed every reply, timeout, error frame and disconnect.
+        `on_progress` is called without arguments after each spin is resolved. If `rtt_samples` is
+        given, the send-to-reward time of every answered spin is appended to it (seconds).
+        Answered spins are recorded into `outcomes` if given.
+        """
+        loop = asyncio.get_running_loop()
+        spin_command = build_spin_command(self.world)
+        matcher = SpinReplyMatcher()
+        pending = matcher.pending # (spin number, sent at, deadline)
+        sending = True
+        next_send_at = loop.time()
+
+        def handle_frame(raw_msg):
+            command, status = self.classifier.classify(raw_msg)
+            if command == b"pin":
+                for lost_spin, _, _ in matcher.on_barrier():
+                    stats["timed_out"] += 1
+                    logger.warning(f"[{self.user_id_for_logging}] ⏰ [{lost_spin}/{spins}] The server never answered spin {lost_spin}.")
+                    if pacer: pacer.on_loss("lost reply", loop.time())
+                    if on_progress: on_progress()
+                return
+            if command != b"lws":
+                return # Unrelated server traffic, counted by the classifier
+            matched = matcher.match()
+            if matched is None:
+                logger.warning(f"[{self.user_id_for_logging}] ⚠️ lws reply with no spin waiting for it. Ignored.")
+                return
+            current_spin, sent_at, late = matched
+            rtt = loop.time() - sent_at
+            metrics.observe("spin_rtt", rtt)
+            if rtt_samples is not None: rtt_samples.append(rtt)
+            if late:
+                # Not fed to the pacer or endpoint: after a lost reply the pairing, and so the RTT, is a guess
+                decoded = count_late_reply(raw_msg, status, rewards, stats)
+                if outcomes is not None and status == 0: outcomes.record(current_spin, decoded, rtt)
+                logger.info(f"[{self.user_id_for_logging}] ⌛ [{current_spin}/{spins}] Late reply for spin {current_spin} counted ({rtt:.2f}s).")
+                if on_progress: on_progress()
+                return
+            if self.endpoint: self.endpoint.on_latency(rtt)
+            if status != 0:
+                stats["errors"] += 1
+                logger.warning(f"[{self.user_id_for_logging}] ⚠️ [{current_spin}/{spins}] Server answered spin {current_spin} with error status {status}.")
+                if pacer: pacer.on_loss(f"error status {status}", loop.time())
+            else:
+                msg = raw_msg.decode("utf-8", errors="ignore") if isinstance(raw_msg, bytes) else raw_msg
+                if spin_log_sampled(current_spin): logger.info(f"[{self.user_id_for_logging}] 🎯 [{current_spin}/{spins}] Matched reward message: {msg[:100]}...")
+                decoded = parse_reward_message(msg, rewards)
+                if outcomes is not None: outcomes.record(current_spin, decoded, rtt)
+                stats["found"] += 1
+                if pacer: pacer.on_reply(rtt)
+            if on_progress: on_progress()
+
+        while pending or (sending and matcher.sent < spins):
+            while sending and matcher.sent < spins and len(pending) < (pacer.window() if pacer else window):
+                if pacer:
+                    wait = next_send_at - loop.time()
+                    if wait > 0 and pending:
+                        break # Keep receiving until the next send slot
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                elif window == 1 and spin_send_delay > 0:
+                    await asyncio.sleep(spin_send_delay)
+                if not self.connected:
+                    logger.warning(f"[{self.user_id_for_logging}] [{matcher.sent + 1}/{spins}] WebSocket disconnected before sending spin command. Aborting.")
+                    sending = False
+                    break
+                try:
+                    await self.send(spin_command)
+                except Exception as send_err:
+                    logger.error(f"[{self.user_id_for_logging}] ❌ Error sending spin command {matcher.sent + 1}: {send_err}. Aborting further spins.", exc_info=True)
+                    sending = False
+                    break
+                sent_at = loop.time()
+                matcher.add(sent_at, pacer.timeout() if pacer else receive_timeout_per_spin)
+                if pacer: next_send_at = sent_at + pacer.interval()
+
+            now = loop.time()
+            for expired_spin, expired_sent_at, expired_deadline in matcher.expire(now):
+                stats["timed_out"] += 1
+                logger.warning(f"[{self.user_id_for_logging}] ⏰ [{expired_spin}/{spins}] Timeout ({expired_deadline - expired_sent_at:.2f}s) reached waiting for reward message for spin {expired_spin}.")
+                if pacer: pacer.on_loss("reply timeout", now)
+                if on_progress: on_progress()
+            if matcher.needs_barrier() and self.connected:
+                try:
+                    await self.send(build_keepalive_command(self.world)) # Its answer tells late replies from lost ones
+                except Exception as send_err:
+                    logger.error(f"[{self.user_id_for_logging}] ❌ Connection lost sending the keepalive with {len(pending)} spin(s) in flight: {send_err}. Aborting.")
+                    stats["disconnected"] += len(pending)
+                    pending.clear()
+                    if pacer: pacer.on_loss("disconnect", loop.time())
+                    if self.endpoint: self.endpoint.on_failure("disconnect")
+                    break
+                matcher.add_barrier()
+            if not pending:
+                continue
+
+            receive_timeout = pending[0][2] - now
+            if pacer and sending and matcher.sent < spins and len(pending) < pacer.window():
+                receive_timeout = max(0.001, min(receive_timeout, next_send_at - now))
+            try:
+                raw_msg = await self.recv(receive_timeout)
+            except asyncio.TimeoutError:
+                continue
+            except ConnectionResetError as conn_err:
+                logger.error(f"[{self.user_id_for_logging}] ❌ [{pending[0][0]}/{spins}] Connection closed with {len(pending)} spin(s) in flight: {conn_err}. Aborting.")
+                stats["disconnected"] += len(pending)
+                pending.clear()
+                if pacer: pacer.on_loss("disconnect", loop.time())
+                if self.endpoint: self.endpoint.on_failure("disconnect")
                 break
-            
-            time.sleep(spin_send_delay)
-            spin_command = f"%xt%{GGE_GAME_WORLD}%lws%1%{{\"LWET\":1}}%" # LWET:1 seems to be the spin type
-            
+            handle_frame(raw_msg)
+
+        # Settle spins that timed out at the end, so their late replies are neither lost nor left for the next job on a reused session
+        drain_deadline = loop.time() + (pacer.timeout() if pacer else receive_timeout_per_spin)
+        while matcher.barriers and self.connected and (remaining := drain_deadline - loop.time()) > 0:
             try:
-                ws.send(spin_command)
-                # logger.debug(f"[{user_id_for_logging}] [{current_spin}/{spins}] Sent spin command.")
-            except Exception as send_err:
-                logger.error(f"[{user_id_for_logging}] ❌ Error sending spin command {current_spin} for {username}: {send_err}. Aborting further spins.", exc_info=True)
+                handle_frame(await self.recv(remaining))
+            except (asyncio.TimeoutError, ConnectionResetError):
                 break
 
-            spin_reward_found = False
-            search_start_time = time.time()
-            
-            while time.time() - search_start_time < receive_timeout_per_spin:
-                if not ws.connected:
-                    logger.warning(f"[{user_id_for_logging}] [{current_spin}/{spins}] WebSocket disconnected while waiting for reward. Aborting.")
-                    break # Break from inner while
-                
+    async def close(self):
+        if self.ws is not None and not self.ws.closed:
+            try: await self.ws.close()
+            except Exception as e_close: logger.error(f"[{self.user_id_for_logging}] Error closing WebSocket: {e_close}")
+        if self.recorder: self.recorder.close()
+        if self._owns_http_session and self._http_session is not None:
+            await self._http_session.close()
+            self._http_session = None
+
+
+gge_capture_writer = gge_capture.CaptureWriter(GGE_CAPTURE_FILE) if GGE_CAPTURE_FILE else None
+
+
+async def gge_login_async(username: str, password: str, rct_token: str, user_id_for_logging: str = "User", login_info: Optional[Dict] = None, endpoint: Optional[GGEEndpoint] = None) -> Optional[GGEAsyncSession]:
+    """Logs in over a new GGEAsyncSession. Returns the logged-in session or None."""
+    session = GGEAsyncSession(user_id_for_logging, endpoint=endpoint)
+    try:
+        logger.info(f"[{user_id_for_logging}] (AsyncSession) GGE Login for '{username}'...")
+        await session.connect()
+        if await session.login(username, password, rct_token, login_info):
+            return session
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e_ws:
+        logger.error(f"[{user_id_for_logging}] (AsyncSession) WebSocket GGE Login Error: {e_ws}", exc_info=True)
+    await session.close()
+    return None
+
+
+async def obtain_recaptcha_token_async(user_id_for_logging: str = "User", browser_session=None, cancel: Optional[CancelToken] = None, demand: Optional[TokenDemand] = None) -> Tuple[Optional[str], Optional[MintedToken]]:
+    """Runs obtain_recaptcha_token in a worker thread, inside `browser_session()` if given.
+
+    Without the token cache, the process pool (if enabled) is awaited directly instead.
+    If the caller is cancelled, a still-running worker thread is tracked by `cancel` (see run_cancellable_in_thread).
+    """
+    if recaptcha_process_pool is not None and recaptcha_token_cache is None:
+        async with (browser_session() if browser_session is not None else contextlib.nullcontext()):
+            return await recaptcha_process_pool.get_token(user_id_for_logging), None
+    if browser_session is None:
+        return await run_cancellable_in_thread(cancel, obtain_recaptcha_token, user_id_for_logging, cancel, demand)
+    async with browser_session():
+        return await run_cancellable_in_thread(cancel, obtain_recaptcha_token, user_id_for_logging, cancel, demand)
+
+
+async def gge_login_overlapped(username: str, password: str, user_id_for_logging: str = "User", browser_session=None, login_info: Optional[Dict] = None, cancel: Optional[CancelToken] = None, route: Optional[EndpointLease] = None, token_demand: Optional[TokenDemand] = None) -> Tuple[Optional[GGEAsyncSession], Optional[str], Optional[MintedToken]]:
+    """Obtains the reCAPTCHA token while connecting and sending verChk/login/vln, then sends lli right away.
+
+    Returns (logged-in session or None, token, cached token). Raises ConnectionError when no token
+    could be obtained; the connection is then dropped. If connecting or the pre-login sequence fails,
+    or the held socket was dropped while waiting for the token, the token is still awaited (its worker
+    thread keeps running either way) and the login falls back to a fresh connection with it, on another
+    endpoint of the world if `route` can be moved to one.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    session = GGEAsyncSession(user_id_for_logging, endpoint=route.endpoint if route else None)
+
+    async def prepare():
+        await session.connect()
+        await session.send_pre_login(username)
+
+    async def token():
+        with metrics.span("recaptcha_token"):
+            token_started = time.monotonic()
+            result = await obtain_recaptcha_token_async(user_id_for_logging, browser_session, cancel, token_demand)
+            if result[0]: startup_timer.note_token(time.monotonic() - token_started)
+            return result
+
+    logger.info(f"[{user_id_for_logging}] (AsyncSession) GGE Login for '{username}': connecting while the reCAPTCHA token is obtained...")
+    prepare_task = asyncio.create_task(prepare())
+    token_task = asyncio.create_task(token())
+    pending = {prepare_task, token_task}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if token_task in done and (token_task.exception() is not None or not token_task.result()[0]):
+                break # No point holding the connection without a token
+    except asyncio.CancelledError:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await session.close()
+        raise
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    if token_task.exception() is not None:
+        await session.close()
+        raise token_task.exception()
+    rct_token, cached_token = token_task.result()
+    if not rct_token:
+        await session.close()
+        raise ConnectionError("Failed to obtain reCAPTCHA token. Check bot logs and Selenium/ChromeDriver setup.")
+
+    if prepare_task.exception() is not None or not session.connected:
+        logger.warning(f"[{user_id_for_logging}] (AsyncSession) Pre-handshaken connection unavailable ({prepare_task.exception()}). Logging in on a fresh connection.")
+        if route and session.ws is not None:
+            route.endpoint.on_failure("pre-login connection dropped") # Failed connects were already reported by connect()
+        await session.close()
+        if route: route.reroute()
+        fresh = await gge_login_async(username, password, rct_token, user_id_for_logging, login_info, route.endpoint if route else None)
+        if fresh: metrics.observe("login_wall", loop.time() - started)
+        return fresh, rct_token, cached_token
+    if await session.confirm_login(username, password, rct_token, login_info):
+        metrics.observe("login_wall", loop.time() - started)
+        return session, rct_token, cached_token
+    await session.close()
+    return None, rct_token, cached_token
+
+
+# --- GGE Session Cache ---
+class CachedSession:
+    """A logged-in GGEAsyncSession parked between /spin jobs of the same account."""
+    __slots__ = ("session", "password_digest", "parked_at", "task")
+
+    def __init__(self, session: GGEAsyncSession, password_digest: bytes, parked_at: float):
+        self.session = session
+        self.password_digest = password_digest
+        self.parked_at = parked_at
+        self.task: Optional[asyncio.Task] = None
+
+
+class GGESessionCache:
+    """Keeps authenticated game sockets alive between /spin jobs, keyed by game world and username.
+
+    A parked session is pinged every `keepalive_interval` seconds and closed after `idle_seconds`.
+    checkout() only hands a session back if the password matches the one it was logged in with
+    (compared as a salted digest; nothing is written to disk) and a pin round trip succeeds.
+    At most `max_size` sessions are parked; the least recently parked one is closed first.
+    """
+    def __init__(self, max_size: int, idle_seconds: float = 300.0, keepalive_interval: float = 30.0, probe_timeout: float = 5.0):
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self.keepalive_interval = keepalive_interval
+        self.probe_timeout = probe_timeout
+        self._salt = os.urandom(16)
+        self.entries: "OrderedDict[Tuple[str, str], CachedSession]" = OrderedDict() # (world, username) -> parked session
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.login_seconds_saved = 0.0
+
+    def _digest(self, password: str) -> bytes:
+        return hashlib.sha256(self._salt + password.encode("utf-8")).digest()
+
+    async def checkout(self, username: str, password: str, world: str = GGE_GAME_WORLD) -> Optional[GGEAsyncSession]:
+        """Returns a live, logged-in session for `username` on `world` (removing it from the cache) or None."""
+        entry = self.entries.pop((world, username), None)
+        if entry is None:
+            self.misses += 1
+            return None
+        await self._stop_keepalive(entry)
+        if not hmac.compare_digest(entry.password_digest, self._digest(password)):
+            logger.info(f"[SessionCache] Password for '{username}' differs from the cached session's. Logging in again.")
+        elif await self._probe(entry.session):
+            self.hits += 1
+            self.login_seconds_saved += entry.session.login_seconds
+            logger.info(f"[SessionCache] ♻️ Reusing logged-in session for '{username}' (saves ~{entry.session.login_seconds:.1f}s). {self.stats_summary()}")
+            return entry.session
+        else:
+            logger.info(f"[SessionCache] Cached session for '{username}' failed its liveness check. Logging in again.")
+        self.misses += 1
+        await entry.session.close()
+        return None
+
+    async def checkin(self, username: str, password: str, session: GGEAsyncSession) -> bool:
+        """Parks a logged-in session. Returns False (caller closes it) if it is not connected."""
+        if not session.connected:
+            return False
+        key = (session.world, username)
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            await self._drop(previous)
+        entry = CachedSession(session, self._digest(password), asyncio.get_running_loop().time())
+        self.entries[key] = entry
+        entry.task = asyncio.create_task(self._keep_alive(key, entry))
+        while len(self.entries) > self.max_size:
+            (_, evicted_username), evicted = self.entries.popitem(last=False)
+            self.evictions += 1
+            logger.info(f"[SessionCache] Evicting least recently used session for '{evicted_username}'.")
+            await self._drop(evicted)
+        logger.info(f"[SessionCache] Parked logged-in session for '{username}' for up to {self.idle_seconds:.0f}s.")
+        return True
+
+    async def _probe(self, session: GGEAsyncSession) -> bool:
+        """Sends a pin and waits for the server's answer: the socket is open and the login still valid."""
+        if not session.connected:
+            return False
+        loop = asyncio.get_running_loop()
+        try:
+            await session.send(build_keepalive_command(session.world))
+            deadline = loop.time() + self.probe_timeout
+            while (remaining := deadline - loop.time()) > 0:
+                command, status = session.classifier.classify(await session.recv(remaining))
+                if command == b"pin":
+                    return status == 0
+        except (asyncio.TimeoutError, ConnectionResetError, aiohttp.ClientError, RuntimeError):
+            pass
+        return False
+
+    async def _keep_alive(self, key: Tuple[str, str], entry: CachedSession):
+        loop = asyncio.get_running_loop()
+        username = key[1]
+        session = entry.session
+        expires_at = entry.parked_at + self.idle_seconds
+        next_ping = loop.time() + self.keepalive_interval
+        try:
+            while (now := loop.time()) < expires_at:
+                if now >= next_ping:
+                    await session.send(build_keepalive_command(session.world))
+                    next_ping = now + self.keepalive_interval
                 try:
-                    # Dynamic timeout for recv
-                    remaining_time = max(0.1, receive_timeout_per_spin - (time.time() - search_start_time))
-                    ws.settimeout(remaining_time)
-                    msg_bytes = ws.recv()
-                    msg = msg_bytes.decode("utf-8", errors="ignore")
-                    
-                    # Check for the specific reward message structure
-                    if msg.startswith(f"%xt%{GGE_GAME_WORLD}%lws%1%0%") or msg.startswith("%xt%lws%1%0%"): # Handle potential world prefix in lws response
-                        logger.info(f"[{user_id_for_logging}] 🎯 [{current_spin}/{spins}] Matched reward message: {msg[:100]}...")
-                        parse_reward_message(msg, rewards)
-                        spin_reward_found = True
-                        break # Break from inner while, proceed to next spin
-                    # else:
-                        # logger.debug(f"[{user_id_for_logging}] [{current_spin}/{spins}] Received non-reward msg: {msg[:60]}")
-                        
-                except websocket.WebSocketTimeoutException:
-                    # This timeout is per recv attempt within the larger spin_reward_found loop
-                    if not (time.time() - search_start_time < receive_timeout_per_spin): # Check if overall spin timeout is also exceeded
-                        logger.warning(f"[{user_id_for_logging}] ⏰ [{current_spin}/{spins}] Timeout ({receive_timeout_per_spin}s) reached waiting for reward message for spin {current_spin}.")
-                    break # Break from inner while (recv loop)
-                except (websocket.WebSocketConnectionClosedException, BrokenPipeError) as conn_err:
-                    logger.error(f"[{user_id_for_logging}] ❌ [{current_spin}/{spins}] Connection closed during spin {current_spin}: {conn_err}. Aborting.", exc_info=True)
-                    raise conn_err # Re-raise to be caught by outer try-except
-                except Exception as recv_err:
-                    logger.warning(f"[{user_id_for_logging}] ⚠️ [{current_spin}/{spins}] Error receiving/processing message for spin {current_spin}: {recv_err}", exc_info=True)
-                    break # Break from inner while
-            
-            if not ws.connected: # Check again if disconnected during the receive loop
-                break # Break from outer for loop (spins)
-
-            if not spin_reward_found:
-                logger.warning(f"[{user_id_for_logging}] 🤷 [{current_spin}/{spins}] No specific reward message found for spin {current_spin} within {receive_timeout_per_spin}s timeout.")
-        
+                    session.classifier.classify(await session.recv(min(next_ping, expires_at) - now))
+                except asyncio.TimeoutError:
+                    pass
+            self.expired += 1
+            logger.info(f"[SessionCache] Session for '{username}' idle for {self.idle_seconds:.0f}s. Closing.")
+        except (ConnectionResetError, aiohttp.ClientError, RuntimeError) as e:
+            logger.info(f"[SessionCache] Parked session for '{username}' was dropped: {e}")
+        if self.entries.get(key) is entry:
+            del self.entries[key]
+        await session.close()
+
+    async def _stop_keepalive(self, entry: CachedSession):
+        if entry.task is not None and not entry.task.done():
+            entry.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await entry.task
+
+    async def _drop(self, entry: CachedSession):
+        await self._stop_keepalive(entry)
+        await entry.session.close()
+
+    async def close_all(self):
+        while self.entries:
+            _, entry = self.entries.popitem()
+            await self._drop(entry)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"parked": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0, "evictions": self.evictions,
+                "expired": self.expired, "login_seconds_saved": self.login_seconds_saved}
+
+    def stats_summary(self) -> str:
+        stats = self.stats()
+        return (f"Session cache: {stats['parked']} parked, hit rate {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']}), "
+                f"{stats['evictions']} evicted, {stats['expired']} expired, {stats['login_seconds_saved']:.1f}s of login saved")
+
+
+gge_session_cache = GGESessionCache(GGE_SESSION_CACHE_SIZE, GGE_SESSION_IDLE_SECONDS, GGE_SESSION_KEEPALIVE_SECONDS) if GGE_SESSION_CACHE_SIZE > 0 else None
+
+
+async def spin_lucky_wheel_async(username, password, spins, user_id_for_logging="User", pipeline_window: Optional[int] = None, stats: Optional[Dict[str, int]] = None, browser_session=None, progress=None, adaptive_pacing: Optional[bool] = None, outcomes: Optional[SpinOutcomeLog] = None, cancel: Optional[CancelToken] = None, route: Optional[EndpointLease] = None, token_demand: Optional[TokenDemand] = None):
+    """Obtains a reCAPTCHA token, logs in, performs the spins and returns the collected rewards.
+
+    pipeline_window > 1 keeps that many spin commands in flight (defaults to SPIN_PIPELINE_WINDOW).
+    If `stats` is given it is filled with the per-spin accounting (found / timed_out / errors / disconnected / cancelled).
+    Raises ConnectionError when no token could be obtained or the login failed.
+    Only the reCAPTCHA step runs in a worker thread, since Selenium is blocking; the
+    WebSocket connect and pre-login messages overlap with it (gge_login_overlapped).
+    `browser_session` is an optional async context manager factory held around that step
+    (SpinScheduler.browser_session caps concurrent browsers). `progress` is an optional SpinProgressPublisher.
+    With adaptive pacing (defaults to SPIN_ADAPTIVE_PACING) a SpinPacer drives the spin loop.
+    `outcomes` is an optional SpinOutcomeLog that every answered spin is recorded into.
+    Cancelling the running task after `cancel.cancel()` stops the job at its current await and
+    returns the rewards collected so far; spins never resolved are counted in stats["cancelled"].
+    `route` is the job's EndpointLease (server and world); without it GGE_WEBSOCKET_URL / GGE_GAME_WORLD are used.
+    `token_demand` is the job's claim on a prefetched token; the token step uses it up, otherwise it is released on return.
+    """
+    rewards = RewardCounter()
+    spin_stats = stats if stats is not None else {}
+    spin_stats.update(found=0, timed_out=0, errors=0, disconnected=0, cancelled=0)
+    session = None
+    receive_timeout_per_spin = 15.0
+    spin_send_delay = 0.3
+    window = SPIN_PIPELINE_WINDOW if pipeline_window is None else max(1, pipeline_window)
+    pacer = None
+    if SPIN_ADAPTIVE_PACING if adaptive_pacing is None else adaptive_pacing:
+        pacer = SpinPacer(initial_rate=1 / spin_send_delay, max_rate=SPIN_PACING_MAX_RATE, max_timeout=receive_timeout_per_spin,
+                          max_window=SPIN_PACING_MAX_WINDOW, label=user_id_for_logging)
+        active_pacers.add(pacer)
+
+    logger.info(f"[{user_id_for_logging}] Starting spin_lucky_wheel_async for {username} with {spins} spins{f' on {route.endpoint.label}' if route else ''}.")
+    try:
+        if gge_session_cache is not None:
+            session = await gge_session_cache.checkout(username, password, route.endpoint.world if route else GGE_GAME_WORLD)
+            if session is not None and route is not None and session.endpoint is not None:
+                route.router.move(route, session.endpoint) # The parked connection may be on another endpoint of the world
+            if session is not None and token_demand is not None:
+                token_demand.release() # No token needed; stop the producer minting one for this job
+        if session is None:
+            login_started = time.monotonic()
+            logger.info(f"[{user_id_for_logging}] Obtaining reCAPTCHA token and connecting to GGE for {username}...")
+            login_info = {}
+            try:
+                session, rct_token, cached_token = await gge_login_overlapped(username, password, user_id_for_logging, browser_session, login_info, cancel, route, token_demand)
+            except ConnectionError:
+                logger.error(f"[{user_id_for_logging}] Failed to obtain reCAPTCHA token for {username}. Aborting spins.")
+                raise
+            if not session and cached_token and "rejected_status" in login_info:
+                recaptcha_token_cache.discard(cached_token)
+                rct_token, cached_token = await obtain_recaptcha_token_async(user_id_for_logging, browser_session, cancel)
+                if rct_token:
+                    logger.info(f"[{user_id_for_logging}] Retrying GGE login for {username} with the next reCAPTCHA token...")
+                    session = await gge_login_async(username, password, rct_token, user_id_for_logging, endpoint=route.endpoint if route else None)
+            if cancel: cancel.raise_if_cancelled()
+            if not session or not session.connected:
+                logger.error(f"[{user_id_for_logging}] GGE login failed for {username} after obtaining reCAPTCHA token. Aborting spins.")
+                raise ConnectionError("GGE login failed. Check credentials or game server status. Token might have expired or been invalid.")
+            session.login_seconds = time.monotonic() - login_started
+
+        logger.info(f"[{user_id_for_logging}] ✅ GGE Login successful for {username}. Proceeding with spins.")
+        logger.info(f"[{user_id_for_logging}] 🚀 Starting {spins} lucky wheel spins for {username}{' (adaptive pacing)' if pacer else f' (pipelined, {window} in flight)' if window > 1 else ''}...")
+        on_progress = progress.attach(rewards, spin_stats) if progress else None
+        await session.spin(spins, rewards, spin_stats, window, spin_send_delay, receive_timeout_per_spin, on_progress, pacer=pacer, outcomes=outcomes)
         logger.info(f"[{user_id_for_logging}] ✅ All {spins} requested spins attempted for {username}.")
 
-    except ConnectionError as e: # Custom error from RCT/login phases
+    except (asyncio.CancelledError, JobCancelled):
+        if not (cancel and cancel.cancelled):
+            raise # Shutdown or a caller's own cancellation
+        current = asyncio.current_task()
+        if current is not None and hasattr(current, "uncancel"): current.uncancel()
+        spin_stats["cancelled"] = spins - sum(spin_stats[result] for result in ("found", "timed_out", "errors", "disconnected"))
+        logger.info(f"[{user_id_for_logging}] 🛑 Spin job for {username} cancelled; {spin_stats['cancelled']} spin(s) not resolved.")
+    except ConnectionError as e:
         logger.error(f"[{user_id_for_logging}] Connection or Login Error for {username}: {e}", exc_info=True)
-        raise # Re-raise to be handled by the modal's on_submit
-    except (websocket.WebSocketConnectionClosedException, BrokenPipeError) as e:
-        logger.error(f"[{user_id_for_logging}] WebSocket Connection Closed Unexpectedly for {username}: {e}", exc_info=True)
-        # Don't re-raise as a generic Exception, let the caller handle it if needed or finish
+        raise
     except Exception as e:
-        logger.error(f"[{user_id_for_logging}] ❌ Major error in spin_lucky_wheel for {username}: {e}", exc_info=True)
-        raise # Re-raise to be handled by the modal's on_submit
+        logger.error(f"[{user_id_for_logging}] ❌ Major error in spin_lucky_wheel_async for {username}: {e}", exc_info=True)
+        raise
     finally:
-        if ws and ws.connected:
-            logger.info(f"[{user_id_for_logging}] 🔌 Closing WebSocket connection for {username}.")
-            try: ws.close()
-            except Exception as e_close: logger.error(f"[{user_id_for_logging}] Error closing WebSocket: {e_close}")
-        logger.info(f"[{user_id_for_logging}] Collected rewards for {username}: {dict(rewards)}")
-    return dict(rewards)
+        if token_demand is not None:
+            token_demand.release()
+        if session:
+            if gge_session_cache is not None and not (cancel and cancel.cancelled) and await gge_session_cache.checkin(username, password, session):
+                logger.info(f"[{user_id_for_logging}] 🅿️ Keeping the logged-in WebSocket for {username} for follow-up jobs.")
+            else:
+                logger.info(f"[{user_id_for_logging}] 🔌 Closing WebSocket connection for {username}.")
+                await session.close()
+        for result in ("found", "timed_out", "errors", "disconnected", "cancelled"):
+            if spin_stats[result]: metrics.inc("spinbot_spins_total", "result", result, spin_stats[result])
+        logger.info(f"[{user_id_for_logging}] Collected rewards for {username}: {rewards.to_dict()} (spins found: {spin_stats['found']}, timed out: {spin_stats['timed_out']}, errors: {spin_stats['errors']}, disconnected: {spin_stats['disconnected']}, cancelled: {spin_stats['cancelled']})")
+        if pacer:
+            active_pacers.discard(pacer)
+            logger.info(f"[{user_id_for_logging}] Final pacing for {username}: {pacer.rate:.2f} spins/s, timeout {pacer.timeout():.2f}s, {pacer.decreases} rate decrease(s).")
+        if session:
+            logger.info(f"[{user_id_for_logging}] Frames received by command: {session.classifier.frame_counts()}")
+    return rewards.to_dict()
+
+
+# --- Reward Ledger ---
+LEDGER_ALL_TIME = "*" # Day key of the all-time rollup rows
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    discord_user_id INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    spins INTEGER NOT NULL,
+    found INTEGER NOT NULL,
+    timed_out INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    disconnected INTEGER NOT NULL,
+    finished_at REAL NOT NULL,
+    cancelled INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS job_rewards (
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    reward TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (job_id, reward)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS job_outcome_stats (
+    job_id INTEGER PRIMARY KEY REFERENCES jobs(id),
+    stats TEXT NOT NULL    -- JSON from SpinOutcomeLog.summarize()
+);
+CREATE TABLE IF NOT EXISTS reward_rollups (
+    scope TEXT NOT NULL,   -- 'user', 'account' or 'user_account'
+    key TEXT NOT NULL,     -- Discord user id, lower-cased game username, or '<user id>:<username>'
+    day TEXT NOT NULL,     -- YYYY-MM-DD (UTC) or '*' for all time
+    reward TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (scope, key, day, reward)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS job_rollups (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    jobs INTEGER NOT NULL,
+    spins INTEGER NOT NULL,
+    found INTEGER NOT NULL,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, key, day)
+) WITHOUT ROWID;
+"""
+LEDGER_ADDED_COLUMNS = (("jobs", "cancelled INTEGER NOT NULL DEFAULT 0"), ("job_rollups", "cancelled INTEGER NOT NULL DEFAULT 0")) # Added to ledgers created before they existed
+
+
+class LedgerEntry:
+    """One finished job as handed to SpinLedger.record_job."""
+    __slots__ = ("discord_user_id", "account", "spins", "stats", "rewards", "finished_at", "outcome_stats", "cancelled")
+
+    def __init__(self, discord_user_id: int, account: str, spins: int, stats: Dict[str, int], rewards: Dict[str, int], finished_at: float, outcome_stats: Optional[dict] = None, cancelled: bool = False):
+        self.discord_user_id = discord_user_id
+        self.account = account
+        self.spins = spins
+        self.stats = stats
+        self.rewards = rewards
+        self.finished_at = finished_at
+        self.outcome_stats = outcome_stats
+        self.cancelled = cancelled
+
+
+class SpinLedger:
+    """SQLite (WAL) ledger of finished jobs with incrementally maintained rollups.
+
+    record_job() only enqueues; a single writer thread appends queued jobs and updates the
+    per-user, per-account and per-user-and-account rollups (per UTC day and all time) in one
+    transaction per batch.
+    Reads use their own connection and only touch rollup rows by primary key, so their cost
+    does not grow with the history.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.Queue[Optional[LedgerEntry]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._read_lock = threading.Lock()
+        self._read_conn: Optional[sqlite3.Connection] = None
+        self.jobs_written = 0
+        self.batches_written = 0
+        self.write_errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        if self._thread is not None:
+            return
+        conn = self._connect()
+        conn.executescript(LEDGER_SCHEMA)
+        for table, column in LEDGER_ADDED_COLUMNS:
+            if column.split()[0] not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        conn.commit()
+        conn.close()
+        self._thread = threading.Thread(target=self._run, name="spin-ledger", daemon=True)
+        self._thread.start()
+        logger.info(f"📒 Reward ledger open at {self.path}.")
+
+    def record_job(self, entry: LedgerEntry):
+        """Queues a finished job for the writer thread; never blocks the caller."""
+        if self._thread is not None:
+            self._queue.put(entry)
+
+    def _run(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while True:
+                try: batch.append(self._queue.get_nowait())
+                except queue.Empty: break
+            if None in batch:
+                stopping = True
+                batch = [entry for entry in batch if entry is not None]
+            if not batch:
+                continue
+            try:
+                with conn:
+                    for entry in batch:
+                        self._write(conn, entry)
+                self.jobs_written += len(batch)
+                self.batches_written += 1
+            except sqlite3.Error as e:
+                self.write_errors += 1
+                logger.error(f"❌ Could not write {len(batch)} job(s) to the reward ledger: {e}", exc_info=True)
+        conn.close()
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, entry: LedgerEntry):
+        job_id = conn.execute(
+            "INSERT INTO jobs (discord_user_id, account, spins, found, timed_out, errors, disconnected, finished_at, cancelled) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (entry.discord_user_id, entry.account, entry.spins, entry.stats.get("found", 0), entry.stats.get("timed_out", 0),
+             entry.stats.get("errors", 0), entry.stats.get("disconnected", 0), entry.finished_at, int(entry.cancelled)),
+        ).lastrowid
+        rewards = [(name, amount) for name, amount in entry.rewards.items() if amount]
+        conn.executemany("INSERT INTO job_rewards (job_id, reward, amount) VALUES (?, ?, ?)", [(job_id, name, amount) for name, amount in rewards])
+        if entry.outcome_stats:
+            conn.execute("INSERT INTO job_outcome_stats (job_id, stats) VALUES (?, ?)", (job_id, json.dumps(entry.outcome_stats, separators=(",", ":"))))
+
+        day = time.strftime("%Y-%m-%d", time.gmtime(entry.finished_at))
+        scopes = (("user", str(entry.discord_user_id)), ("account", entry.account.lower()), ("user_account", f"{entry.discord_user_id}:{entry.account.lower()}"))
+        keys = [(scope, key, d) for scope, key in scopes for d in (day, LEDGER_ALL_TIME)]
+        conn.executemany(
+            "INSERT INTO reward_rollups (scope, key, day, reward, amount) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (scope, key, day, reward) DO UPDATE SET amount = amount + excluded.amount",
+            [(scope, key, d, name, amount) for scope, key, d in keys for name, amount in rewards],
+        )
+        conn.executemany(
+            "INSERT INTO job_rollups (scope, key, day, jobs, spins, found, cancelled) VALUES (?, ?, ?, 1, ?, ?, ?) "
+            "ON CONFLICT (scope, key, day) DO UPDATE SET jobs = jobs + 1, spins = spins + excluded.spins, found = found + excluded.found, cancelled = cancelled + excluded.cancelled",
+            [(scope, key, d, entry.spins, entry.stats.get("found", 0), int(entry.cancelled)) for scope, key, d in keys],
+        )
+
+    def rollup(self, scope: str, key: str, day: str = LEDGER_ALL_TIME) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Returns ({jobs, spins, found, cancelled}, {reward: amount}) for one rollup row set. Blocking; use a thread."""
+        with self._read_lock:
+            if self._read_conn is None:
+                self._read_conn = self._connect()
+            totals_row = self._read_conn.execute("SELECT jobs, spins, found, cancelled FROM job_rollups WHERE scope = ? AND key = ? AND day = ?", (scope, key, day)).fetchone()
+            reward_rows = self._read_conn.execute("SELECT reward, amount FROM reward_rollups WHERE scope = ? AND key = ? AND day = ?", (scope, key, day)).fetchall()
+        totals = dict(zip(("jobs", "spins", "found", "cancelled"), totals_row)) if totals_row else {"jobs": 0, "spins": 0, "found": 0, "cancelled": 0}
+        return totals, dict(reward_rows)
+
+    def stop(self, timeout: float = 10.0):
+        """Flushes queued jobs and stops the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+        with self._read_lock:
+            if self._read_conn is not None:
+                self._read_conn.close()
+                self._read_conn = None
+
+
+spin_ledger: Optional[SpinLedger] = SpinLedger(SPIN_LEDGER_PATH) if SPIN_LEDGER_PATH else None
+
+
+# --- Spin Job Scheduler ---
+def format_duration(seconds: float) -> str:
+    minutes, secs = divmod(int(round(seconds)), 60)
+    return f"{minutes}m {secs:02d}s" if minutes else f"{secs}s"
+
+
+class SpinJob:
+    """A submitted /spin job waiting for, or holding, a WebSocket session slot."""
+    def __init__(self, discord_user_id: int, username: str, spins: int, world: str = GGE_GAME_WORLD):
+        self.discord_user_id = discord_user_id
+        self.username = username
+        self.spins = spins
+        self.world = world
+        self.lease: Optional[EndpointLease] = None # Endpoint slot, taken on admission when the scheduler has a router
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.admitted: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.cancel_token = CancelToken()
+        self.task: Optional[asyncio.Task] = None # The spin work, once admitted
+        self.completed = False # Set by SpinScheduler.run once the work returned without being cancelled
+        self.token_demand: Optional[TokenDemand] = None # Claim on a prefetched token, released by finish() at the latest
+
+    @property
+    def account_key(self) -> Tuple[str, str]:
+        return self.world, self.username.lower()
+
+
+class SpinScheduler:
+    """Admission control between SpinModal.on_submit and the spin worker.
+
+    - At most `max_ws_sessions` jobs run at once (each holds one GGE WebSocket).
+    - At most `max_browser_sessions` of them run Chrome at the same time (`browser_session`).
+    - Jobs for the same game account (username on a world) never run concurrently.
+    - Queued jobs are admitted round-robin across Discord users, so one large job cannot starve many small ones.
+    - A cancelled job gives up its slot within `cancel_timeout` seconds, even if its task is slow to unwind.
+    - With a `router`, a job is only admitted once an endpoint of its world has room (job.lease);
+      jobs for other worlds or endpoints pass it in the queue.
+    """
+    def __init__(self, max_browser_sessions: int, max_ws_sessions: int, cancel_timeout: float = 10.0, router: Optional[GGERouter] = None):
+        self.max_browser_sessions = max_browser_sessions
+        self.max_ws_sessions = max_ws_sessions
+        self.cancel_timeout = cancel_timeout
+        self.router = router
+        self._retry_handle: Optional[asyncio.TimerHandle] = None
+        self._browser_slots = asyncio.Semaphore(max_browser_sessions)
+        self.browsers_in_use = 0
+        self._queues: Dict[int, deque] = {} # Discord user id -> queued jobs, FIFO per user
+        self._last_admitted: Dict[int, float] = {} # Discord user id -> when their last job was admitted
+        self._running: List[SpinJob] = []
+        self._active_accounts = set()
+        # Job duration model for ETAs, refined from finished jobs
+        self.avg_job_overhead = 20.0
+        self.avg_seconds_per_spin = 0.35
+
+    def submit(self, discord_user_id: int, username: str, spins: int, world: str = GGE_GAME_WORLD) -> SpinJob:
+        job = SpinJob(discord_user_id, username, spins, world)
+        self._queues.setdefault(discord_user_id, deque()).append(job)
+        self._dispatch()
+        return job
+
+    def _dispatch(self):
+        while len(self._running) < self.max_ws_sessions:
+            job = self._pop_next_job()
+            if job is None:
+                return
+            job.started_at = time.monotonic()
+            self._running.append(job)
+            self._active_accounts.add(job.account_key)
+            if not job.admitted.done():
+                job.admitted.set_result(True)
+        self._schedule_retry()
+
+    def _schedule_retry(self):
+        """Runs _dispatch again once the earliest endpoint backoff ends, while jobs are queued."""
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+        retry_at = self.router.retry_at() if self.router is not None and self._queues else None
+        if retry_at is not None:
+            self._retry_handle = asyncio.get_running_loop().call_later(retry_at - time.monotonic() + 0.01, self._dispatch)
+
+    def _users_by_turn(self) -> List[int]:
+        """Discord users with queued jobs, next turn first: fewest running jobs, then longest since last admitted."""
+        running_per_user = defaultdict(int)
+        for job in self._running:
+            running_per_user[job.discord_user_id] += 1
+        return sorted(self._queues, key=lambda user_id: (running_per_user[user_id], self._last_admitted.get(user_id, float("-inf"))))
+
+    def _pop_next_job(self) -> Optional[SpinJob]:
+        """Takes the next runnable job in round-robin user order, skipping accounts already in use and worlds without a free endpoint."""
+        full_worlds = set()
+        for user_id in self._users_by_turn():
+            user_queue = self._queues[user_id]
+            for job in user_queue:
+                if job.account_key not in self._active_accounts and job.world not in full_worlds:
+                    if self.router is not None:
+                        job.lease = self.router.try_lease(job.world)
+                        if job.lease is None:
+                            full_worlds.add(job.world)
+                            continue
+                    user_queue.remove(job)
+                    if not user_queue:
+                        del self._queues[user_id]
+                    self._last_admitted[user_id] = time.monotonic()
+                    return job
+        return None
+
+    def finish(self, job: SpinJob):
+        """Releases the job's slot (or drops it from the queue) and its token demand, and admits the next jobs."""
+        if job.lease is not None:
+            job.lease.release()
+        if job.token_demand is not None:
+            job.token_demand.release()
+        if job in self._running:
+            self._running.remove(job)
+            self._active_accounts.discard(job.account_key)
+            if job.completed: # Cancelled and failed jobs did not run all their spins
+                duration = time.monotonic() - job.started_at
+                # Exponential moving average of the per-spin cost once the fixed overhead is taken out
+                per_spin = max(0.0, duration - self.avg_job_overhead) / max(1, job.spins)
+                self.avg_seconds_per_spin = 0.8 * self.avg_seconds_per_spin + 0.2 * per_spin
+        else:
+            user_queue = self._queues.get(job.discord_user_id)
+            if user_queue and job in user_queue:
+                user_queue.remove(job)
+                if not user_queue:
+                    del self._queues[job.discord_user_id]
+        self._dispatch()
+
+    def _is_queued(self, job: SpinJob) -> bool:
+        user_queue = self._queues.get(job.discord_user_id)
+        return bool(user_queue) and job in user_queue
+
+    def cancel(self, job: SpinJob) -> bool:
+        """Cancels a queued or running job. False if it already finished or was cancelled.
+
+        A queued job leaves the queue at once (its wait_turn returns). A running job has its token
+        fired (killing its browser, waking blocked waits) and its task cancelled; if it still holds
+        the slot `cancel_timeout` seconds later, the slot is released anyway.
+        """
+        if job not in self._running and not self._is_queued(job):
+            return False
+        if not job.cancel_token.cancel():
+            return False
+        logger.info(f"🛑 Cancelling {job.spins} spin(s) for {job.username} (user {job.discord_user_id}).")
+        if job in self._running:
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+            asyncio.get_running_loop().call_later(self.cancel_timeout, self._release_overdue, job)
+        else:
+            if not job.admitted.done():
+                job.admitted.set_result(False)
+            self.finish(job)
+        return True
+
+    def _release_overdue(self, job: SpinJob):
+        if job in self._running:
+            logger.warning(f"⚠️ Cancelled job for {job.username} still held its slot after {self.cancel_timeout:.0f}s; releasing it.")
+            metrics.inc("spinbot_cancel_overruns_total", "stage", "slot")
+            self.finish(job)
+
+    async def run(self, job: SpinJob, work) -> Dict[str, int]:
+        """Awaits the coroutine `work` as job.task, so cancel() can interrupt it; returns its rewards."""
+        job.task = asyncio.create_task(work)
+        try:
+            rewards = await job.task
+        except asyncio.CancelledError:
+            if job.task.cancelled() and job.cancel_token.cancelled:
+                return {} # Cancelled before its first step
+            raise
+        job.completed = not job.cancel_token.cancelled
+        return rewards
+
+    async def reclaim(self, job: SpinJob) -> Tuple[float, bool]:
+        """For a cancelled job whose task returned: waits for leftover worker threads; returns (seconds since cancel, all freed in time)."""
+        seconds, reclaimed = await job.cancel_token.reclaim(self.cancel_timeout)
+        metrics.observe("cancel_reclaim", seconds)
+        if reclaimed:
+            logger.info(f"🛑 Cancelled job for {job.username} released its resources {seconds:.2f}s after the cancel.")
+        else:
+            metrics.inc("spinbot_cancel_overruns_total", "stage", "worker")
+            logger.warning(f"⚠️ Cancelled job for {job.username} still had work running {seconds:.2f}s after the cancel.")
+        return seconds, reclaimed
+
+    def jobs_of(self, discord_user_id: int) -> List[SpinJob]:
+        """Running and queued jobs of one Discord user that were not cancelled yet."""
+        jobs = [job for job in self._running if job.discord_user_id == discord_user_id]
+        jobs += list(self._queues.get(discord_user_id, ()))
+        return [job for job in jobs if not job.cancel_token.cancelled]
+
+    @contextlib.asynccontextmanager
+    async def browser_session(self):
+        """Holds one of the global browser slots for the reCAPTCHA step of a running job."""
+        async with self._browser_slots:
+            self.browsers_in_use += 1
+            try:
+                yield
+            finally:
+                self.browsers_in_use -= 1
+
+    def estimated_duration(self, job: SpinJob) -> float:
+        return self.avg_job_overhead + job.spins * self.avg_seconds_per_spin
+
+    def queued_jobs(self) -> List[SpinJob]:
+        """Queued jobs in the order round-robin dispatch would admit them (ignoring account locks)."""
+        queues = [list(self._queues[user_id]) for user_id in self._users_by_turn()]
+        ordered = []
+        depth = 0
+        while any(depth < len(q) for q in queues):
+            ordered.extend(q[depth] for q in queues if depth < len(q))
+            depth += 1
+        return ordered
+
+    def queue_estimates(self) -> List[Tuple[SpinJob, float]]:
+        """(job, estimated seconds until start) for every queued job, by list-scheduling onto the WebSocket slots."""
+        now = time.monotonic()
+        slot_free_at = sorted(max(0.0, self.estimated_duration(job) - (now - job.started_at)) for job in self._running)
+        slot_free_at += [0.0] * (self.max_ws_sessions - len(slot_free_at))
+        estimates = []
+        for job in self.queued_jobs():
+            start = slot_free_at.pop(0)
+            estimates.append((job, start))
+            bisect.insort(slot_free_at, start + self.estimated_duration(job))
+        return estimates
+
+    def position(self, job: SpinJob) -> Tuple[int, float]:
+        """1-based queue position and estimated seconds until start; (0, 0.0) once admitted."""
+        for index, (queued_job, eta) in enumerate(self.queue_estimates()):
+            if queued_job is job:
+                return index + 1, eta
+        return 0, 0.0
+
+    async def wait_turn(self, job: SpinJob, on_queued=None, update_interval: float = 10.0):
+        """Waits until the job is admitted. `on_queued(position, eta_seconds)` is awaited whenever the position changes."""
+        last_position = None
+        while not job.admitted.done():
+            position, eta = self.position(job)
+            if on_queued and position != last_position:
+                last_position = position
+                try: await on_queued(position, eta)
+                except Exception as e_update: logger.warning(f"Failed to publish queue position: {e_update}")
+            try:
+                await asyncio.wait_for(asyncio.shield(job.admitted), timeout=update_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def load(self) -> Dict[str, int]:
+        return {
+            "running": len(self._running), "max_ws_sessions": self.max_ws_sessions,
+            "browsers_in_use": self.browsers_in_use, "max_browser_sessions": self.max_browser_sessions,
+            "queued": sum(len(q) for q in self._queues.values()), "queued_users": len(self._queues),
+        }
+
+
+spin_scheduler = SpinScheduler(SPIN_MAX_BROWSER_SESSIONS, SPIN_MAX_WS_SESSIONS, SPIN_CANCEL_TIMEOUT, gge_router)
+metrics.register_gauge("spinbot_running_jobs", "Jobs holding a WebSocket session slot.", lambda: spin_scheduler.load()["running"])
+metrics.register_gauge("spinbot_queued_jobs", "Jobs waiting for a session slot.", lambda: spin_scheduler.load()["queued"])
+metrics.register_gauge("spinbot_browsers_in_use", "Jobs currently driving Chrome.", lambda: spin_scheduler.load()["browsers_in_use"])
+
+
+# --- Live Progress ---
+class SpinProgressPublisher:
+    """Streams spin progress (spins done, rewards so far, spins/sec, ETA) into the /spin status message.
+
+    The spin loop only calls the cheap notify() returned by attach(), from the event loop or a
+    worker thread. A background task renders the latest state at most once every `min_interval`
+    seconds; intermediate states are skipped, so edits never queue up or arrive stale.
+    """
+    def __init__(self, status_message: discord.Message, username: str, spins: int, min_interval: float = SPIN_PROGRESS_MIN_INTERVAL):
+        self.status_message = status_message
+        self.username = username
+        self.spins = spins
+        self.min_interval = min_interval
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._wakeup = asyncio.Event()
+        self._dirty = False
+        self._editing = False
+        self._closed = False
+        self._rewards: Optional[RewardCounter] = None
+        self._stats: Optional[Dict[str, int]] = None
+        self._started_at = time.monotonic()
+        self._task = self._loop.create_task(self._run())
+
+    def attach(self, rewards: RewardCounter, stats: Dict[str, int]) -> Callable[[], None]:
+        """Starts tracking a spin phase and returns its notify callback."""
+        self._rewards = rewards
+        self._stats = stats
+        self._started_at = time.monotonic()
+        return self.notify
+
+    def notify(self):
+        if self._dirty:
+            return # An edit is already pending and will pick up this state too
+        self._dirty = True
+        if threading.get_ident() == self._loop_thread:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def render(self) -> discord.Embed:
+        done = sum(self._stats.values())
+        elapsed = max(1e-6, time.monotonic() - self._started_at)
+        rate = done / elapsed
+        eta_text = f"~{format_duration((self.spins - done) / rate)}" if rate > 0 else "unknown"
+        embed = discord.Embed(title="🎰 SpinBot is working...", description=f"Spinning for user {self.username}: **{done:,}/{self.spins:,}** spin(s) done\n⚡ {rate:.1f} spins/s · ⏳ ETA {eta_text}", color=discord.Color.orange())
+        rewards = self._rewards.to_dict()
+        if rewards:
+            add_reward_fields(embed, rewards, "Rewards So Far")
+        embed.set_footer(text="Please be patient until all spins are completed.")
+        return embed
+
+    async def _run(self):
+        last_edit = float("-inf")
+        while not self._closed:
+            await self._wakeup.wait()
+            delay = self.min_interval - (time.monotonic() - last_edit)
+            if delay > 0:
+                await asyncio.sleep(delay) # Let more spins coalesce into this edit
+            if self._closed:
+                return
+            self._wakeup.clear()
+            self._dirty = False
+            last_edit = time.monotonic()
+            self._editing = True
+            try:
+                await self.status_message.edit(embed=self.render())
+            except Exception as e_edit:
+                logger.warning(f"Failed to publish spin progress for {self.username}: {e_edit}")
+            finally:
+                self._editing = False
+
+    async def stop(self):
+        """Stops publishing. Waits for an in-flight edit so it cannot land after the final result embed."""
+        self._closed = True
+        if not self._editing:
+            self._task.cancel()
+        else:
+            self._wakeup.set()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class SpinCancelView(discord.ui.View):
+    """Cancel button under a /spin or /spinbatch status message. Only the job owner or an admin can press it."""
+    def __init__(self, owner_id: int):
+        super().__init__(timeout=None)
+        self.owner_id = owner_id
+        self.jobs: List[SpinJob] = []
+        self.cancel_token = CancelToken() # Stops batch accounts that were not submitted yet
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id == self.owner_id or interaction.permissions.administrator:
+            return True
+        await interaction.response.send_message("🚫 Only the user who started this job can cancel it.", ephemeral=True)
+        return False
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.danger, emoji="🛑")
+    async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        logger.info(f"Cancel button pressed by {interaction.user.name} (ID: {interaction.user.id}).")
+        self.cancel_token.cancel()
+        cancelled = sum(spin_scheduler.cancel(job) for job in self.jobs)
+        if cancelled:
+            await interaction.response.send_message(f"🛑 Cancelling {cancelled} job(s)... Rewards collected so far will be shown.", ephemeral=True)
+        else:
+            await interaction.response.send_message("ℹ️ Nothing left to cancel.", ephemeral=True)
 
 
 class SpinModal(discord.ui.Modal, title="🎰 SpinBot Input"):
@@ -500,9 +3562,11 @@ class SpinModal(discord.ui.Modal, title="🎰 SpinBot Input"):
         self.username_input = discord.ui.TextInput(label="Username", placeholder="Enter your Empire username...", required=True, style=discord.TextStyle.short, max_length=50)
         self.password_input = discord.ui.TextInput(label="Password", placeholder="Enter your password...", style=discord.TextStyle.short, required=True, max_length=50)
         self.spins_input = discord.ui.TextInput(label="Number of Spins", placeholder="How many times? (1-1000)", style=discord.TextStyle.short, required=True, max_length=4)
+        self.world_input = discord.ui.TextInput(label="Game World (optional)", placeholder=f"Default: {GGE_GAME_WORLD}. Available: {', '.join(gge_router.worlds)}"[:100], style=discord.TextStyle.short, required=False, max_length=50)
         self.add_item(self.username_input)
         self.add_item(self.password_input)
         self.add_item(self.spins_input)
+        self.add_item(self.world_input)
 
     async def on_submit(self, interaction: discord.Interaction):
         """Handles the modal submission."""
@@ -518,38 +3582,90 @@ class SpinModal(discord.ui.Modal, title="🎰 SpinBot Input"):
         except ValueError:
             await interaction.response.send_message("❌ Invalid number of spins. Please enter a number between 1 and 1000.", ephemeral=True)
             return
+        try:
+            world = gge_router.world_for(username, self.world_input.value)
+        except ValueError as e:
+            await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+            return
 
         await interaction.response.send_message(f"🔒 Input received for {username}. Starting {spins} spin(s)...\n*This may take a while, especially the first time (reCAPTCHA). Please be patient.*", ephemeral=True)
         
         embed = discord.Embed(title="🎰 SpinBot is working...", description=f"Initializing {spins} spin(s) for user {username}...\n*This may take a moment, including reCAPTCHA solving.*", color=discord.Color.orange())
         embed.set_footer(text="Please be patient until all spins are completed.")
-        status_message = await interaction.followup.send(embed=embed, wait=True) # Send as non-ephemeral
+        cancel_view = SpinCancelView(interaction.user.id)
+        status_message = await interaction.followup.send(embed=embed, view=cancel_view, wait=True) # Send as non-ephemeral
 
+        job = spin_scheduler.submit(interaction.user.id, username, spins, world)
+        if recaptcha_token_cache is not None:
+            job.token_demand = recaptcha_token_cache.note_demand() # Let the token producer scale up before the job asks for its token
+        cancel_view.jobs.append(job)
         try:
-            # Run the blocking spin_lucky_wheel in a separate thread
-            rewards = await asyncio.to_thread(spin_lucky_wheel, username, password, spins, user_id_for_logging)
-            
-            embed_done = discord.Embed(title="✅ Spins Completed!", description=f"All {spins} spin attempts for {username} have been processed.", color=discord.Color.green())
+            async def show_queue_position(position: int, eta: float):
+                embed_queued = discord.Embed(title="⏳ SpinBot job queued", description=f"{spins} spin(s) for user {username} are waiting for a free slot.\n**Queue position:** {position}\n**Estimated start:** in ~{format_duration(eta)}", color=discord.Color.light_grey())
+                embed_queued.set_footer(text="Use /spinqueue to see the current load.")
+                await status_message.edit(embed=embed_queued)
+
+            if not job.admitted.done():
+                await spin_scheduler.wait_turn(job, on_queued=show_queue_position)
+                job.cancel_token.raise_if_cancelled()
+                await status_message.edit(embed=embed)
+            job.cancel_token.raise_if_cancelled()
+
+            progress = SpinProgressPublisher(status_message, username, spins)
+            spin_stats = {}
+            outcomes = SpinOutcomeLog()
+            try:
+                rewards = await spin_scheduler.run(job, spin_lucky_wheel_async(username, password, spins, user_id_for_logging, stats=spin_stats, browser_session=spin_scheduler.browser_session, progress=progress, outcomes=outcomes, cancel=job.cancel_token, route=job.lease, token_demand=job.token_demand))
+            finally:
+                await progress.stop()
+            outcome_stats = outcomes.summarize()
+
+            if job.cancel_token.cancelled:
+                reclaim_seconds, reclaimed = await spin_scheduler.reclaim(job)
+                resolved = spins - spin_stats.get("cancelled", spins)
+                embed_done = discord.Embed(title="🛑 Spins Cancelled", description=f"Cancelled after {resolved:,} of {spins:,} spin(s) for {username}.\nResources were freed {reclaim_seconds:.1f}s after the cancel{'' if reclaimed else ' (some work was still finishing)'}.", color=discord.Color.dark_grey())
+                job_outcome = "cancelled"
+            else:
+                embed_done = discord.Embed(title="✅ Spins Completed!", description=f"All {spins} spin attempts for {username} have been processed.", color=discord.Color.green())
+                job_outcome = "completed"
             if rewards:
-                reward_lines = format_rewards_field_value(rewards)
-                embed_done.add_field(name="Received Rewards", value=reward_lines, inline=False)
+                add_reward_fields(embed_done, rewards, "Received Rewards")
+            elif job_outcome == "cancelled":
+                embed_done.add_field(name="Received Rewards", value="No rewards were collected before the job was cancelled.", inline=False)
             else:
                 embed_done.add_field(name="Received Rewards", value="No rewards detected or process ended prematurely. Check bot logs.", inline=False)
                 embed_done.color = discord.Color.gold() # Gold if no rewards but process finished
-            await status_message.edit(embed=embed_done)
-
-        except ConnectionError as e: # Catch specific ConnectionError from spin_lucky_wheel for RCT/login issues
-            logger.error(f"Error during spin_lucky_wheel (Connection/Login) for {username} by {user_id_for_logging}: {e}", exc_info=True)
+            if SPIN_STATS_FIELD and outcome_stats:
+                embed_done.add_field(name="Spin Statistics", value=format_outcome_stats_field(outcome_stats), inline=False)
+            with metrics.span("discord_edit"):
+                await status_message.edit(embed=embed_done, view=None)
+            metrics.inc("spinbot_jobs_total", "outcome", job_outcome)
+            if spin_ledger is not None and spin_stats:
+                spin_ledger.record_job(LedgerEntry(interaction.user.id, username, spins, spin_stats, rewards, time.time(), outcome_stats, cancelled=job_outcome == "cancelled"))
+
+        except JobCancelled:
+            logger.info(f"Spin job for {username} by {user_id_for_logging} was cancelled before it started.")
+            metrics.inc("spinbot_jobs_total", "outcome", "cancelled")
+            embed_cancelled = discord.Embed(title="🛑 Spins Cancelled", description=f"The {spins} spin(s) for {username} were cancelled before they started.", color=discord.Color.dark_grey())
+            await status_message.edit(embed=embed_cancelled, view=None)
+        except ConnectionError as e: # Catch specific ConnectionError from spin_lucky_wheel_async for RCT/login issues
+            logger.error(f"Error during spin_lucky_wheel_async (Connection/Login) for {username} by {user_id_for_logging}: {e}", exc_info=True)
+            metrics.inc("spinbot_jobs_total", "outcome", "login_failed")
             embed_error = discord.Embed(title="❌ Error During Login/Connection!", description=f"A problem occurred while trying to log in or connect for {username}.\n**Reason:** {e}\n\nPlease check the bot's console logs for details. This could be due to incorrect login, reCAPTCHA issues, or game server problems.", color=discord.Color.red())
-            await status_message.edit(embed=embed_error)
+            await status_message.edit(embed=embed_error, view=None)
         except (WebDriverException, SeleniumTimeoutException) as e_selenium: # Catch Selenium specific errors
-            logger.error(f"Selenium error during spin_lucky_wheel for {username} by {user_id_for_logging}: {e_selenium}", exc_info=True)
+            logger.error(f"Selenium error during spin_lucky_wheel_async for {username} by {user_id_for_logging}: {e_selenium}", exc_info=True)
+            metrics.inc("spinbot_jobs_total", "outcome", "browser_error")
             embed_error = discord.Embed(title="❌ Error with Automated Browser!", description=f"A problem occurred with the automated browser task (reCAPTCHA) for {username}.\n**Details:** {type(e_selenium).__name__}. Check bot logs.\nThis might be a temporary issue or a problem with the bot's setup (ChromeDriver).", color=discord.Color.red())
-            await status_message.edit(embed=embed_error)
+            await status_message.edit(embed=embed_error, view=None)
         except Exception as e:
-            logger.error(f"Error during spin_lucky_wheel execution for {username} by {user_id_for_logging}: {e}", exc_info=True)
+            logger.error(f"Error during spin_lucky_wheel_async execution for {username} by {user_id_for_logging}: {e}", exc_info=True)
+            metrics.inc("spinbot_jobs_total", "outcome", "failed")
             embed_error = discord.Embed(title="❌ Error Executing Spins!", description=f"An unexpected problem occurred while processing spins for {username}.\nPossible reasons: Incorrect login details, game server issues, network interruption, or an internal bot error.\nPlease check the bot's console logs for detailed technical information.", color=discord.Color.red())
-            await status_message.edit(embed=embed_error)
+            await status_message.edit(embed=embed_error, view=None)
+        finally:
+            cancel_view.stop()
+            spin_scheduler.finish(job)
 
     async def on_error(self, interaction: discord.Interaction, error: Exception) -> None:
         logger.error(f"Error in SpinModal interaction: {error}", exc_info=True)
@@ -557,6 +3673,177 @@ class SpinModal(discord.ui.Modal, title="🎰 SpinBot Input"):
         await resp_func('Oops! Something went wrong while opening or handling the form.', ephemeral=True)
 
 
+def parse_batch_accounts(text: str, max_accounts: int) -> List[Tuple[str, str, int, Optional[str]]]:
+    """Parses one `username[@world]:password:spins` per line (the password may contain ':'). Raises ValueError with a user-facing reason."""
+    accounts = []
+    seen = set()
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        credentials, _, spins_value = line.rpartition(":")
+        username, _, password = credentials.partition(":")
+        username, _, world = username.partition("@")
+        if not username or not password:
+            raise ValueError(f"Line {line_number} is not in the format `username:password:spins`.")
+        try:
+            spins = int(spins_value)
+        except ValueError:
+            raise ValueError(f"Line {line_number}: '{spins_value}' is not a number of spins.") from None
+        if not (1 <= spins <= 10000):
+            raise ValueError(f"Line {line_number}: spin count must be between 1 and 10000.")
+        if (username.lower(), world.lower()) in seen:
+            raise ValueError(f"Line {line_number}: account '{username}' is listed twice.")
+        seen.add((username.lower(), world.lower()))
+        accounts.append((username.strip(), password, spins, world.strip() or None))
+    if not accounts:
+        raise ValueError("No accounts given.")
+    if len(accounts) > max_accounts:
+        raise ValueError(f"At most {max_accounts} accounts per batch.")
+    return accounts
+
+
+class BatchAccountResult:
+    """Outcome of one account in a /spinbatch run."""
+    __slots__ = ("username", "spins", "world", "rewards", "stats", "error", "duration", "cancelled")
+
+    def __init__(self, username: str, spins: int, world: str = GGE_GAME_WORLD):
+        self.username = username
+        self.spins = spins
+        self.world = world
+        self.rewards: Dict[str, int] = {}
+        self.stats: Dict[str, int] = {}
+        self.error: Optional[str] = None
+        self.duration = 0.0
+        self.cancelled = False
+
+
+def build_batch_embed(results: List[BatchAccountResult], finished: bool, wall_time: float) -> discord.Embed:
+    """One embed for the whole batch: a field per account plus the grand total, kept under Discord's 6000 character limit."""
+    done = [r for r in results if r.duration or r.error or r.cancelled]
+    failed = [r for r in done if r.error]
+    cancelled = [r for r in done if r.cancelled]
+    if finished and cancelled:
+        title, color = "🛑 Batch Cancelled", discord.Color.dark_grey()
+    elif finished:
+        title, color = ("✅ Batch Completed!", discord.Color.green()) if not failed else ("⚠️ Batch Completed With Errors", discord.Color.gold())
+    else:
+        title, color = "🎰 SpinBot batch is working...", discord.Color.orange()
+    sequential_time = sum(r.duration for r in done)
+    description = f"**Accounts:** {len(done)}/{len(results)} done"
+    if failed:
+        description += f" ({len(failed)} failed)"
+    if cancelled:
+        description += f" ({len(cancelled)} cancelled)"
+    if finished:
+        description += f"\n**Wall time:** {format_duration(wall_time)} (accounts took {format_duration(sequential_time)} in total"
+        description += f", {sequential_time / wall_time:.1f}x faster than one after another)" if wall_time > 0 else ")"
+    embed = discord.Embed(title=title, description=description, color=color)
+
+    grand_total: Dict[str, int] = defaultdict(int)
+    for result in done:
+        for name, amount in result.rewards.items():
+            grand_total[name] += amount
+    grand_total_value = format_rewards_field_value(grand_total, EMBED_FIELD_VALUE_LIMIT) if grand_total else "No rewards yet."
+    budget_per_account = max(60, min(1024, (5400 - len(description) - len(grand_total_value)) // max(1, len(results))))
+    for result in results:
+        if result.error:
+            name, value = f"❌ {result.username}", result.error
+        elif result.cancelled:
+            name = f"🛑 {result.username}: cancelled after {result.stats.get('found', 0):,}/{result.spins:,} spins"
+            value = format_rewards_field_value(result.rewards, budget_per_account) if result.rewards else "No rewards collected."
+        elif result.duration:
+            name = f"✅ {result.username}: {result.stats.get('found', 0):,}/{result.spins:,} spins in {format_duration(result.duration)}"
+            value = format_rewards_field_value(result.rewards, budget_per_account) if result.rewards else "No rewards detected."
+        else:
+            name, value = f"⏳ {result.username}", f"{result.spins:,} spin(s) pending..."
+        if len(value) > budget_per_account:
+            value = value[:budget_per_account - 2].rsplit("\n", 1)[0] + "\n…"
+        embed.add_field(name=name[:256], value=value, inline=False)
+    embed.add_field(name="Grand Total", value=grand_total_value, inline=False)
+    return embed
+
+
+class SpinBatchModal(discord.ui.Modal, title="🎰 SpinBot Batch Input"):
+    """Collects several accounts (one `username:password:spins` per line) for one batch run."""
+    def __init__(self):
+        super().__init__(timeout=300)
+        self.accounts_input = discord.ui.TextInput(label="Accounts (username[@world]:password:spins)", placeholder=f"account1:password1:100\naccount2@{GGE_GAME_WORLD}:password2:250", style=discord.TextStyle.paragraph, required=True, max_length=2000)
+        self.add_item(self.accounts_input)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        user_id_for_logging = f"{interaction.user.name} ({interaction.user.id})"
+        try:
+            accounts = parse_batch_accounts(self.accounts_input.value, SPIN_BATCH_MAX_ACCOUNTS)
+            worlds = [gge_router.world_for(username, world) for username, _, _, world in accounts]
+        except ValueError as e:
+            await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+            return
+
+        demands = [recaptcha_token_cache.note_demand() if recaptcha_token_cache is not None else None for _ in accounts]
+        await interaction.response.send_message(f"🔒 Input received for {len(accounts)} account(s). Starting the batch...", ephemeral=True)
+        results = [BatchAccountResult(username, spins, world) for (username, _, spins, _), world in zip(accounts, worlds)]
+        cancel_view = SpinCancelView(interaction.user.id)
+        status_message = await interaction.followup.send(embed=build_batch_embed(results, False, 0.0), view=cancel_view, wait=True)
+        batch_started = time.monotonic()
+        limit = asyncio.Semaphore(SPIN_BATCH_MAX_CONCURRENCY)
+
+        async def run_account(result: BatchAccountResult, password: str, demand: Optional[TokenDemand]):
+            async with limit:
+                if cancel_view.cancel_token.cancelled:
+                    result.cancelled = True
+                    if demand is not None: demand.release()
+                    return
+                job = spin_scheduler.submit(interaction.user.id, result.username, result.spins, result.world)
+                job.token_demand = demand
+                cancel_view.jobs.append(job)
+                try:
+                    await spin_scheduler.wait_turn(job)
+                    job.cancel_token.raise_if_cancelled()
+                    started = time.monotonic()
+                    outcomes = SpinOutcomeLog()
+                    result.rewards = await spin_scheduler.run(job, spin_lucky_wheel_async(result.username, password, result.spins, f"{user_id_for_logging} [{result.username}]", stats=result.stats, browser_session=spin_scheduler.browser_session, outcomes=outcomes, cancel=job.cancel_token, route=job.lease, token_demand=job.token_demand))
+                    result.duration = time.monotonic() - started
+                    if job.cancel_token.cancelled:
+                        result.cancelled = True
+                        await spin_scheduler.reclaim(job)
+                    metrics.inc("spinbot_jobs_total", "outcome", "cancelled" if result.cancelled else "completed")
+                    if spin_ledger is not None and result.stats:
+                        spin_ledger.record_job(LedgerEntry(interaction.user.id, result.username, result.spins, result.stats, result.rewards, time.time(), outcomes.summarize(), cancelled=result.cancelled))
+                except JobCancelled:
+                    metrics.inc("spinbot_jobs_total", "outcome", "cancelled")
+                    result.cancelled = True
+                except ConnectionError as e:
+                    metrics.inc("spinbot_jobs_total", "outcome", "login_failed")
+                    result.error = f"Login/connection failed: {e}"
+                except Exception as e:
+                    logger.error(f"Error in batch job for {result.username} by {user_id_for_logging}: {e}", exc_info=True)
+                    metrics.inc("spinbot_jobs_total", "outcome", "failed")
+                    result.error = f"Unexpected error ({type(e).__name__}). Check bot logs."
+                finally:
+                    spin_scheduler.finish(job)
+            try:
+                await status_message.edit(embed=build_batch_embed(results, False, 0.0))
+            except discord.HTTPException as e_edit:
+                logger.warning(f"Failed to update batch status message: {e_edit}")
+
+        try:
+            await asyncio.gather(*(run_account(result, password, demand) for result, (_, password, _, _), demand in zip(results, accounts, demands)))
+        finally:
+            cancel_view.stop()
+            for demand in demands:
+                if demand is not None: demand.release()
+        wall_time = time.monotonic() - batch_started
+        logger.info(f"[{user_id_for_logging}] Batch of {len(accounts)} account(s) finished in {wall_time:.1f}s.")
+        with metrics.span("discord_edit"):
+            await status_message.edit(embed=build_batch_embed(results, True, wall_time), view=None)
+
+    async def on_error(self, interaction: discord.Interaction, error: Exception) -> None:
+        logger.error(f"Error in SpinBatchModal interaction: {error}", exc_info=True)
+        resp_func = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+        await resp_func('Oops! Something went wrong while handling the batch form.', ephemeral=True)
+
+
 class SpinBotClient(discord.Client): # Renamed to avoid conflict with module name
     """The main Discord bot client."""
     def __init__(self): # Corrected init
@@ -564,6 +3851,7 @@ class SpinBotClient(discord.Client): # Renamed to avoid conflict with module nam
         # intents.message_content = False # Not strictly needed for slash commands only
         super().__init__(intents=intents)
         self.tree = app_commands.CommandTree(self)
+        self.metrics_server: Optional[MetricsServer] = MetricsServer(metrics, METRICS_HOST, METRICS_PORT) if METRICS_PORT > 0 else None
 
     async def setup_hook(self):
         logger.info("🔌 Running setup_hook...")
@@ -574,11 +3862,54 @@ class SpinBotClient(discord.Client): # Renamed to avoid conflict with module nam
             logger.info("✅ Global slash commands synchronized.")
         except Exception as e:
             logger.error(f"   ❌ Error syncing commands in setup_hook: {e}", exc_info=True)
+        if self.metrics_server is not None:
+            try:
+                await self.metrics_server.start()
+            except OSError as e_metrics:
+                logger.error(f"   ❌ Could not start metrics endpoint on {METRICS_HOST}:{METRICS_PORT}: {e_metrics}")
         logger.info("✅ setup_hook complete.")
 
     async def on_ready(self):
         logger.info(f"✅ Bot is online as {self.user} (ID: {self.user.id})")
         logger.info(f"✅ Ready and waiting for commands...")
+        first_ready = startup_timer.mark_ready()
+        if recaptcha_process_pool is not None and not recaptcha_process_pool.started:
+            if recaptcha_browser_pool is not None:
+                logger.warning("RECAPTCHA_WORKER_PROCESSES is set; the in-process RECAPTCHA_POOL_SIZE browsers will not be used.")
+            await recaptcha_process_pool.start()
+        if first_ready and recaptcha_process_pool is None:
+            # Selenium import, chromedriver resolution and pool/pre-warm browsers, off the first /spin's path
+            asyncio.create_task(asyncio.to_thread(warm_up_browser_stack))
+        if recaptcha_token_cache is not None:
+            recaptcha_token_cache.start()
+        if spin_ledger is not None:
+            try:
+                await asyncio.to_thread(spin_ledger.start)
+            except sqlite3.Error as e_ledger:
+                logger.error(f"❌ Could not open the reward ledger at {SPIN_LEDGER_PATH}: {e_ledger}")
+
+    async def close(self):
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        if gge_session_cache is not None:
+            logger.info(gge_session_cache.stats_summary())
+            await gge_session_cache.close_all()
+        if recaptcha_token_cache is not None:
+            recaptcha_token_cache.stop()
+        if recaptcha_process_pool is not None:
+            await recaptcha_process_pool.shutdown()
+        if recaptcha_browser_pool is not None:
+            await asyncio.to_thread(recaptcha_browser_pool.shutdown)
+        await asyncio.to_thread(discard_prewarmed_browser)
+        if spin_ledger is not None:
+            await asyncio.to_thread(spin_ledger.stop)
+        if gge_capture_writer is not None:
+            await asyncio.to_thread(gge_capture_writer.close)
+            logger.info(f"Capture: {gge_capture_writer.records_written:,} record(s), {gge_capture_writer.bytes_written:,} bytes written to {GGE_CAPTURE_FILE}"
+                        f"{f', {gge_capture_writer.chunks_dropped:,} chunk(s) dropped' if gge_capture_writer.chunks_dropped else ''}.")
+        if log_queue_handler is not None and log_queue_handler.dropped:
+            logger.warning(f"⚠️ {log_queue_handler.dropped:,} log record(s) were dropped because the log queue (LOG_QUEUE_SIZE={LOG_QUEUE_SIZE}) was full.")
+        await super().close()
 
 client = SpinBotClient() # Use the renamed class
 
@@ -589,29 +3920,114 @@ async def spin_command_handler(interaction: discord.Interaction): # Renamed to a
     logger.info(f"Command /spin received from user {interaction.user.name} (ID: {interaction.user.id}).")
     await interaction.response.send_modal(SpinModal())
 
+@client.tree.command(name="spinbatch", description="Spins the Lucky Wheel for several Goodgame Empire accounts at once.")
+@app_commands.checks.cooldown(1, 90.0, key=lambda i: i.user.id)
+async def spinbatch_command_handler(interaction: discord.Interaction):
+    """Shows the batch modal; one line per account."""
+    logger.info(f"Command /spinbatch received from user {interaction.user.name} (ID: {interaction.user.id}).")
+    await interaction.response.send_modal(SpinBatchModal())
+
 @client.tree.command(name="spintest", description="Displays a test output of all known rewards with emojis.")
 async def spintest_command_handler(interaction: discord.Interaction): # Renamed
     """Displays a test embed with sample rewards and emojis."""
     logger.info(f"Command /spintest received from user {interaction.user.name} (ID: {interaction.user.id}).")
     await interaction.response.defer(ephemeral=True)
 
-    test_rewards = {
-        "Werkzeuge": 3000, "Ausrüstung/Edelsteine": 2, "Konstrukte": 1, "Kisten": 3, "Dekorationen": 1,
-        "Mehrweller": 1, "Sceattas": 610, "Beatrice-Geschenke": 5, "Ulrich-Geschenke": 7,
-        "Ludwig-Geschenke": 6, "Baumarken": 672, "Ausbaumarken": 6592, "Rubine": 100000, "Lose": 120,
-        "Beschützer des Nordens": 126000, "Schildmaid": 300000, "Walküren-Scharfschützin": 114000,
-        "Walküren-Waldläuferin": 197500
-    }
+    test_rewards = {info.name: info.sample_amount for info in REWARD_CATALOG}
 
     try:
-        reward_lines = format_rewards_field_value(test_rewards)
         embed_test = discord.Embed(title="🧪 SpinBot Test Output", description="This is a preview of how the rewards will be displayed:", color=discord.Color.blue())
-        embed_test.add_field(name="Test Rewards", value=reward_lines, inline=False)
+        add_reward_fields(embed_test, test_rewards, "Test Rewards")
         await interaction.followup.send(embed=embed_test, ephemeral=True)
     except Exception as e:
         logger.error(f"Error generating test output: {e}", exc_info=True)
         await interaction.followup.send("❌ Error generating test output.", ephemeral=True)
 
+@client.tree.command(name="spinqueue", description="Shows the current SpinBot load and job queue.")
+async def spinqueue_command_handler(interaction: discord.Interaction):
+    """Shows running/queued jobs and the estimated start of each queued job."""
+    logger.info(f"Command /spinqueue received from user {interaction.user.name} (ID: {interaction.user.id}).")
+    load = spin_scheduler.load()
+    embed_queue = discord.Embed(title="📋 SpinBot Queue", color=discord.Color.blue())
+    embed_queue.add_field(name="Running Jobs", value=f"{load['running']}/{load['max_ws_sessions']}", inline=True)
+    embed_queue.add_field(name="Browsers in Use", value=f"{load['browsers_in_use']}/{load['max_browser_sessions']}", inline=True)
+    embed_queue.add_field(name="Queued Jobs", value=f"{load['queued']} ({load['queued_users']} user(s))", inline=True)
+    if gge_session_cache is not None:
+        cache_stats = gge_session_cache.stats()
+        embed_queue.add_field(name="Session Reuse", value=f"{cache_stats['parked']} parked | hit rate {cache_stats['hit_rate']:.0%} | {format_duration(cache_stats['login_seconds_saved'])} of login saved", inline=False)
+    embed_queue.add_field(name="Game Servers", value="\n".join(gge_router.status_lines())[:1024], inline=False)
+
+    queue_lines = [f"**{index + 1}.** <@{job.discord_user_id}>: {job.spins:,} spin(s), starts in ~{format_duration(eta)}"
+                   for index, (job, eta) in enumerate(spin_scheduler.queue_estimates()[:10])]
+    if queue_lines:
+        embed_queue.add_field(name="Next in Queue", value="\n".join(queue_lines), inline=False)
+    await interaction.response.send_message(embed=embed_queue, ephemeral=True)
+
+@client.tree.command(name="spincancel", description="Cancels your running and queued spin jobs.")
+@app_commands.describe(account="Only cancel jobs for this game account")
+async def spincancel_command_handler(interaction: discord.Interaction, account: Optional[str] = None):
+    """Cancels the caller's jobs; each job's status message then shows its partial rewards."""
+    logger.info(f"Command /spincancel received from user {interaction.user.name} (ID: {interaction.user.id}).")
+    jobs = [job for job in spin_scheduler.jobs_of(interaction.user.id) if account is None or job.username.lower() == account.lower()]
+    cancelled = sum(spin_scheduler.cancel(job) for job in jobs)
+    if not cancelled:
+        await interaction.response.send_message(f"ℹ️ You have no running or queued spin jobs{f' for {account}' if account else ''}.", ephemeral=True)
+        return
+    await interaction.response.send_message(f"🛑 Cancelling {cancelled} job(s){f' for {account}' if account else ''}. Rewards collected so far will be shown in the status message(s).", ephemeral=True)
+
+@client.tree.command(name="spinhistory", description="Shows your reward totals from previous spin jobs.")
+@app_commands.describe(account="Only show jobs for this game account")
+async def spinhistory_command_handler(interaction: discord.Interaction, account: Optional[str] = None):
+    """Answers from the ledger rollups: today and all time, for the user or one of their accounts."""
+    logger.info(f"Command /spinhistory received from user {interaction.user.name} (ID: {interaction.user.id}).")
+    if spin_ledger is None:
+        await interaction.response.send_message("ℹ️ Reward history is disabled on this bot.", ephemeral=True)
+        return
+    scope, key = ("user_account", f"{interaction.user.id}:{account.lower()}") if account else ("user", str(interaction.user.id))
+    today = time.strftime("%Y-%m-%d", time.gmtime())
+    try:
+        (all_totals, all_rewards), (day_totals, day_rewards) = await asyncio.gather(
+            asyncio.to_thread(spin_ledger.rollup, scope, key), asyncio.to_thread(spin_ledger.rollup, scope, key, today))
+    except sqlite3.Error as e_ledger:
+        logger.error(f"Error reading the reward ledger: {e_ledger}", exc_info=True)
+        await interaction.response.send_message("❌ Could not read the reward history.", ephemeral=True)
+        return
+
+    embed_history = discord.Embed(title=f"📒 Spin History{f' for {account}' if account else ''}", color=discord.Color.blue())
+    if not all_totals["jobs"]:
+        embed_history.description = "No spin jobs recorded yet."
+    for label, totals, rewards in (("Today (UTC)", day_totals, day_rewards), ("All Time", all_totals, all_rewards)):
+        if not totals["jobs"]:
+            continue
+        cancelled = f" ({totals['cancelled']:,} cancelled)" if totals["cancelled"] else ""
+        embed_history.add_field(name=f"{label}: {totals['jobs']:,} job(s){cancelled}, {totals['found']:,}/{totals['spins']:,} spins", value=format_rewards_field_value(rewards, EMBED_FIELD_VALUE_LIMIT) if rewards else "No rewards.", inline=False)
+    await interaction.response.send_message(embed=embed_history, ephemeral=True)
+
+@client.tree.command(name="spinstats", description="Shows SpinBot phase timings and counters (admins only).")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+async def spinstats_command_handler(interaction: discord.Interaction):
+    """Shows p50/p95 per phase from the in-process histograms, plus job and spin counters."""
+    logger.info(f"Command /spinstats received from user {interaction.user.name} (ID: {interaction.user.id}).")
+    embed_stats = discord.Embed(title="📈 SpinBot Stats", color=discord.Color.blue())
+    phase_lines = []
+    for phase, histogram in sorted(metrics.phases.items()):
+        unit, scale = ("ms", 1000) if histogram.quantile(0.5) < 1 else ("s", 1)
+        phase_lines.append(f"`{phase}`: {histogram.count:,}x | p50 {histogram.quantile(0.5) * scale:.1f}{unit} | p95 {histogram.quantile(0.95) * scale:.1f}{unit}")
+    embed_stats.add_field(name="Phases", value="\n".join(phase_lines)[:1024] if phase_lines else "No timings recorded yet.", inline=False)
+    counter_lines = [f"`{name}{{{label}={value}}}`: {count:,}" for (name, label, value), count in metrics.counter_items()]
+    embed_stats.add_field(name="Counters", value="\n".join(counter_lines)[:1024] if counter_lines else "No jobs yet.", inline=False)
+    startup_value = startup_timer.summary() + (f"\n{chromedriver_info.summary()}" if chromedriver_info is not None else "")
+    embed_stats.add_field(name="Start-up (since process start)", value=startup_value[:1024], inline=False)
+    await interaction.response.send_message(embed=embed_stats, ephemeral=True)
+
+@spinstats_command_handler.error
+async def on_spinstats_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    if isinstance(error, app_commands.CheckFailure):
+        await interaction.response.send_message("🚫 You do not have permission to use this command.", ephemeral=True)
+    else:
+        logger.error(f"Unhandled error in /spinstats command processing: {error}", exc_info=True)
+
 @spin_command_handler.error # Attach to the renamed command handler
 async def on_spin_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
     """Handles errors specifically for the /spin command, like cooldowns."""
@@ -624,6 +4040,10 @@ async def on_spin_command_error(interaction: discord.Interaction, error: app_com
         resp_func = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
         await resp_func("An unexpected error occurred while processing the command.", ephemeral=True)
 
+spinbatch_command_handler.error(on_spin_command_error) # Same cooldown/permission handling as /spin
+
+startup_timer.mark_imported()
+
 if __name__ == "__main__":
     if not TOKEN:
         logger.critical("❌ FATAL: DISCORD_TOKEN environment variable not set!")
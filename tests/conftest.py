@@ -0,0 +1,98 @@
+import logging
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gge_standin
+import main
+
+main.logger.setLevel(logging.WARNING)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class SlowReplyStandin(gge_standin.GGEStandinServer):
+    """Stand-in that answers the lws commands numbered in `slow_spins` (1-based) after `slow_delay` seconds."""
+
+    def __init__(self, slow_spins=(), slow_delay: float = 0.0, **options):
+        super().__init__(**options)
+        self.slow_spins = set(slow_spins)
+        self.slow_delay = slow_delay
+        self._lws_seen = 0
+        self._slow_next = False
+
+    def replies_for(self, data: str) -> list:
+        replies = super().replies_for(data)
+        if "%lws%" in data:
+            self._lws_seen += 1
+            self._slow_next = self._lws_seen in self.slow_spins and bool(replies)
+        return replies
+
+    def reply_delay(self) -> float:
+        if self._slow_next:
+            self._slow_next = False
+            return self.slow_delay
+        return super().reply_delay()
+
+
+class DroppedReplyStandin(gge_standin.GGEStandinServer):
+    """Stand-in that never answers the lws commands numbered in `dropped_spins` (1-based)."""
+
+    def __init__(self, dropped_spins=(), **options):
+        super().__init__(**options)
+        self.dropped_spins = set(dropped_spins)
+        self._lws_seen = 0
+
+    def replies_for(self, data: str) -> list:
+        if "%lws%" in data:
+            self._lws_seen += 1
+            if self._lws_seen in self.dropped_spins:
+                self.replies_dropped += 1
+                return []
+        return super().replies_for(data)
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    """Starts a stand-in on a free port, points main.GGE_WEBSOCKET_URL at it and returns the server."""
+    def start(server_class=gge_standin.GGEStandinServer, **options):
+        port = free_port()
+        server = gge_standin.start_standin_in_thread(port=port, server_class=server_class, **options)
+        monkeypatch.setattr(main, "GGE_WEBSOCKET_URL", f"ws://127.0.0.1:{port}/")
+        return server
+    return start
+
+
+@pytest.fixture
+def stub_token(monkeypatch):
+    """Replaces the Selenium step with a blocking wait of `delay` seconds and a dummy token.
+
+    Like kill_driver() on a real browser, a cancel ends the wait at once unless honour_cancel is False.
+    Returns an event that is set once a token was handed out.
+    """
+    def start(delay: float, honour_cancel: bool = True) -> threading.Event:
+        finished = threading.Event()
+
+        def obtain_recaptcha_token(user_id_for_logging="User", cancel=None, demand=None):
+            woken = threading.Event()
+            unregister = cancel.add_callback(woken.set) if cancel and honour_cancel else None
+            try:
+                woken.wait(delay)
+            finally:
+                if unregister: unregister()
+            if cancel: cancel.raise_if_cancelled()
+            finished.set()
+            return "test-token", None
+
+        monkeypatch.setattr(main, "obtain_recaptcha_token", obtain_recaptcha_token)
+        return finished
+    return start
@@ -0,0 +1,162 @@
+"""Cancelling /spin jobs: CancelToken, run_cancellable_in_thread and SpinScheduler.cancel against gge_standin.py."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import main
+
+BOUND_SLACK = 0.5 # Seconds of event-loop and thread scheduling allowed on top of a timeout
+
+
+def test_cancel_token_runs_callbacks_once():
+    token = main.CancelToken()
+    calls = []
+    token.add_callback(lambda: calls.append("browser"))
+    unregister = token.add_callback(lambda: calls.append("removed"))
+    token.add_callback(lambda: 1 / 0) # A failing callback does not stop the others
+    token.add_callback(lambda: calls.append("wait"))
+    unregister()
+    assert token.cancel()
+    assert calls == ["browser", "wait"]
+    assert token.cancelled
+    assert not token.cancel()
+    token.add_callback(lambda: calls.append("late")) # Registered after the cancel: runs at once
+    assert calls == ["browser", "wait", "late"]
+    with pytest.raises(main.JobCancelled):
+        token.raise_if_cancelled()
+
+
+def test_cancelled_thread_is_tracked_until_it_returns():
+    released = threading.Event()
+
+    async def scenario():
+        token = main.CancelToken()
+        token.add_callback(released.set)
+        task = asyncio.create_task(main.run_cancellable_in_thread(token, released.wait, 5.0))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        token.cancel()
+        return await token.reclaim(main.SPIN_CANCEL_TIMEOUT)
+
+    seconds, reclaimed = asyncio.run(scenario())
+    assert reclaimed
+    assert seconds < BOUND_SLACK
+
+
+async def run_cancelled_job(scheduler: main.SpinScheduler, spins: int, stats: dict, cancel_when) -> dict:
+    """One job through the scheduler like SpinModal runs it, cancelled like the Cancel button once cancel_when() is true."""
+    job = scheduler.submit(1, "tester", spins)
+    await scheduler.wait_turn(job)
+    record = {}
+
+    async def press_cancel():
+        while not cancel_when():
+            await asyncio.sleep(0.01)
+        record["cancelled"] = scheduler.cancel(job)
+
+    canceller = asyncio.create_task(press_cancel())
+    try:
+        record["rewards"] = await scheduler.run(job, main.spin_lucky_wheel_async("tester", "pw", spins, "test", pipeline_window=1, stats=stats,
+                                                                               browser_session=scheduler.browser_session, adaptive_pacing=False, cancel=job.cancel_token))
+        record["seconds"], record["reclaimed"] = await scheduler.reclaim(job)
+        record["running_before_finish"] = scheduler.load()["running"]
+    finally:
+        scheduler.finish(job)
+        canceller.cancel()
+    return record
+
+
+def test_cancel_while_spinning_keeps_partial_rewards(standin, stub_token):
+    standin(latency=0.01, seed=5)
+    stub_token(0.05)
+    stats = {}
+
+    async def scenario():
+        scheduler = main.SpinScheduler(1, 1, main.SPIN_CANCEL_TIMEOUT)
+        estimate = scheduler.avg_seconds_per_spin
+        record = await run_cancelled_job(scheduler, 200, stats, lambda: stats.get("found", 0) >= 3)
+        assert scheduler.avg_seconds_per_spin == estimate # A cancelled job says nothing about the per-spin cost
+        return record, scheduler.load()
+
+    record, load = asyncio.run(scenario())
+    assert record["cancelled"] and record["reclaimed"]
+    assert record["seconds"] < min(main.SPIN_CANCEL_TIMEOUT, BOUND_SLACK)
+    assert 3 <= stats["found"] < 200
+    assert sum(record["rewards"].values()) > 0
+    assert stats["cancelled"] == 200 - sum(stats[result] for result in ("found", "timed_out", "errors", "disconnected"))
+    assert load == dict(load, running=0, queued=0)
+
+
+def test_cancel_during_token_frees_the_job_at_once(standin, stub_token):
+    standin(latency=0.01)
+    stub_token(30.0) # Only returns this soon because the cancel wakes it
+    stats = {}
+    started = time.monotonic()
+
+    async def scenario():
+        scheduler = main.SpinScheduler(1, 1, main.SPIN_CANCEL_TIMEOUT)
+        return await run_cancelled_job(scheduler, 50, stats, lambda: time.monotonic() - started > 0.1)
+
+    record = asyncio.run(scenario())
+    assert record["cancelled"] and record["reclaimed"]
+    assert record["rewards"] == {}
+    assert record["seconds"] < min(main.SPIN_CANCEL_TIMEOUT, BOUND_SLACK)
+
+
+def test_stuck_worker_is_bounded_by_cancel_timeout(standin, stub_token):
+    standin(latency=0.01)
+    stub_token(1.5, honour_cancel=False)
+    started = time.monotonic()
+
+    async def scenario():
+        scheduler = main.SpinScheduler(1, 1, cancel_timeout=0.5)
+        record = await run_cancelled_job(scheduler, 50, {}, lambda: time.monotonic() - started > 0.1)
+        return record
+
+    record = asyncio.run(scenario())
+    assert record["cancelled"] and not record["reclaimed"]
+    assert 0.5 <= record["seconds"] < 0.5 + BOUND_SLACK
+    assert record["running_before_finish"] == 0 # The scheduler released the slot on its own
+
+
+def test_completed_job_updates_spin_estimate(standin, stub_token):
+    standin(latency=0.01)
+    stub_token(0.05)
+
+    async def scenario():
+        scheduler = main.SpinScheduler(1, 1)
+        scheduler.avg_job_overhead = 0.0
+        job = scheduler.submit(1, "tester", 20)
+        await scheduler.wait_turn(job)
+        try:
+            await scheduler.run(job, main.spin_lucky_wheel_async("tester", "pw", 20, "test", pipeline_window=4, browser_session=scheduler.browser_session, adaptive_pacing=False, cancel=job.cancel_token))
+        finally:
+            scheduler.finish(job)
+        return job.completed, scheduler.avg_seconds_per_spin
+
+    completed, estimate = asyncio.run(scenario())
+    assert completed
+    assert estimate < 0.8 * 0.35 + 0.2 * 0.1 # Pulled down from the 0.35 s default by a fast job
+
+
+def test_cancel_queued_job():
+    async def scenario():
+        scheduler = main.SpinScheduler(1, 1)
+        running = scheduler.submit(1, "first", 10)
+        queued = scheduler.submit(2, "second", 10)
+        await scheduler.wait_turn(running)
+        assert scheduler.cancel(queued)
+        assert not scheduler.cancel(queued)
+        await scheduler.wait_turn(queued)
+        admitted = queued.admitted.result()
+        load = scheduler.load()
+        scheduler.finish(running)
+        return admitted, load
+
+    admitted, load = asyncio.run(scenario())
+    assert admitted is False
+    assert load["running"] == 1 and load["queued"] == 0
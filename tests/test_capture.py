@@ -0,0 +1,35 @@
+"""CaptureWriter and SessionRecorder: chunks are written by the writer thread, not the caller."""
+import threading
+
+import gge_capture
+
+
+def test_chunks_are_written_off_the_calling_thread(tmp_path, monkeypatch):
+    path = str(tmp_path / "capture.jsonl.gz")
+    writer = gge_capture.CaptureWriter(path, flush_records=4)
+    writer_threads = []
+    real_compress = gge_capture.gzip.compress
+
+    def compress(data):
+        writer_threads.append(threading.current_thread())
+        return real_compress(data)
+
+    monkeypatch.setattr(gge_capture.gzip, "compress", compress)
+    recorders = [writer.session(world=f"w{index}") for index in range(3)]
+    for step in range(10):
+        for recorder in recorders:
+            recorder.sent('%xt%EmpireEx_2%lli%1%{"NOM":"someone","PW":"secret","RCT":"token"}%')
+            recorder.received(f"%xt%sps%1%0%{step}%".encode())
+    for recorder in recorders:
+        recorder.close()
+    writer.close()
+
+    assert writer_threads and threading.current_thread() not in writer_threads
+    records = list(gge_capture.iter_capture(path))
+    assert len(records) == writer.records_written == 3 * (1 + 20 + 1)
+    assert writer.chunks_dropped == 0
+    for recorder in recorders:
+        own = [record for record in records if record[0] == recorder.session_id]
+        assert [record[2] for record in own] == ["h"] + ["s", "r"] * 10 + ["e"]
+    sent = [record[3] for record in records if record[2] == "s"]
+    assert all("secret" not in frame and "token" not in frame and "someone" not in frame for frame in sent)
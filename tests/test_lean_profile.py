@@ -0,0 +1,54 @@
+"""Block patterns of the lean Chrome profile, matched like Network.setBlockedURLs matches `urls` (whole URL, * wildcards)."""
+import re
+
+import main
+
+
+def blocked(url: str) -> bool:
+    return any(re.fullmatch(".*".join(map(re.escape, pattern.split("*"))), url) for pattern in main.lean_profile_block_patterns())
+
+
+def test_type_patterns_match_the_path_extension(monkeypatch):
+    monkeypatch.setattr(main, "RECAPTCHA_BLOCK_TYPES", ["image", "font"])
+    monkeypatch.setattr(main, "RECAPTCHA_BLOCK_URLS", [])
+    for url in ("https://empire.goodgamestudios.com/assets/logo.png", "https://cdn.example.com/a/b/icon.svg?v=3",
+                "https://empire.goodgamestudios.com/favicon.ico", "https://fonts.example.com/x.woff2"):
+        assert blocked(url), url
+    for url in ("https://empire.goodgamestudios.com/js/icons.gif.js", "https://empire.goodgamestudios.com/page?img=x.svg&y=1",
+                "https://empire.goodgamestudios.com/favicon.icon", "https://empire.goodgamestudios.com/svg/loader.js",
+                "https://cdn.example.com/clip.mp4"): # media not selected
+        assert not blocked(url), url
+
+
+def test_unknown_type_is_skipped(monkeypatch):
+    monkeypatch.setattr(main, "RECAPTCHA_BLOCK_TYPES", ["sprites"])
+    monkeypatch.setattr(main, "RECAPTCHA_BLOCK_URLS", ["*://*.doubleclick.net/*"])
+    assert main.lean_profile_block_patterns() == ["*://*.doubleclick.net/*"]
+
+
+class FakeCdpDriver:
+    """Records execute_cdp_cmd calls; rejects urlPatterns like a Chrome that predates it."""
+
+    def __init__(self, knows_url_patterns: bool):
+        self.knows_url_patterns = knows_url_patterns
+        self.blocked_urls_params = []
+
+    def execute_cdp_cmd(self, command: str, params: dict):
+        if command != "Network.setBlockedURLs":
+            return {}
+        if "urlPatterns" in params and not self.knows_url_patterns:
+            raise main.WebDriverException("invalid argument: Invalid parameters")
+        self.blocked_urls_params.append(params)
+        return {}
+
+
+def test_lean_profile_falls_back_to_plain_urls(monkeypatch):
+    monkeypatch.setattr(main, "RECAPTCHA_BLOCK_TYPES", [])
+    monkeypatch.setattr(main, "RECAPTCHA_BLOCK_URLS", ["*://*.doubleclick.net/*"])
+    monkeypatch.setattr(main, "RECAPTCHA_ALLOW_URLS", ["*://www.google.com/recaptcha/*"])
+    current, older = FakeCdpDriver(knows_url_patterns=True), FakeCdpDriver(knows_url_patterns=False)
+    main.apply_lean_profile(current)
+    main.apply_lean_profile(older)
+    assert current.blocked_urls_params == [{"urlPatterns": [{"urlPattern": "*://www.google.com/recaptcha/*", "block": False},
+                                                            {"urlPattern": "*://*.doubleclick.net/*", "block": True}]}]
+    assert older.blocked_urls_params == [{"urls": ["*://*.doubleclick.net/*"]}]
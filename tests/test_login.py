@@ -0,0 +1,46 @@
+"""gge_login_overlapped against gge_standin.py with a stubbed reCAPTCHA step."""
+import asyncio
+
+import pytest
+
+import main
+from conftest import free_port
+
+
+def test_failed_connect_waits_for_token_and_reroutes(standin, stub_token):
+    standin(latency=0.01)
+    token_handed_out = stub_token(0.3)
+    dead_url = f"ws://127.0.0.1:{free_port()}/"
+    router = main.GGERouter([("EmpireEx_2", dead_url), ("EmpireEx_2", main.GGE_WEBSOCKET_URL)], "EmpireEx_2")
+    route = router.try_lease("EmpireEx_2")
+    dead_endpoint = route.endpoint
+    assert dead_endpoint.url == dead_url
+
+    async def login():
+        session, token, _ = await main.gge_login_overlapped("tester", "pw", "test", route=route)
+        try:
+            return session is not None and session.connected, token, session.endpoint if session else None
+        finally:
+            if session: await session.close()
+
+    logged_in, token, endpoint = asyncio.run(login())
+    assert token_handed_out.is_set()
+    assert logged_in and token == "test-token"
+    assert route.endpoint is endpoint and endpoint.url == main.GGE_WEBSOCKET_URL
+    assert dead_endpoint.failures == 1 # Reported once, by connect()
+
+
+def test_cancel_stops_both_branches_before_closing(standin, stub_token):
+    standin(latency=0.01)
+    stub_token(0.3)
+
+    async def cancelled_login():
+        task = asyncio.create_task(main.gge_login_overlapped("tester", "pw", "test"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The token's worker thread may outlive the cancel (see run_cancellable_in_thread); the login's own tasks may not
+        return [other for other in asyncio.all_tasks() if "gge_login_overlapped" in other.get_coro().__qualname__]
+
+    assert asyncio.run(cancelled_login()) == []
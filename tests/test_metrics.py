@@ -0,0 +1,25 @@
+"""MetricsRegistry under concurrent use from worker threads."""
+import threading
+
+import main
+
+
+def test_counters_are_exact_under_threads():
+    registry = main.MetricsRegistry()
+    rounds, threads = 20000, 8
+    start = threading.Barrier(threads)
+
+    def work(index: int):
+        start.wait()
+        for step in range(rounds):
+            registry.inc("spinbot_test_total", "worker", "shared")
+            if step % 1000 == 0:
+                registry.inc("spinbot_test_total", "worker", f"w{index}-{step}") # New keys while another thread renders
+                registry.render_prometheus()
+
+    workers = [threading.Thread(target=work, args=(index,)) for index in range(threads)]
+    for worker in workers: worker.start()
+    for worker in workers: worker.join()
+    assert registry.counters[("spinbot_test_total", "worker", "shared")] == rounds * threads
+    assert len(registry.counter_items()) == 1 + threads * rounds // 1000
+    assert 'spinbot_test_total{worker="shared"} 160000' in registry.render_prometheus()
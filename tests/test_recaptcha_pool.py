@@ -0,0 +1,21 @@
+"""RecaptchaProcessPool with the stub driver (spawns real worker processes, no Chrome)."""
+import asyncio
+
+import main
+
+
+def test_shutdown_waits_for_recycled_workers():
+    async def scenario():
+        pool = main.RecaptchaProcessPool(1, task_timeout=30.0, max_tasks=1, stub_delay=0.05)
+        await pool.start()
+        token = await pool.get_token("test")
+        replacements = set(pool._replacements)
+        await pool.shutdown()
+        return token, replacements, pool
+
+    token, replacements, pool = asyncio.run(scenario())
+    assert token
+    assert pool.recycled == 1 and len(replacements) == 1
+    assert all(task.done() for task in replacements)
+    assert not pool._replacements
+    assert not pool._workers
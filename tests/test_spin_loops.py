@@ -0,0 +1,71 @@
+"""The blocking spin loops against gge_standin.py: reply matching with lost and late replies."""
+import benchmark
+import main
+from conftest import SlowReplyStandin
+
+
+def run_sync_spins(spins: int, window: int, timeout: float):
+    ws = benchmark.gge_login_sync_worker_with_rct("tester", "pw", "test-token", user_id_for_logging="test")
+    assert ws, "login against the stand-in failed"
+    rewards = main.RewardCounter()
+    stats = dict(found=0, timed_out=0, errors=0, disconnected=0)
+    try:
+        if window > 1:
+            benchmark.spin_loop_pipelined(ws, spins, rewards, stats, window, timeout, "tester", "test")
+        else:
+            benchmark.spin_loop_lockstep(ws, spins, rewards, stats, 0.0, timeout, "tester", "test")
+    finally:
+        ws.close()
+    return rewards.to_dict(), stats
+
+
+def test_pipelined_totals_match_lockstep_with_lost_replies(standin):
+    results = {}
+    for window in (1, 6):
+        server = standin(latency=0.01, jitter=0.03, drop_probability=0.1, seed=7)
+        rewards, stats = run_sync_spins(120, window, timeout=0.3)
+        assert server.replies_dropped > 0
+        assert stats["found"] == server.spins_answered
+        assert stats["timed_out"] == server.replies_dropped
+        assert stats["errors"] == stats["disconnected"] == 0
+        results[window] = (rewards, stats)
+    assert results[6] == results[1]
+
+
+def test_late_reply_is_credited_to_its_own_spin(standin):
+    results = {}
+    for window in (1, 4):
+        server = standin(SlowReplyStandin, slow_spins=(3, 11), slow_delay=0.6, latency=0.01, seed=3)
+        rewards, stats = run_sync_spins(20, window, timeout=0.25)
+        assert stats == dict(found=20, timed_out=0, errors=0, disconnected=0)
+        assert server.spins_answered == 20
+        results[window] = rewards
+    standin(latency=0.01, seed=3) # Same rewards, all answered in time
+    reference_rewards, _ = run_sync_spins(20, 1, timeout=0.25)
+    assert results[1] == results[4] == reference_rewards
+
+
+def test_reply_matcher_settles_lost_and_late_spins():
+    matcher = main.SpinReplyMatcher()
+    for sent_at in (0.0, 0.1, 0.2):
+        matcher.add(sent_at, 1.0)
+    assert [spin for spin, _, _ in matcher.expire(1.05)] == [1]
+    assert matcher.needs_barrier()
+    matcher.add_barrier()
+    assert not matcher.needs_barrier()
+
+    # Spin 1 was lost: the next reply is taken as its late reply, the barrier then settles spin 3
+    assert matcher.match() == (1, 0.0, True)
+    assert matcher.match() == (2, 0.1, False)
+    assert [spin for spin, _, _ in matcher.on_barrier()] == [3]
+    assert not matcher.pending and not matcher.stale
+
+    # A late reply arriving before the barrier answer leaves nothing to settle
+    matcher.add(3.0, 1.0)
+    matcher.add(3.1, 1.0)
+    matcher.expire(4.05)
+    matcher.add_barrier()
+    assert matcher.match() == (4, 3.0, True)
+    assert matcher.match() == (5, 3.1, False)
+    assert matcher.on_barrier() == []
+    assert matcher.on_barrier() == [] # Keepalive answers that are not ours are ignored
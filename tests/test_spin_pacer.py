@@ -0,0 +1,138 @@
+"""SpinPacer arithmetic, and the async spin loop's reply matching against gge_standin.py."""
+import asyncio
+
+import pytest
+
+import main
+from conftest import DroppedReplyStandin, SlowReplyStandin
+
+
+def test_first_sample_sets_srtt_and_rttvar():
+    pacer = main.SpinPacer()
+    assert pacer.srtt is None
+    assert pacer.timeout() == pacer.max_timeout
+    assert pacer.window() == 1
+    pacer.on_reply(0.4)
+    assert pacer.srtt == pytest.approx(0.4)
+    assert pacer.rttvar == pytest.approx(0.2)
+
+
+def test_later_samples_smooth_srtt_and_rttvar():
+    pacer = main.SpinPacer()
+    pacer.on_reply(0.4)
+    pacer.on_reply(0.8)
+    assert pacer.rttvar == pytest.approx(0.75 * 0.2 + 0.25 * 0.4)
+    assert pacer.srtt == pytest.approx(0.875 * 0.4 + 0.125 * 0.8)
+
+
+def test_timeout_is_clamped():
+    pacer = main.SpinPacer(min_timeout=1.0, max_timeout=15.0)
+    pacer.on_reply(0.01)
+    assert pacer.timeout() == 1.0
+    pacer = main.SpinPacer(min_timeout=1.0, max_timeout=15.0)
+    pacer.on_reply(2.0)
+    assert pacer.timeout() == pytest.approx(2.0 + 4 * 1.0)
+    pacer.on_reply(40.0)
+    assert pacer.timeout() == 15.0
+
+
+def test_additive_increase_up_to_max_rate():
+    pacer = main.SpinPacer(initial_rate=2.0, additive_increase=0.25, max_rate=3.0)
+    pacer.on_reply(0.1)
+    assert pacer.rate == pytest.approx(2.25)
+    assert pacer.interval() == pytest.approx(1 / 2.25)
+    for _ in range(10):
+        pacer.on_reply(0.1)
+    assert pacer.rate == 3.0
+
+
+def test_at_most_one_decrease_per_rtt():
+    pacer = main.SpinPacer(initial_rate=8.0, decrease_factor=0.5, min_rate=0.5)
+    pacer.on_reply(0.5)
+    rate = pacer.rate
+    pacer.on_loss("reply timeout", 10.0)
+    pacer.on_loss("reply timeout", 10.3) # Same burst, within one srtt
+    assert pacer.rate == pytest.approx(rate / 2)
+    assert pacer.decreases == 1
+    pacer.on_loss("reply timeout", 10.6)
+    assert pacer.rate == pytest.approx(rate / 4)
+    assert pacer.decreases == 2
+    for step in range(10):
+        pacer.on_loss("reply timeout", 20.0 + step)
+    assert pacer.rate == 0.5
+
+
+def test_window_follows_rate_times_srtt_up_to_cap():
+    pacer = main.SpinPacer(initial_rate=4.0, additive_increase=0.0, max_window=8)
+    pacer.on_reply(0.5)
+    assert pacer.window() == int(4.0 * 0.5) + 1
+    pacer = main.SpinPacer(initial_rate=20.0, max_rate=20.0, max_window=8)
+    pacer.on_reply(2.0)
+    assert pacer.window() == 8
+
+
+async def async_spins(spins: int, pacer, timeout: float = 0.25):
+    session = await main.gge_login_async("tester", "pw", "test-token", user_id_for_logging="test")
+    assert session, "login against the stand-in failed"
+    rewards = main.RewardCounter()
+    stats = dict(found=0, timed_out=0, errors=0, disconnected=0)
+    outcomes = main.SpinOutcomeLog()
+    try:
+        await session.spin(spins, rewards, stats, window=1 if pacer else 4, spin_send_delay=0.0, receive_timeout_per_spin=timeout, pacer=pacer, outcomes=outcomes)
+    finally:
+        await session.close()
+    return rewards.to_dict(), stats, outcomes
+
+
+def test_async_late_reply_is_credited_to_its_own_spin(standin):
+    standin(latency=0.01, seed=3)
+    reference_rewards, _, _ = asyncio.run(async_spins(20, None))
+    for pacer in (None, main.SpinPacer(initial_rate=20.0, min_rate=10.0, min_timeout=0.25, max_timeout=0.25)):
+        standin(SlowReplyStandin, slow_spins=(3, 11), slow_delay=0.6, latency=0.01, seed=3)
+        rewards, stats, outcomes = asyncio.run(async_spins(20, pacer))
+        assert stats == dict(found=20, timed_out=0, errors=0, disconnected=0)
+        assert rewards == reference_rewards
+        assert outcomes.answered == 20
+        assert sorted(set(outcomes.spin)) == list(range(1, 21))
+        late_rtts = {spin: rtt for spin, rtt in zip(outcomes.spin, outcomes.rtt) if spin in (3, 11)}
+        assert min(late_rtts.values()) >= 0.5
+        if pacer:
+            assert pacer.srtt < 0.25 # Late replies stay out of the RTT estimate
+
+
+def test_async_lost_replies_are_settled(standin):
+    server = standin(latency=0.01, jitter=0.03, drop_probability=0.1, seed=7)
+    _, stats, outcomes = asyncio.run(async_spins(80, main.SpinPacer(initial_rate=20.0, min_rate=10.0, min_timeout=0.3, max_timeout=0.3)))
+    assert server.replies_dropped > 0
+    assert stats["found"] == server.spins_answered == outcomes.answered
+    assert stats["timed_out"] == server.replies_dropped
+
+
+def test_async_disconnect_at_keepalive_ends_the_job(standin):
+    server = standin(DroppedReplyStandin, dropped_spins=(3,), latency=0.01, seed=5)
+    pacer = main.SpinPacer(initial_rate=20.0, min_rate=10.0, min_timeout=0.3, max_timeout=0.3) # Window 1: spin 3 is the one that expires
+    keepalives = []
+
+    async def run():
+        session = await main.gge_login_async("tester", "pw", "test-token", user_id_for_logging="test")
+        assert session, "login against the stand-in failed"
+        send = session.send
+
+        async def send_then_drop(command: str):
+            if "%pin%" in command:
+                keepalives.append(command)
+                await session.ws.close() # The connection goes right after the dropped reply
+            await send(command)
+
+        session.send = send_then_drop
+        stats = dict(found=0, timed_out=0, errors=0, disconnected=0)
+        try:
+            await session.spin(20, main.RewardCounter(), stats, pacer=pacer)
+        finally:
+            await session.close()
+        return stats
+
+    stats = asyncio.run(run())
+    assert server.replies_dropped == 1 and len(keepalives) == 1
+    assert stats == dict(found=2, timed_out=1, errors=0, disconnected=0) # Aborted at the keepalive instead of raising
+    assert pacer.decreases >= 1
@@ -0,0 +1,77 @@
+"""RecaptchaTokenCache demand tracking with a stub minter (no browser)."""
+import asyncio
+
+import main
+
+
+def test_demand_is_released_once():
+    cache = main.RecaptchaTokenCache(4, idle_seconds=0.0, mint=lambda: "test-token")
+    first, second = cache.note_demand(), cache.note_demand()
+    assert cache.stats()["waiting"] == 2
+    assert cache.target_size() == 2
+    first.release()
+    first.release()
+    assert cache.stats()["waiting"] == 1
+    assert cache.take(timeout=0.1, demand=second) is None # No producer running: a miss, but the claim is used up
+    second.release()
+    assert cache.stats()["waiting"] == 0
+    assert cache.target_size() == 0
+
+
+def test_take_uses_up_the_jobs_demand():
+    cache = main.RecaptchaTokenCache(2, idle_seconds=0.0, mint=lambda: "test-token")
+    cache.start()
+    try:
+        demand = cache.note_demand()
+        minted = cache.take(timeout=5.0, demand=demand)
+        assert minted is not None and minted.token == "test-token"
+        assert cache.stats()["waiting"] == 0
+        demand.release() # The job's finally: nothing left to release
+        other = cache.note_demand()
+        assert cache.take(timeout=5.0) is not None # A take without a handle leaves other jobs' claims alone
+        assert cache.stats()["waiting"] == 1
+        other.release()
+        assert cache.stats()["waiting"] == 0
+    finally:
+        cache.stop()
+
+
+def test_session_reuse_and_queued_cancel_leave_no_demand(standin, monkeypatch):
+    standin(latency=0.01)
+    cache = main.RecaptchaTokenCache(2, idle_seconds=0.0, mint=lambda: "test-token")
+    monkeypatch.setattr(main, "recaptcha_token_cache", cache)
+
+    async def submit(scheduler, user_id: int):
+        job = scheduler.submit(user_id, "tester", 5)
+        job.token_demand = cache.note_demand() # As SpinModal.on_submit does
+        return job
+
+    async def run(scheduler, job):
+        await scheduler.wait_turn(job)
+        try:
+            await scheduler.run(job, main.spin_lucky_wheel_async("tester", "pw", 5, "test", pipeline_window=4, browser_session=scheduler.browser_session,
+                                                               adaptive_pacing=False, cancel=job.cancel_token, route=job.lease, token_demand=job.token_demand))
+        finally:
+            scheduler.finish(job)
+
+    async def scenario():
+        session_cache = main.GGESessionCache(4)
+        monkeypatch.setattr(main, "gge_session_cache", session_cache)
+        scheduler = main.SpinScheduler(1, 1)
+        cache.start()
+        try:
+            await run(scheduler, await submit(scheduler, 1)) # Logs in with a prefetched token
+            for _ in range(2):
+                running = await submit(scheduler, 1) # Reuses the parked session
+                queued = await submit(scheduler, 2)
+                assert scheduler.cancel(queued)
+                await run(scheduler, running)
+            return session_cache.hits, cache.stats()
+        finally:
+            cache.stop()
+            await session_cache.close_all()
+
+    hits, stats = asyncio.run(scenario())
+    assert hits == 2
+    assert stats["waiting"] == 0
+    assert stats["target"] == 0